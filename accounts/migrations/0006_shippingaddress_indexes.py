@@ -0,0 +1,17 @@
+# Generated by Django 4.0 on 2026-10-17 22:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_shippingaddress'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shippingaddress',
+            index=models.Index(fields=['user', 'default'], name='address_user_default_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractBaseUser
 
 from .managers import UserManager
@@ -32,6 +33,14 @@ class User(AbstractBaseUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['full_name']
 
+    class Meta:
+        # 后台用户列表按姓名排序时按 (full_name, id) 游标分页(按邮箱排序使用邮箱的唯一索引)；
+        # 邮箱前缀搜索不区分大小写，在 lower(email) 上做范围查询
+        indexes = [
+            models.Index(fields=['full_name', 'id'], name='user_full_name_idx'),
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
     def __str__(self):
         """
         返回用户模型的字符串表示形式，即邮箱地址。
@@ -99,5 +108,9 @@ class ShippingAddress(models.Model):
     postal_code = models.CharField(max_length=20, verbose_name='邮政编码')
     default = models.BooleanField(default=False, verbose_name='设为默认')
 
+    class Meta:
+        # 下单和订单详情页读取用户的默认地址
+        indexes = [models.Index(fields=['user', 'default'], name='address_user_default_idx')]
+
     def __str__(self):
         return f"{self.name} - {self.address_line1}, {self.city}" 
\ No newline at end of file
@@ -5,6 +5,7 @@ from django.contrib.auth import authenticate, login, logout
 from .forms import UserRegistrationForm, UserLoginForm, ManagerLoginForm, EditProfileForm, ShippingAddressForm, \
     CustomUserChangeForm
 from accounts.models import User, ShippingAddress
+from cart.utils.cart import merge_session_cart
 
 
 def create_manager():
@@ -96,6 +97,7 @@ def user_login(request):
             )
             if user is not None:
                 login(request, user)
+                merge_session_cart(request)  # 把登录前会话中的购物车合并到用户的购物车
                 return redirect('shop:home_page')
             else:
                 messages.error(
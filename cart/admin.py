@@ -1,3 +1,7 @@
 from django.contrib import admin
 
-# Register your models here.
+# 导入CartItem模型
+from .models import CartItem
+
+# 将CartItem模型注册到Django admin站点
+admin.site.register(CartItem)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CartConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cart'
+
+    def ready(self):
+        # 注册购物车商品删除时清除摘要缓存的信号处理函数
+        from cart import signals  # noqa: F401
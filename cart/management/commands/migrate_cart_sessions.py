@@ -0,0 +1,62 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cart.utils.cart import CART_FORMAT_VERSION, CART_SESSION_ID, pack_cart, unpack_cart
+
+
+class Command(BaseCommand):
+    """
+    把会话中旧格式的购物车转换为紧凑格式。
+
+    只处理保存在数据库中的会话(db、cached_db)，逐批读取未过期的会话并只写回包含旧格式购物车的会话。
+    旧格式在读取时也能正确解包，不执行该命令时会话会在购物车下一次被修改时转换；
+    其他会话引擎只能使用这种方式。
+    """
+    help = '把会话中的购物车转换为紧凑格式'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批读取的会话数')
+
+    def handle(self, *args, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, 'get_model_class'):
+            self.stdout.write('会话不保存在数据库中，购物车将在下一次修改时转换')
+            return
+        count = self.migrate(store, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('已转换 %d 个会话' % count))
+
+    def migrate(self, store, batch_size):
+        """
+        转换所有未过期会话中的旧格式购物车。
+
+        参数:
+        - store: SessionStore类。
+        - batch_size: 每批读取的会话数。
+
+        返回值:
+        - 转换的会话数。
+        """
+        sessions = store.get_model_class().objects.filter(expire_date__gt=timezone.now())
+        session = store()
+        count = 0
+        last_key = ''
+        while True:
+            # 按主键分页，每批一个短查询，不会长时间占用会话表
+            rows = list(
+                sessions.filter(session_key__gt=last_key).order_by('session_key')
+                .values_list('session_key', 'session_data')[:batch_size]
+            )
+            if not rows:
+                return count
+            last_key = rows[-1][0]
+            for session_key, session_data in rows:
+                data = session.decode(session_data)
+                cart = data.get(CART_SESSION_ID)
+                if not cart or cart.get('v') == CART_FORMAT_VERSION:
+                    continue
+                data[CART_SESSION_ID] = pack_cart(unpack_cart(cart))
+                sessions.filter(session_key=session_key).update(session_data=session.encode(data))
+                count += 1
@@ -0,0 +1,52 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    """
+    删除过期的会话。
+
+    会话保存在数据库中(db、cached_db)时分批删除，每批一个短事务，
+    不会像一次性删除那样长时间锁住 django_session 表；其他会话引擎交给其 clear_expired 处理。
+    应由cron等定时执行，也可以使用 --interval 常驻运行。
+    """
+    help = '分批删除过期的会话'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批删除的会话数')
+        parser.add_argument('--interval', type=int, default=0, help='大于0时每隔该秒数清理一次，不退出')
+
+    def handle(self, *args, **options):
+        while True:
+            count = self.purge(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS('已删除 %d 个过期会话' % count))
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
+
+    def purge(self, batch_size):
+        """
+        删除所有过期的会话。
+
+        参数:
+        - batch_size: 每批删除的会话数。
+
+        返回值:
+        - 删除的会话数，会话引擎不使用数据库时为0。
+        """
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, 'get_model_class'):
+            store.clear_expired()
+            return 0
+        sessions = store.get_model_class().objects
+        now = timezone.now()
+        count = 0
+        while True:
+            keys = list(sessions.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                return count
+            count += sessions.filter(session_key__in=keys).delete()[0]
@@ -1,3 +1,41 @@
 from django.db import models
 
-# Create your models here.
+from accounts.models import User
+from shop.models import Product
+
+
+class CartItem(models.Model):
+    """
+    登录用户购物车中的一个商品，购物车保存在数据库中，可以跨设备使用。
+
+    属性:
+        user: 购物车所属的用户
+        product: 商品
+        quantity: 数量，通过 F() 表达式原子地增加
+        price: 加入购物车时的商品单价
+        created: 加入购物车的时间
+        updated: 最后修改时间
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """
+        Meta类用于定义模型的元数据选项。
+
+        属性:
+        - ordering: 按加入购物车的顺序排列。
+        - unique_together: 每个用户的每个商品只有一行，其索引也用于按用户读取整个购物车。
+        """
+        ordering = ('id',)
+        unique_together = ('user', 'product')
+
+    def __str__(self):
+        """
+        返回用户ID、商品ID和数量。
+        """
+        return '%s: %s x %s' % (self.user_id, self.product_id, self.quantity)
@@ -0,0 +1,17 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from cart.utils.cart import cart_summary_key
+from .models import CartItem
+
+
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart_summary(sender, instance, **kwargs):
+    """
+    购物车商品删除后删除用户缓存的购物车摘要。
+
+    Cart 自身的修改会在 Cart.changed 中删除摘要，这里处理其他途径的删除，
+    例如删除商品或用户时级联删除的购物车商品。
+    """
+    cache.delete(cart_summary_key(instance.user_id))
@@ -0,0 +1,123 @@
+// 购物车的渐进增强脚本：拦截加入购物车表单、移除链接和数量输入，
+// 通过 cart/api/ 下的JSON接口只更新被修改的行和购物车摘要，不再重新加载整个页面。
+// 没有脚本或接口请求失败时，表单和链接按原来的方式提交。
+(function () {
+    'use strict';
+
+    function csrfToken() {
+        var input = document.querySelector('[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    function post(url, data) {
+        return fetch(url, {
+            method: 'POST',
+            body: data || new FormData(),
+            credentials: 'same-origin',
+            headers: {'X-CSRFToken': csrfToken(), 'X-Requested-With': 'XMLHttpRequest'}
+        }).then(function (response) {
+            if (response.status === 401) {
+                return response.json().then(function (body) {
+                    // 跳转到登录页，不再调用后续的回调
+                    window.location.href = body.login_url + '?next=' + encodeURIComponent(window.location.pathname);
+                    return new Promise(function () {});
+                });
+            }
+            return response.json().then(function (body) {
+                if (!response.ok) {
+                    throw body;
+                }
+                return body;
+            });
+        });
+    }
+
+    function text(selector, value) {
+        document.querySelectorAll(selector).forEach(function (element) {
+            element.textContent = value;
+        });
+    }
+
+    function updateSummary(summary) {
+        text('[data-cart-count]', summary.count);
+        text('[data-cart-total]', summary.total_price);
+        if (summary.count === 0) {
+            var table = document.querySelector('[data-cart-table]');
+            if (table) {
+                // 购物车清空后重新加载一次，显示空购物车页面
+                window.location.reload();
+            }
+        }
+    }
+
+    function showMessage(form, message, level) {
+        var box = form.querySelector('[data-cart-message]');
+        if (!box) {
+            box = document.createElement('div');
+            box.setAttribute('data-cart-message', '');
+            form.appendChild(box);
+        }
+        box.className = 'alert alert-' + level + ' mt-2';
+        box.textContent = message;
+    }
+
+    // 商品详情页：加入购物车
+    document.querySelectorAll('form[data-cart-add]').forEach(function (form) {
+        form.addEventListener('submit', function (event) {
+            event.preventDefault();
+            post(form.getAttribute('data-cart-add'), new FormData(form)).then(function (body) {
+                updateSummary(body.summary);
+                showMessage(form, '已添加到购物车!', 'info');
+            }).catch(function (error) {
+                if (error && error.errors) {
+                    showMessage(form, '请输入1到9之间的数量', 'danger');
+                } else {
+                    form.submit();
+                }
+            });
+        });
+    });
+
+    // 购物车页：移除商品
+    document.querySelectorAll('a[data-cart-remove]').forEach(function (link) {
+        link.addEventListener('click', function (event) {
+            event.preventDefault();
+            post(link.getAttribute('data-cart-remove')).then(function (body) {
+                var row = link.closest('[data-cart-line]');
+                if (row) {
+                    row.remove();
+                }
+                updateSummary(body.summary);
+            }).catch(function () {
+                window.location.href = link.href;
+            });
+        });
+    });
+
+    // 购物车页：修改数量，把数量单元格替换为输入框
+    document.querySelectorAll('[data-cart-set]').forEach(function (cell) {
+        var input = document.createElement('input');
+        input.type = 'number';
+        input.min = 1;
+        input.max = 9;
+        input.value = cell.textContent.trim();
+        input.className = 'form-control form-control-sm';
+        input.style.width = '5rem';
+        cell.textContent = '';
+        cell.appendChild(input);
+        input.addEventListener('change', function () {
+            var data = new FormData();
+            data.append('quantity', input.value);
+            post(cell.getAttribute('data-cart-set'), data).then(function (body) {
+                input.classList.remove('is-invalid');
+                var row = cell.closest('[data-cart-line]');
+                if (row && body.line) {
+                    row.querySelector('[data-line-total]').textContent = body.line.total_price;
+                }
+                updateSummary(body.summary);
+            }).catch(function () {
+                input.classList.add('is-invalid');
+            });
+        });
+    });
+})();
@@ -1,3 +1,280 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends import db
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from cart.models import CartItem
+from cart.utils.cart import (
+    CART_FORMAT_VERSION, CART_NAMESPACE, CART_SESSION_ID, CART_SUMMARY_SESSION_ID, Cart, add_cart_item,
+    cart_summary_key, get_cart_summary, get_user_cart_summary, merge_session_cart, pack_cart, unpack_cart
+)
+from online_shop.cache import bump_namespace, namespace_version
+from shop.models import Category, Product
+
+
+class CartTestMixin:
+    """
+    创建测试用的用户、商品和请求。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='数码')
+        cls.phone = Product.objects.create(
+            category=category, image='products/p.jpg', title='手机', description='描述', price=100
+        )
+        cls.laptop = Product.objects.create(
+            category=category, image='products/p.jpg', title='电脑', description='描述', price=500
+        )
+        cls.user = User.objects.create_user('buyer@example.com', 'buyer', 'buyerpass1234')
+
+    def setUp(self):
+        cache.clear()
+
+    def make_request(self, cart=None, user=None):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        if cart is not None:
+            request.session[CART_SESSION_ID] = cart
+            request.session[CART_SUMMARY_SESSION_ID] = {'count': 0, 'quantity': 0, 'total_price': 0}
+        request.user = user or self.user
+        return request
+
+    def rows(self):
+        return dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+
+class DatabaseCartTest(CartTestMixin, TestCase):
+    """
+    登录用户的数据库购物车：原子地增加数量、登录时合并会话购物车、删除时清除缓存的摘要。
+    """
+
+    def test_add_cart_item_increments(self):
+        add_cart_item(self.user.pk, self.phone.id, 2, 100)
+        add_cart_item(self.user.pk, self.phone.id, 3, 999)
+        item = CartItem.objects.get(user=self.user, product=self.phone)
+        # 已有的行只增加数量，单价保留第一次加入时的值
+        self.assertEqual((item.quantity, item.price), (5, 100))
+        # 已有行时只执行一次 UPDATE
+        with self.assertNumQueries(1):
+            add_cart_item(self.user.pk, self.phone.id, 1, 100)
+        self.assertEqual(self.rows(), {self.phone.id: 6})
+
+    def test_merge_session_cart(self):
+        add_cart_item(self.user.pk, self.phone.id, 2, 100)
+        request = self.make_request(pack_cart({self.phone.id: (3, 90), self.laptop.id: (1, 500)}))
+        merge_session_cart(request)
+        # 同一商品的数量相加，单价保留数据库中的值
+        self.assertEqual(self.rows(), {self.phone.id: 5, self.laptop.id: 1})
+        self.assertEqual(CartItem.objects.get(user=self.user, product=self.phone).price, 100)
+        # 合并后会话中的购物车和摘要被删除，再次合并不会重复增加
+        self.assertNotIn(CART_SESSION_ID, request.session)
+        self.assertNotIn(CART_SUMMARY_SESSION_ID, request.session)
+        merge_session_cart(request)
+        self.assertEqual(self.rows(), {self.phone.id: 5, self.laptop.id: 1})
+
+    def test_cart_merges_on_login(self):
+        request = self.make_request(pack_cart({self.phone.id: (2, 100)}))
+        cart = Cart(request)
+        self.assertEqual(cart.quantities(), {self.phone.id: 2})
+        self.assertEqual(cart.summary, {'count': 1, 'quantity': 2, 'total_price': 200})
+        self.assertNotIn(CART_SESSION_ID, request.session)
+
+    def test_summary_cache_invalidation(self):
+        add_cart_item(self.user.pk, self.phone.id, 2, 100)
+        self.assertEqual(get_user_cart_summary(self.user.pk)['quantity'], 2)
+        self.assertIsNotNone(cache.get(cart_summary_key(self.user.pk)))
+
+        Cart(self.make_request()).add(self.laptop, 1)
+        self.assertEqual(get_user_cart_summary(self.user.pk)['quantity'], 3)
+
+        # 不经过 Cart 的删除(如删除商品时级联删除)同样使缓存的摘要失效
+        CartItem.objects.filter(user=self.user, product=self.phone).delete()
+        self.assertIsNone(cache.get(cart_summary_key(self.user.pk)))
+        self.assertEqual(get_user_cart_summary(self.user.pk)['quantity'], 1)
+        self.laptop.delete()
+        self.assertEqual(
+            get_user_cart_summary(self.user.pk), {'count': 0, 'quantity': 0, 'total_price': 0}
+        )
+
+    def test_summary_key_is_versioned(self):
+        add_cart_item(self.user.pk, self.phone.id, 2, 100)
+        get_user_cart_summary(self.user.pk)
+        key = cart_summary_key(self.user.pk)
+        self.assertEqual(key, '%s:%s:summary:%s' % (CART_NAMESPACE, namespace_version(CART_NAMESPACE), self.user.pk))
+        # 更新命名空间版本号后所有用户缓存的摘要一起失效
+        bump_namespace(CART_NAMESPACE)
+        self.assertNotEqual(cart_summary_key(self.user.pk), key)
+        self.assertIsNone(cache.get(cart_summary_key(self.user.pk)))
+        self.assertEqual(get_user_cart_summary(self.user.pk)['quantity'], 2)
+
+
+class CartApiTest(CartTestMixin, TestCase):
+    """
+    购物车的JSON接口：成功时返回修改的行和摘要，数量无效时返回400，未登录时返回401。
+    """
+
+    def url(self, name, product=None):
+        return reverse('cart:%s' % name, args=[product.id] if product else [])
+
+    def test_add_set_remove(self):
+        self.client.force_login(self.user)
+        response = self.client.post(self.url('api_add_to_cart', self.phone), {'quantity': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'line': {'product_id': self.phone.id, 'quantity': 2, 'price': 100, 'total_price': 200},
+            'summary': {'count': 1, 'quantity': 2, 'total_price': 200},
+        })
+        self.client.post(self.url('api_add_to_cart', self.laptop), {'quantity': 1})
+
+        response = self.client.post(self.url('api_set_quantity', self.phone), {'quantity': 5})
+        self.assertEqual(response.json()['line']['quantity'], 5)
+        self.assertEqual(response.json()['summary'], {'count': 2, 'quantity': 6, 'total_price': 1000})
+
+        response = self.client.post(self.url('api_remove_from_cart', self.phone))
+        self.assertEqual(response.json(), {'line': None, 'summary': {'count': 1, 'quantity': 1, 'total_price': 500}})
+        self.assertEqual(self.rows(), {self.laptop.id: 1})
+
+        response = self.client.get(self.url('api_cart_summary'))
+        self.assertEqual(response.json(), {'summary': {'count': 1, 'quantity': 1, 'total_price': 500}})
+
+    def test_invalid_quantity(self):
+        self.client.force_login(self.user)
+        for name in ('api_add_to_cart', 'api_set_quantity'):
+            for quantity in ('', '0', '10', 'abc'):
+                with self.subTest(name=name, quantity=quantity):
+                    response = self.client.post(self.url(name, self.phone), {'quantity': quantity})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('quantity', response.json()['errors'])
+        self.assertEqual(self.rows(), {})
+
+    def test_login_required(self):
+        requests = [
+            ('post', self.url('api_add_to_cart', self.phone), {'quantity': 1}),
+            ('post', self.url('api_set_quantity', self.phone), {'quantity': 1}),
+            ('post', self.url('api_remove_from_cart', self.phone), {}),
+            ('get', self.url('api_cart_summary'), {}),
+        ]
+        for method, url, data in requests:
+            with self.subTest(url=url):
+                response = getattr(self.client, method)(url, data)
+                # 不重定向到登录页，由前端脚本决定是否跳转
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.json(), {'login_url': reverse('accounts:user_login')})
+
+    def test_wrong_method_and_missing_product(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url('api_add_to_cart', self.phone)).status_code, 405)
+        self.assertEqual(self.client.post(self.url('api_cart_summary')).status_code, 405)
+        missing = Product(id=self.laptop.id + 100)
+        self.assertEqual(self.client.post(self.url('api_add_to_cart', missing), {'quantity': 1}).status_code, 404)
+
+
+class SessionCartFormatTest(CartTestMixin, TestCase):
+    """
+    会话中购物车的紧凑格式，以及旧格式购物车的读取和转换。
+    """
+
+    def legacy_cart(self):
+        return {
+            str(self.phone.id): {'quantity': 2, 'price': '100'},
+            str(self.laptop.id): {'quantity': '1', 'price': '500'},
+        }
+
+    def test_pack_unpack_round_trip(self):
+        cart = {self.phone.id: (2, 100), self.laptop.id: (1, 500)}
+        packed = pack_cart(cart)
+        self.assertEqual(
+            packed, {'v': CART_FORMAT_VERSION, 'i': [self.phone.id, 2, 100, self.laptop.id, 1, 500]}
+        )
+        self.assertEqual(unpack_cart(packed), cart)
+        self.assertEqual(unpack_cart(pack_cart({})), {})
+        self.assertEqual(unpack_cart(None), {})
+
+    def test_unpack_legacy_cart(self):
+        # 旧格式的键是字符串，单价是字符串
+        cart = unpack_cart(self.legacy_cart())
+        self.assertEqual(cart, {self.phone.id: (2, 100), self.laptop.id: (1, 500)})
+        self.assertEqual(unpack_cart(pack_cart(cart)), cart)
+
+    def test_legacy_session_is_rewritten_on_change(self):
+        # 旧会话中只有购物车，没有摘要
+        request = self.make_request(user=AnonymousUser())
+        request.session[CART_SESSION_ID] = self.legacy_cart()
+        self.assertEqual(get_cart_summary(request.session), {'count': 2, 'quantity': 3, 'total_price': 700})
+
+        cart = Cart(request)
+        self.assertEqual(cart.quantities(), {self.phone.id: 2, self.laptop.id: 1})
+        cart.add(self.phone, 1)
+        self.assertEqual(request.session[CART_SESSION_ID]['v'], CART_FORMAT_VERSION)
+        self.assertEqual(
+            unpack_cart(request.session[CART_SESSION_ID]), {self.phone.id: (3, 100), self.laptop.id: (1, 500)}
+        )
+        # 摘要由修改前的购物车计算后再增量更新，不会重复计入新加的数量
+        self.assertEqual(request.session[CART_SUMMARY_SESSION_ID], {'count': 2, 'quantity': 4, 'total_price': 800})
+
+    def test_legacy_session_remove_and_set_quantity(self):
+        request = self.make_request(user=AnonymousUser())
+        request.session[CART_SESSION_ID] = self.legacy_cart()
+        Cart(request).set_quantity(self.phone, 5)
+        self.assertEqual(request.session[CART_SUMMARY_SESSION_ID], {'count': 2, 'quantity': 6, 'total_price': 1000})
+
+        request.session[CART_SESSION_ID] = self.legacy_cart()
+        del request.session[CART_SUMMARY_SESSION_ID]
+        Cart(request).remove(self.laptop)
+        self.assertEqual(request.session[CART_SUMMARY_SESSION_ID], {'count': 1, 'quantity': 2, 'total_price': 200})
+
+    def create_session(self, data, expired=False):
+        session = db.SessionStore()
+        session.update(data)
+        session.create()
+        if expired:
+            Session.objects.filter(session_key=session.session_key).update(
+                expire_date=timezone.now() - timedelta(days=1)
+            )
+        return session.session_key
+
+    def load_session(self, session_key):
+        return db.SessionStore().decode(Session.objects.get(session_key=session_key).session_data)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_migrate_cart_sessions(self):
+        packed = pack_cart({self.phone.id: (1, 100)})
+        legacy = [self.create_session({CART_SESSION_ID: self.legacy_cart(), 'other': 1}) for _ in range(3)]
+        current = self.create_session({CART_SESSION_ID: packed})
+        empty = self.create_session({'other': 1})
+        expired = self.create_session({CART_SESSION_ID: self.legacy_cart()}, expired=True)
+
+        out = StringIO()
+        # 每批一个会话，覆盖按主键分页
+        call_command('migrate_cart_sessions', batch_size=1, stdout=out)
+        self.assertIn('已转换 3 个会话', out.getvalue())
+        for session_key in legacy:
+            data = self.load_session(session_key)
+            self.assertEqual(data[CART_SESSION_ID]['v'], CART_FORMAT_VERSION)
+            self.assertEqual(unpack_cart(data[CART_SESSION_ID]), unpack_cart(self.legacy_cart()))
+            # 会话中的其他数据保持不变
+            self.assertEqual(data['other'], 1)
+        self.assertEqual(self.load_session(current), {CART_SESSION_ID: packed})
+        self.assertEqual(self.load_session(empty), {'other': 1})
+        # 过期的会话不处理
+        self.assertNotIn('v', self.load_session(expired)[CART_SESSION_ID])
+
+        out = StringIO()
+        call_command('migrate_cart_sessions', stdout=out)
+        self.assertIn('已转换 0 个会话', out.getvalue())
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_migrate_cart_sessions_without_database_sessions(self):
+        out = StringIO()
+        call_command('migrate_cart_sessions', stdout=out)
+        self.assertIn('会话不保存在数据库中', out.getvalue())
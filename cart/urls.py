@@ -8,5 +8,9 @@ urlpatterns = [
     path('add/<product_id>/', views.add_to_cart, name='add_to_cart'),
     path('remove/<product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('list/', views.show_cart, name='show_cart'),
-
+    # JSON接口，供页面脚本局部更新购物车
+    path('api/add/<int:product_id>/', views.api_add_to_cart, name='api_add_to_cart'),
+    path('api/set/<int:product_id>/', views.api_set_quantity, name='api_set_quantity'),
+    path('api/remove/<int:product_id>/', views.api_remove_from_cart, name='api_remove_from_cart'),
+    path('api/summary/', views.api_cart_summary, name='api_cart_summary'),
 ]
\ No newline at end of file
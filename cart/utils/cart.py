@@ -1,56 +1,339 @@
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+
+from cart.models import CartItem
+from online_shop.cache import namespace_version, versioned_key
 from shop.models import Product
+from shop.utils.page_cache import CATALOG_NAMESPACE
 
-# 购物车会话ID
+# 购物车会话ID，未登录用户的购物车保存在会话中
 CART_SESSION_ID = 'cart'
+# 购物车摘要会话ID，保存商品种类数、商品总数量和总价
+CART_SUMMARY_SESSION_ID = 'cart_summary'
+# 购物车的缓存命名空间，更新其版本号可以使所有用户缓存的摘要一起失效
+CART_NAMESPACE = 'cart'
+# 会话中购物车的格式版本，旧格式没有版本号
+CART_FORMAT_VERSION = 2
+
+
+class CartLine:
+    """
+    购物车中的一行，迭代购物车时生成，不修改购物车本身。
+
+    使用 __slots__，大购物车迭代时每行只占几个属性的内存。
+
+    属性:
+    - product_id: 商品ID。
+    - quantity: 数量。
+    - price: 加入购物车时的单价。
+    - product: Product实例，商品已被删除时为None。
+    """
+    __slots__ = ('product_id', 'quantity', 'price', 'product')
+
+    def __init__(self, product_id, quantity, price, product=None):
+        self.product_id = product_id
+        self.quantity = quantity
+        self.price = price
+        self.product = product
+
+    @property
+    def total_price(self):
+        """
+        该行的总价。
+        """
+        return self.price * self.quantity
+
+
+def pack_cart(cart):
+    """
+    把购物车字典打包为会话中保存的紧凑格式。
+
+    格式为 {'v': 版本号, 'i': [商品ID, 数量, 单价, 商品ID, 数量, 单价, ...]}，
+    JSON序列化后每行只有三个整数，没有重复的键名。
+
+    参数:
+    - cart: 字典，键为商品ID(整数)，值为 (数量, 单价)。
+
+    返回:
+    - 可以保存到会话中的字典。
+    """
+    items = []
+    for product_id, (quantity, price) in cart.items():
+        items += (product_id, quantity, price)
+    return {'v': CART_FORMAT_VERSION, 'i': items}
+
+
+def unpack_cart(data):
+    """
+    把会话中保存的购物车解包为购物车字典。
+
+    同时兼容旧格式 {'商品ID字符串': {'quantity': 数量, 'price': '单价'}}，
+    旧会话在购物车下一次被修改时以新格式写回。
+
+    参数:
+    - data: 会话中保存的购物车，可以为None。
+
+    返回:
+    - 字典，键为商品ID(整数)，值为 (数量, 单价)。
+    """
+    if not data:
+        return {}
+    if data.get('v') == CART_FORMAT_VERSION:
+        items = data['i']
+        return {items[i]: (items[i + 1], items[i + 2]) for i in range(0, len(items), 3)}
+    return {int(product_id): (int(item['quantity']), int(item['price'])) for product_id, item in data.items()}
+
+
+def summarize_cart(cart):
+    """
+    根据购物车字典计算购物车摘要，不访问数据库。
+
+    参数:
+    - cart: 字典，键为商品ID，值为 (数量, 单价)。
+
+    返回:
+    - 字典，包含count(商品种类数)、quantity(商品总数量)和total_price(总价)。
+    """
+    return {
+        'count': len(cart),
+        'quantity': sum(quantity for quantity, _ in cart.values()),
+        'total_price': sum(price * quantity for quantity, price in cart.values()),
+    }
+
+
+def get_cart_products(product_ids):
+    """
+    按ID获取购物车中的商品，优先从缓存读取。
+
+    缓存键包含商品目录版本号，商品保存或删除后自动失效；只有缓存中没有的商品才查询数据库。
+
+    参数:
+    - product_ids: 商品ID(整数)的可迭代对象。
+
+    返回:
+    - 字典，键为商品ID，值为Product实例。
+    """
+    version = namespace_version(CATALOG_NAMESPACE)
+    keys = {versioned_key(CATALOG_NAMESPACE, 'product', product_id, version=version): product_id
+            for product_id in product_ids}
+    cached = cache.get_many(keys)
+    products = {keys[key]: product for key, product in cached.items()}
+    missing = [product_id for key, product_id in keys.items() if key not in cached]
+    if missing:
+        fetched = {product.id: product for product in Product.objects.filter(id__in=missing)}
+        cache.set_many({
+            versioned_key(CATALOG_NAMESPACE, 'product', product_id, version=version): product
+            for product_id, product in fetched.items()
+        })
+        products.update(fetched)
+    return products
+
+
+def get_cart_summary(session):
+    """
+    从会话中读取未登录用户的购物车摘要。
+
+    摘要由Cart.add、Cart.remove和Cart.clear增量维护，读取时不会执行任何数据库查询，
+    也不会把会话标记为已修改。旧会话中只有购物车没有摘要时，直接由购物车字典计算。
+
+    参数:
+    - session: 用户的会话对象。
+
+    返回:
+    - 购物车摘要字典。
+    """
+    summary = session.get(CART_SUMMARY_SESSION_ID)
+    if summary is None:
+        summary = summarize_cart(unpack_cart(session.get(CART_SESSION_ID)))
+    return summary
+
+
+def cart_summary_key(user_id):
+    """
+    生成登录用户购物车摘要的缓存键，购物车修改时删除。
+
+    参数:
+    - user_id: 用户ID。
+
+    返回:
+    - 缓存键字符串。
+    """
+    return versioned_key(CART_NAMESPACE, 'summary', user_id)
+
+
+def get_user_cart_summary(user_id):
+    """
+    读取登录用户的购物车摘要，优先从缓存读取，未命中时用一次聚合查询计算。
+
+    参数:
+    - user_id: 用户ID。
+
+    返回:
+    - 购物车摘要字典。
+    """
+    key = cart_summary_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = CartItem.objects.filter(user_id=user_id).aggregate(
+            count=Count('id'),
+            quantity=Coalesce(Sum('quantity'), 0),
+            total_price=Coalesce(Sum(F('price') * F('quantity')), 0),
+        )
+        cache.set(key, summary)
+    return summary
+
+
+def get_request_cart_summary(request):
+    """
+    读取当前请求用户的购物车摘要，登录用户读数据库购物车，未登录用户读会话。
+
+    参数:
+    - request: HttpRequest对象。
+
+    返回:
+    - 购物车摘要字典。
+    """
+    if request.user.is_authenticated:
+        return get_user_cart_summary(request.user.pk)
+    return get_cart_summary(request.session)
+
+
+def add_cart_item(user_id, product_id, quantity, price):
+    """
+    把商品加入登录用户的购物车。
+
+    已有该商品时用 F('quantity') + quantity 原子地增加数量，并发添加不会丢失更新；
+    没有时创建新行，并发创建触发唯一约束冲突后改为增加数量。
+
+    参数:
+    - user_id: 用户ID。
+    - product_id: 商品ID。
+    - quantity: 增加的数量。
+    - price: 商品单价，只在新建时写入。
+    """
+    items = CartItem.objects.filter(user_id=user_id, product_id=product_id)
+    if items.update(quantity=F('quantity') + quantity):
+        return
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(user_id=user_id, product_id=product_id, quantity=quantity, price=price)
+    except IntegrityError:
+        items.update(quantity=F('quantity') + quantity)
+
+
+def merge_session_cart(request):
+    """
+    把会话中的购物车合并到登录用户的数据库购物车，然后从会话中删除。
+
+    用户登录时调用；会话中没有购物车时什么也不做。同一商品的数量相加，单价保留数据库中已有的值。
+
+    参数:
+    - request: HttpRequest对象，request.user 必须已登录。
+    """
+    cart = unpack_cart(request.session.get(CART_SESSION_ID))
+    if cart:
+        with transaction.atomic():
+            for product_id, (quantity, price) in cart.items():
+                add_cart_item(request.user.pk, product_id, quantity, price)
+        cache.delete(cart_summary_key(request.user.pk))
+    request.session.pop(CART_SESSION_ID, None)
+    request.session.pop(CART_SUMMARY_SESSION_ID, None)
+
 
 class Cart:
     """
     购物车类，用于管理用户购物车中的商品。
 
+    登录用户的购物车保存在 CartItem 表中，整个购物车通过 (user, product) 唯一索引一次查询读出，
+    修改直接写数据库；未登录用户的购物车保存在会话中。两种购物车对外的接口相同。
+
     参数:
-    - request: HttpRequest对象，用于访问用户的会话。
+    - request: HttpRequest对象，用于访问用户和会话。
 
     属性:
-    - session: HttpRequest对象中的会话，用于存储购物车信息。
-    - cart: 字典，存储购物车中的商品及其数量。
+    - session: HttpRequest对象中的会话。
+    - user_id: 登录用户的ID，未登录时为None。
+    - cart: 字典，键为商品ID，值为 (数量, 单价)，第一次访问时读取。
+    - summary: 字典，购物车摘要(商品种类数、总数量、总价)。
     """
     def __init__(self, request):
         """
-        初始化购物车实例。
+        初始化购物车实例，登录用户的会话中还留有购物车时先合并到数据库。
 
         参数:
         - request: HttpRequest对象。
         """
         self.session = request.session
-        self.cart = self.add_cart_session()
+        self.user_id = request.user.pk if request.user.is_authenticated else None
+        self._cart = None
+        self._summary = None
+        if self.user_id is not None and CART_SESSION_ID in self.session:
+            merge_session_cart(request)
+
+    @property
+    def cart(self):
+        """
+        购物车字典，第一次访问时从数据库或会话读取。
+        """
+        if self._cart is None:
+            self._cart = self.add_cart_session() if self.user_id is None else self.load()
+        return self._cart
+
+    @property
+    def summary(self):
+        """
+        购物车摘要，登录用户由已读取的购物车在内存中计算，不再单独查询。
+        """
+        if self._summary is None:
+            self._summary = self.add_summary_session() if self.user_id is None else summarize_cart(self.cart)
+        return self._summary
 
     def __iter__(self):
         """
-        迭代购物车中的每个商品，附加商品实例和总价。
+        迭代购物车中的每个商品，不修改购物车字典。
 
         返回:
-        - 生成器，包含每个商品的信息。
+        - 生成器，每个元素是附带商品实例的CartLine。
+        """
+        products = get_cart_products(self.cart.keys())
+        for product_id, (quantity, price) in self.cart.items():
+            yield CartLine(product_id, quantity, price, products.get(product_id))
+
+    def load(self):
         """
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-        for product in products:
-            cart[str(product.id)]['product'] = product
-        for item in cart.values():
-            item['total_price'] = int(item['price']) * int(item['quantity'])
-            yield item
+        用一次查询读取登录用户的整个购物车。
+
+        返回:
+        - 购物车字典。
+        """
+        rows = CartItem.objects.filter(user_id=self.user_id).values_list('product_id', 'quantity', 'price')
+        return {product_id: (quantity, price) for product_id, quantity, price in rows}
 
     def add_cart_session(self):
         """
-        创建或获取购物车会话。
+        获取购物车会话。
+
+        会话中没有购物车时返回一个新的空字典，但不写回会话：只读取购物车的请求不会把会话标记为已修改，
+        也就不会产生一次会话写入。购物车第一次被修改时由 save 写入会话。
 
         返回:
-        - 购物车会话字典。
+        - 购物车字典。
         """
-        cart = self.session.get(CART_SESSION_ID)
-        if not cart:
-            cart = self.session[CART_SESSION_ID] = {}
-        return cart
+        return unpack_cart(self.session.get(CART_SESSION_ID))
+
+    def add_summary_session(self):
+        """
+        获取购物车摘要会话，旧会话没有摘要时根据购物车计算一次，同样不写回会话。
+
+        返回:
+        - 购物车摘要字典。
+        """
+        summary = self.session.get(CART_SUMMARY_SESSION_ID)
+        if summary is None:
+            summary = summarize_cart(self.cart)
+        return summary
 
     def add(self, product, quantity):
         """
@@ -60,12 +343,20 @@ class Cart:
         - product: Product实例，要添加的商品。
         - quantity: 整数，添加的商品数量。
         """
-        product_id = str(product.id)
-
-        if product_id not in self.cart:
-            self.cart[product_id] = {'quantity': 0, 'price': str(product.price)}
+        if self.user_id is not None:
+            add_cart_item(self.user_id, product.id, quantity, product.price)
+            self.changed()
+            return
 
-        self.cart.get(product_id)['quantity'] += quantity
+        # 先读取摘要：旧会话没有摘要时由修改前的购物车计算
+        summary = self.summary
+        if product.id not in self.cart:
+            summary['count'] += 1
+        current, price = self.cart.get(product.id, (0, product.price))
+        self.cart[product.id] = (current + quantity, price)
+        # 增量更新摘要，按购物车中记录的价格计算
+        summary['quantity'] += quantity
+        summary['total_price'] += price * quantity
         self.save()
 
     def remove(self, product):
@@ -75,16 +366,87 @@ class Cart:
         参数:
         - product: Product实例，要移除的商品。
         """
-        product_id = str(product.id)
-        if product_id in self.cart:
-            del self.cart[product_id]
+        if self.user_id is not None:
+            CartItem.objects.filter(user_id=self.user_id, product_id=product.id).delete()
+            self.changed()
+            return
+
+        if product.id in self.cart:
+            summary = self.summary
+            quantity, price = self.cart.pop(product.id)
+            # 从摘要中扣除被移除的商品
+            summary['count'] -= 1
+            summary['quantity'] -= quantity
+            summary['total_price'] -= price * quantity
             self.save()
 
+    def set_quantity(self, product, quantity):
+        """
+        把购物车中商品的数量设置为指定值，购物车中还没有该商品时加入。
+
+        参数:
+        - product: Product实例。
+        - quantity: 整数，新的数量。
+        """
+        if self.user_id is not None:
+            items = CartItem.objects.filter(user_id=self.user_id, product_id=product.id)
+            if not items.update(quantity=quantity):
+                add_cart_item(self.user_id, product.id, quantity, product.price)
+            self.changed()
+            return
+
+        if product.id not in self.cart:
+            self.add(product, quantity)
+            return
+        summary = self.summary
+        current, price = self.cart[product.id]
+        self.cart[product.id] = (quantity, price)
+        # 按数量变化增量更新摘要
+        summary['quantity'] += quantity - current
+        summary['total_price'] += price * (quantity - current)
+        self.save()
+
+    def line(self, product_id):
+        """
+        获取购物车中某个商品的一行，不读取商品实例。
+
+        参数:
+        - product_id: 商品ID。
+
+        返回:
+        - CartLine，购物车中没有该商品时为None。
+        """
+        if product_id not in self.cart:
+            return None
+        quantity, price = self.cart[product_id]
+        return CartLine(product_id, quantity, price)
+
     def save(self):
         """
-        保存购物车会话的修改。
+        把未登录用户的购物车以紧凑格式和摘要一起写入会话。
+
+        这里只修改内存中的会话并标记为已修改，会话中间件在响应时统一写入一次，
+        同一请求中多次添加、移除商品只会产生一次会话写入。
         """
-        self.session.modified = True
+        self.session[CART_SESSION_ID] = pack_cart(self.cart)
+        self.session[CART_SUMMARY_SESSION_ID] = self.summary
+
+    def changed(self):
+        """
+        登录用户的购物车被修改后调用，丢弃已读取的购物车并删除缓存的摘要，下次访问时重新读取。
+        """
+        self._cart = None
+        self._summary = None
+        cache.delete(cart_summary_key(self.user_id))
+
+    def quantities(self):
+        """
+        返回购物车中每个商品的数量。
+
+        返回:
+        - 字典，键为商品ID(整数)，值为数量。
+        """
+        return {product_id: quantity for product_id, (quantity, _) in self.cart.items()}
 
     def get_total_price(self):
         """
@@ -93,11 +455,26 @@ class Cart:
         返回:
         - 整数，购物车中所有商品的总价。
         """
-        return sum(int(item['price']) * item['quantity'] for item in self.cart.values())
+        return self.summary['total_price']
+
+    def __len__(self):
+        """
+        返回购物车中的商品种类数。
+
+        返回:
+        - 整数，商品种类数。
+        """
+        return self.summary['count']
 
     def clear(self):
         """
-        清除购物车中的所有商品。
+        清除购物车中的所有商品及其摘要，会话中本来就没有购物车时不会产生会话写入。
         """
-        del self.session[CART_SESSION_ID]
-        self.save()
+        if self.user_id is not None:
+            CartItem.objects.filter(user_id=self.user_id).delete()
+            self.changed()
+            return
+        self.session.pop(CART_SESSION_ID, None)
+        self.session.pop(CART_SUMMARY_SESSION_ID, None)
+        self._cart = {}
+        self._summary = summarize_cart(self._cart)
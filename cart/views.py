@@ -1,8 +1,13 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from functools import wraps
+
+from django.shortcuts import render, get_object_or_404, redirect, resolve_url
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET, require_POST
 
-from cart.utils.cart import Cart
+from cart.utils.cart import Cart, get_request_cart_summary
 from .forms import QuantityForm
 from shop.models import Product
 
@@ -76,3 +81,125 @@ def remove_from_cart(request, product_id):
     cart.remove(product)
     # 重定向到购物车页面
     return redirect('cart:show_cart')
+
+
+def api_login_required(view):
+    """
+    JSON接口的登录检查装饰器。
+
+    未登录时不重定向到登录页，而是返回401和登录地址，由前端脚本决定是否跳转。
+
+    参数:
+    - view: 视图函数。
+
+    返回值:
+    - 包装后的视图函数。
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'login_url': resolve_url(settings.LOGIN_URL)}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def cart_response(cart, product_id):
+    """
+    生成购物车接口的JSON响应，只包含被修改的一行和购物车摘要。
+
+    参数:
+    - cart: Cart实例。
+    - product_id: 被修改的商品ID。
+
+    返回值:
+    - JsonResponse对象。
+    """
+    line = cart.line(product_id)
+    return JsonResponse({
+        'line': line and {
+            'product_id': line.product_id,
+            'quantity': line.quantity,
+            'price': line.price,
+            'total_price': line.total_price,
+        },
+        'summary': cart.summary,
+    })
+
+
+@require_POST
+@api_login_required
+def api_add_to_cart(request, product_id):
+    """
+    JSON接口：将商品添加到购物车。
+
+    参数:
+    - request: HttpRequest对象，POST中包含quantity。
+    - product_id: 整型，商品ID。
+
+    返回值:
+    - JsonResponse对象，包含该商品所在的行和购物车摘要；数量无效时返回400和表单错误。
+    """
+    product = get_object_or_404(Product.objects.only('id', 'price'), id=product_id)
+    form = QuantityForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    cart = Cart(request)
+    cart.add(product=product, quantity=form.cleaned_data['quantity'])
+    return cart_response(cart, product.id)
+
+
+@require_POST
+@api_login_required
+def api_set_quantity(request, product_id):
+    """
+    JSON接口：设置购物车中商品的数量。
+
+    参数:
+    - request: HttpRequest对象，POST中包含quantity。
+    - product_id: 整型，商品ID。
+
+    返回值:
+    - JsonResponse对象，包含该商品所在的行和购物车摘要；数量无效时返回400和表单错误。
+    """
+    product = get_object_or_404(Product.objects.only('id', 'price'), id=product_id)
+    form = QuantityForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    cart = Cart(request)
+    cart.set_quantity(product, form.cleaned_data['quantity'])
+    return cart_response(cart, product.id)
+
+
+@require_POST
+@api_login_required
+def api_remove_from_cart(request, product_id):
+    """
+    JSON接口：从购物车中移除商品。
+
+    参数:
+    - request: HttpRequest对象。
+    - product_id: 整型，商品ID。
+
+    返回值:
+    - JsonResponse对象，line为null，并包含购物车摘要。
+    """
+    product = get_object_or_404(Product.objects.only('id'), id=product_id)
+    cart = Cart(request)
+    cart.remove(product)
+    return cart_response(cart, product.id)
+
+
+@require_GET
+@api_login_required
+def api_cart_summary(request):
+    """
+    JSON接口：读取购物车摘要。
+
+    参数:
+    - request: HttpRequest对象。
+
+    返回值:
+    - JsonResponse对象，包含购物车摘要。
+    """
+    # 与页头的购物车数量读取同一份缓存的摘要，不读取整个购物车
+    return JsonResponse({'summary': get_request_cart_summary(request)})
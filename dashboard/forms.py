@@ -1,10 +1,43 @@
+import datetime
+
 from django import forms
 from django.forms import ModelForm
+from django.utils import timezone
 
 from shop.models import Product, Category
+from shop.tasks import generate_product_renditions
+from shop.utils.images import PENDING_KEY
 
 from django.utils.translation import gettext as _
-class AddProductForm(ModelForm):
+
+
+class ProductImageFormMixin:
+    """
+    产品表单的混入类，图片发生变化时清空旧缩略图，并把生成缩略图的工作交给后台任务。
+    """
+
+    def save(self, commit=True):
+        """
+        保存产品，图片有变化时创建生成缩略图的后台任务。
+
+        缩略图生成前商品列表显示占位图，请求无需等待图片处理完成。
+
+        参数:
+            commit: 是否立即保存到数据库。
+
+        返回:
+            Product实例。
+        """
+        image_changed = 'image' in self.changed_data
+        if image_changed:
+            self.instance.renditions = {PENDING_KEY: True}
+        product = super().save(commit)
+        if commit and image_changed:
+            generate_product_renditions.enqueue(product_id=product.pk)
+        return product
+
+
+class AddProductForm(ProductImageFormMixin, ModelForm):
     """
     用于添加产品的表单类，继承自ModelForm。
 
@@ -71,7 +104,7 @@ class AddCategoryForm(ModelForm):
         # self.fields['slug'].widget.attrs['class'] = 'form-control'
 
 
-class EditProductForm(ModelForm):
+class EditProductForm(ProductImageFormMixin, ModelForm):
     """
     用于编辑产品的表单类，继承自ModelForm。
 
@@ -105,3 +138,77 @@ class EditProductForm(ModelForm):
             visible.field.widget.attrs['class'] = 'form-control'
 
 
+class OrderFilterForm(forms.Form):
+    """
+    订单列表的筛选表单，所有字段都是可选的。
+
+    字段说明:
+    - status: 支付状态，''表示全部，'1'表示成功，'0'表示取消。
+    - shipped: 发货状态，''表示全部，'1'表示已发货，'0'表示未发货。
+    - date_from: 起始日期(包含)。
+    - date_to: 结束日期(包含)。
+    """
+    status = forms.ChoiceField(
+        required=False, label=_("状态"), choices=(('', '全部'), ('1', '成功'), ('0', '取消'))
+    )
+    shipped = forms.ChoiceField(
+        required=False, label=_("发货状态"), choices=(('', '全部'), ('1', '已发货'), ('0', '未发货'))
+    )
+    date_from = forms.DateField(
+        required=False, label=_("起始日期"), widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    date_to = forms.DateField(
+        required=False, label=_("结束日期"), widget=forms.DateInput(attrs={'type': 'date'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        """
+        构造函数，初始化表单实例。
+
+        参数:
+            *args: 位置参数。
+            **kwargs: 关键字参数。
+        """
+        super(OrderFilterForm, self).__init__(*args, **kwargs)
+
+        # 为所有可见字段的控件添加 'form-control' 类
+        for visible in self.visible_fields():
+            visible.field.widget.attrs['class'] = 'form-control form-control-sm'
+
+    def filter(self, queryset):
+        """
+        按表单中的条件筛选订单，表单无效时不做筛选。
+
+        参数:
+            queryset: 订单查询集。
+
+        返回:
+            筛选后的订单查询集。
+        """
+        if not self.is_valid():
+            return queryset
+        data = self.cleaned_data
+        # 布尔条件写成 __in：SQLite中 status=True 生成的是裸列条件，不能使用 (status, shipped, created) 索引
+        if data['status']:
+            queryset = queryset.filter(status__in=[data['status'] == '1'])
+        if data['shipped']:
+            queryset = queryset.filter(shipped__in=[data['shipped'] == '1'])
+        # 日期转换为当前时区当天开始的时间再比较，条件直接作用于 created 列，可以使用索引
+        if data['date_from']:
+            queryset = queryset.filter(created__gte=self.start_of_day(data['date_from']))
+        if data['date_to']:
+            queryset = queryset.filter(created__lt=self.start_of_day(data['date_to'] + datetime.timedelta(days=1)))
+        return queryset
+
+    @staticmethod
+    def start_of_day(date):
+        """
+        返回当前时区中某一天开始的时间。
+
+        参数:
+            date: 日期。
+
+        返回:
+            带时区的日期时间。
+        """
+        return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
@@ -1,3 +1,70 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from accounts.models import User
+from online_shop.query_inspector import QueryBudgetTestMixin
+from orders.models import Order, OrderItem
+from shop.models import Category, Product
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class DashboardQueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    """
+    管理页面的查询次数不超过 SHOP_QUERY_BUDGETS 中的预算，且没有N+1查询。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='数码')
+        products = [
+            Product.objects.create(
+                category=category, image='products/p.jpg', title='商品%d' % i, description='描述', price=10 + i
+            )
+            for i in range(10)
+        ]
+        users = [User.objects.create_user('buyer%d@example.com' % i, 'buyer%d' % i, 'buyerpass1234') for i in range(5)]
+        orders = Order.objects.bulk_create([Order(user=users[i % 5], status=True) for i in range(20)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=product.price, quantity=1)
+            for order in orders for product in products[:5]
+        ])
+        Order.objects.refresh_totals()
+        cls.order = orders[0]
+        cls.manager = User.objects.create_user('manager@example.com', 'manager', 'managerpass1234')
+        cls.manager.is_manager = True
+        cls.manager.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def test_dashboard_pages(self):
+        self.assertQueryBudget('/dashboard/products')
+        self.assertQueryBudget('/dashboard/orders')
+        self.assertQueryBudget('/dashboard/orders', {'status': '1', 'shipped': '0'})
+        self.assertQueryBudget('/dashboard/orders/detail/%d' % self.order.id)
+        self.assertQueryBudget('/dashboard/users/')
+
+    def test_cached_order_count_follows_bulk_writes(self):
+        response = self.client.get('/dashboard/orders', {'shipped': '1'})
+        self.assertEqual(response.context['orders'].paginator.count, 0)
+        # 批量更新和批量创建不触发信号，缓存的订单数量同样需要失效
+        Order.objects.filter(id=self.order.id).update(shipped=True)
+        response = self.client.get('/dashboard/orders', {'shipped': '1'})
+        self.assertEqual(response.context['orders'].paginator.count, 1)
+        Order.objects.bulk_create([Order(user=self.manager, shipped=True)])
+        response = self.client.get('/dashboard/orders', {'shipped': '1'})
+        self.assertEqual(response.context['orders'].paginator.count, 2)
+
+    def test_user_email_prefix_is_case_insensitive(self):
+        User.objects.create_user('Admin.Two@Example.com', 'admin two', 'adminpass1234')
+        response = self.client.get('/dashboard/users/', {'q': 'ADMIN'})
+        self.assertEqual([user.email for user in response.context['users']], ['Admin.Two@example.com'])
+        response = self.client.get('/dashboard/users/', {'q': 'buyer1'})
+        self.assertEqual([user.email for user in response.context['users']], ['buyer1@example.com'])
+
+    def test_sorted_lists_paginate(self):
+        for sort in ('price', '-title', 'date_created'):
+            self.assertEqual(self.client.get('/dashboard/products', {'sort': sort}).status_code, 200)
+        for sort in ('email', '-full_name', 'id'):
+            self.assertEqual(self.client.get('/dashboard/users/', {'sort': sort}).status_code, 200)
@@ -1,17 +1,82 @@
+import hashlib
+
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Lower
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
-from django.http import Http404, HttpResponseRedirect
-from django.urls import reverse
+from django.http import Http404
 
 from shop.models import Product
 from accounts.models import User, ShippingAddress
-from orders.models import Order, OrderItem
-from .forms import AddProductForm, AddCategoryForm, EditProductForm
+from orders.models import ORDERS_NAMESPACE, Order, OrderItem
+from .forms import AddProductForm, AddCategoryForm, EditProductForm, OrderFilterForm
 
 from accounts.forms import CustomUserCreationForm,CustomUserChangeForm
+from shop.utils.pagination import paginat, KeysetPaginator
+from shop.utils.search import get_search_backend
+from online_shop.cache import versioned_key
+
+# 订单列表每页显示的订单数量
+ORDERS_PER_PAGE = 50
+# 产品和用户列表每页显示的数量
+LIST_PER_PAGE = 50
+# 产品列表允许排序的字段，每个字段都有 (字段, id) 索引支持游标分页，新增字段时需要同时添加索引
+PRODUCT_SORTS = ('date_created', 'price', 'title')
+# 用户列表允许排序的字段，同样需要 (字段, id) 索引或唯一索引
+USER_SORTS = ('id', 'email', 'full_name')
+
+
+def get_sort(request, allowed, default):
+    """
+    从请求中读取排序字段，不在允许范围内时使用默认值。
+
+    参数:
+    - request: HttpRequest对象。
+    - allowed: 允许排序的字段名元组。
+    - default: 默认排序，字段名前加'-'表示降序。
+
+    返回值:
+    - 排序字符串，例如'-price'。
+    """
+    sort = request.GET.get('sort', default)
+    if sort.lstrip('-') not in allowed:
+        sort = default
+    return sort
+
+
+def keyset_ordering(sort):
+    """
+    为游标分页生成排序字段，追加与主排序方向相同的id保证顺序唯一。
+
+    参数:
+    - sort: 排序字符串。
+
+    返回值:
+    - 排序字段元组。
+    """
+    if sort.lstrip('-') == 'id':
+        return (sort,)
+    return (sort, '-id' if sort.startswith('-') else 'id')
+
+
+def querystring_without_page(request):
+    """
+    返回去掉 page 参数后的查询字符串，分页链接用它保留筛选条件。
+
+    参数:
+    - request: HttpRequest对象。
+
+    返回值:
+    - 查询字符串，非空时以'&'结尾，可直接拼接 page 参数。
+    """
+    params = request.GET.copy()
+    params.pop('page', None)
+    encoded = params.urlencode()
+    return encoded + '&' if encoded else ''
+
+
 def is_manager(user):
     """
     检查用户是否为经理。
@@ -35,14 +100,27 @@ def products(request):
     """
     显示所有产品的页面。
 
+    支持按标题搜索(使用商品全文索引)、按列排序和游标分页，
+    分类通过 select_related 一并查询，每页的查询次数固定。
+
     参数:
     - request: HttpRequest 对象。
 
     返回值:
     - HttpResponse 对象，渲染的产品页面。
     """
-    products = Product.objects.all()  # 获取所有产品
-    context = {'title':'产品' ,'products':products}  # 页面上下文
+    query = request.GET.get('q', '').strip()  # 搜索关键字
+    sort = get_sort(request, PRODUCT_SORTS, '-date_created')  # 排序字段
+    products = Product.objects.select_related('category').only(
+        'id', 'title', 'slug', 'price', 'date_created', 'category__title'
+    )  # 获取产品及其分类
+    if query:
+        products = get_search_backend().filter_by_title(products, query)
+    paginator = KeysetPaginator(products, LIST_PER_PAGE, ordering=keyset_ordering(sort))
+    context = {
+        'title':'产品', 'products': paginator.get_page(request.GET.get('page')),
+        'q': query, 'sort': sort, 'querystring': querystring_without_page(request),
+    }  # 页面上下文
     return render(request, 'products.html', context)  # 渲染页面
 
 @user_passes_test(is_manager)
@@ -141,14 +219,28 @@ def orders(request):
     """
     显示所有订单的页面。
 
+    订单按支付状态、发货状态和日期范围筛选后在服务端分页，
+    用户通过 select_related 一并查询，总价读取订单上存储的值，
+    无论订单表有多大，每页的查询次数都是固定的。
+
     参数:
     - request: HttpRequest对象，表示客户端请求的数据和相关信息。
 
     返回值:
     - HttpResponse对象，渲染的订单页面。
     """
-    orders = Order.objects.all()  # 获取所有订单
-    context = {'title':'订单', 'orders':orders}  # 准备上下文数据
+    form = OrderFilterForm(request.GET)  # 筛选表单
+    orders = form.filter(Order.objects.select_related('user').only(
+        'id', 'created', 'status', 'shipped', 'total_price', 'user__full_name'
+    ))  # 获取筛选后的订单
+    querystring = querystring_without_page(request)
+    # 筛选结果的订单数量按订单命名空间版本号缓存，翻页时不再重复COUNT
+    count_key = versioned_key(ORDERS_NAMESPACE, 'count', hashlib.md5(querystring.encode()).hexdigest())
+    context = {
+        'title':'订单', 'form': form,
+        'orders': paginat(request, orders, keyset=False, per_page=ORDERS_PER_PAGE, count_key=count_key),
+        'querystring': querystring,
+    }  # 准备上下文数据
     return render(request, 'orders.html', context)  # 渲染订单列表页面
 
 # 确保只有经理能访问订单详情页面
@@ -167,13 +259,13 @@ def order_detail(request, id):
     返回值:
     - HttpResponse对象，渲染的订单详情页面。
     """
-    # 根据ID获取订单
-    order = Order.objects.filter(id=id).first()
-    # 获取该订单的所有商品
-    items = OrderItem.objects.filter(order=order).all()
+    # 根据ID获取订单，用户一并查询
+    order = Order.objects.select_related('user').filter(id=id).first()
+    # 获取该订单的所有商品，商品一并查询，模板中逐项访问商品时不再单独查询
+    items = OrderItem.objects.filter(order=order).select_related('product')
     # 获取订单所属用户的默认收货地址
     user = order.user
-    addresses = ShippingAddress.objects.filter(user=user, default=True)
+    addresses = ShippingAddress.objects.filter(user=user, default__in=[True])  # 使用 (user, default) 索引
 
     # 处理POST请求，更新订单发货状态
     if request.method == 'POST':
@@ -210,14 +302,28 @@ def users(request):
     """
     显示所有用户的页面。
 
+    支持按邮箱前缀搜索(不区分大小写，在 lower(email) 的索引上做范围查询)、按列排序和游标分页。
+
     参数:
     - request: HttpRequest对象，表示客户端请求的数据和相关信息。
 
     返回值:
     - HttpResponse对象，渲染的用户管理页面。
     """
-    users = User.objects.all()  # 获取所有用户
-    context = {'title': '用户管理', 'users': users}  # 准备上下文数据
+    query = request.GET.get('q', '').strip()  # 搜索关键字
+    sort = get_sort(request, USER_SORTS, '-id')  # 排序字段
+    users = User.objects.only('id', 'full_name', 'email', 'is_active', 'is_manager')  # 获取用户
+    if query:
+        # 邮箱前缀匹配，写成 lower(email) 上的范围条件以便使用 user_email_lower_idx 索引
+        prefix = query.lower()
+        users = users.alias(email_lower=Lower('email')).filter(
+            email_lower__gte=prefix, email_lower__lt=prefix + '\U0010ffff'
+        )
+    paginator = KeysetPaginator(users, LIST_PER_PAGE, ordering=keyset_ordering(sort))
+    context = {
+        'title': '用户管理', 'users': paginator.get_page(request.GET.get('page')),
+        'q': query, 'sort': sort, 'querystring': querystring_without_page(request),
+    }  # 准备上下文数据
     return render(request, 'users.html', context)  # 渲染用户列表页面
 
 
@@ -0,0 +1,59 @@
+"""
+gunicorn 的生产环境配置，gunicorn 在当前目录启动时会自动读取本文件:
+
+    gunicorn online_shop.wsgi:application
+
+所有视图都是同步的，因此使用 WSGI 和同步/线程 worker；ASGI 入口(online_shop/asgi.py)
+会把每个同步视图放到线程池中执行，反而增加开销。
+
+可通过环境变量调整:
+- GUNICORN_BIND: 监听地址，默认 0.0.0.0:8000。
+- WEB_CONCURRENCY: worker 进程数，默认为 2 * CPU核数 + 1。
+- GUNICORN_THREADS: 每个 worker 的线程数，默认1；大于1时使用 gthread worker，
+  适合等待数据库或缓存时间较长的部署，内存占用比增加进程少。
+- GUNICORN_TIMEOUT: worker 处理一个请求的最长秒数，默认30。
+"""
+import os
+
+
+def cpu_count():
+    """
+    当前进程可用的CPU核数。
+
+    依次考虑 cgroup v2 的CPU配额(容器的 --cpus 限制)和CPU亲和性，都不可用时使用 os.cpu_count()。
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            count = min(count, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return count
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY') or 2 * cpu_count() + 1)
+threads = int(os.environ.get('GUNICORN_THREADS') or 1)
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+graceful_timeout = 30
+# 前面有 nginx 时保持连接，减少代理与 gunicorn 之间重新建立连接
+keepalive = 5
+
+# 在主进程中加载应用后再 fork，worker 共享已导入的代码，启动更快、占用内存更少
+preload_app = True
+# 处理一定数量的请求后重启 worker，限制内存泄漏和碎片的影响；随机抖动避免所有 worker 同时重启
+max_requests = 1000
+max_requests_jitter = 100
+
+# worker 心跳文件放在内存文件系统中，避免容器的磁盘IO阻塞心跳导致 worker 被误杀
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
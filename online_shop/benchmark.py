@@ -0,0 +1,283 @@
+"""
+页面性能基准。
+
+用Django测试客户端在进程内依次请求主要页面，统计每个场景的延迟分位数(p50/p95/p99)、
+每个请求的SQL查询数和吞吐量(RPS)，结果可以保存为JSON基线，与其他提交的基线比较。
+
+请求不经过网络和WSGI服务器，测到的是视图、中间件、模板、数据库和缓存的耗时，
+适合比较代码改动前后的差异，不代表线上的绝对延迟。
+所有场景在一个事务中执行，结束后回滚，下单和加购物车不会留下数据。
+"""
+import json
+import math
+import subprocess
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.services import QueryCounter
+
+# 基线文件格式的版本号
+BASELINE_VERSION = 1
+
+
+class Scenario:
+    """
+    一个基准场景：以某个身份反复请求同一个URL。
+
+    属性:
+    - name: 场景名称，基线中以它为键。
+    - path: 请求路径。
+    - method: 请求方法，'get' 或 'post'。
+    - data: 请求数据。
+    - user: 登录的用户，None表示匿名访问。
+    - setup: 可选，场景开始前用已登录的客户端调用一次的函数，例如先往购物车里加商品。
+    """
+
+    def __init__(self, name, path, method='get', data=None, user=None, setup=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.user = user
+        self.setup = setup
+
+    def client(self):
+        client = Client(HTTP_HOST=benchmark_host())
+        if self.user is not None:
+            client.force_login(self.user)
+        return client
+
+
+def benchmark_host():
+    """
+    选择请求使用的主机名。
+
+    测试客户端默认的 testserver 只在测试运行器中被允许，这里使用 ALLOWED_HOSTS 中的第一个具体主机名，
+    没有时使用 localhost(DEBUG 模式下总是被允许)。
+    """
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def percentile(sorted_values, p):
+    """
+    计算已排序数据的百分位数，相邻两个值之间线性插值。
+
+    参数:
+    - sorted_values: 升序排列的数值列表，不能为空。
+    - p: 百分位，0到100。
+
+    返回:
+    - 浮点数。
+    """
+    position = (len(sorted_values) - 1) * p / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(durations, queries, statuses, elapsed):
+    """
+    汇总一个场景的测量结果。
+
+    参数:
+    - durations: 每个请求的耗时(秒)列表。
+    - queries: 每个请求的查询数列表。
+    - statuses: 每个请求的响应状态码列表。
+    - elapsed: 所有请求的总耗时(秒)，包括请求之间的开销。
+
+    返回:
+    - 字典，耗时单位为毫秒。
+    """
+    ordered = sorted(durations)
+    return {
+        'requests': len(durations),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'mean_ms': round(sum(durations) / len(durations) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'queries': round(sum(queries) / len(queries), 2),
+        'rps': round(len(durations) / elapsed, 1) if elapsed else 0.0,
+        'errors': sum(1 for status in statuses if status >= 400),
+    }
+
+
+def run_scenario(scenario, iterations, warmup=0, cold_cache=False):
+    """
+    执行一个场景并统计结果。
+
+    预热请求不计入统计，用于填充缓存和让查询计划、模板加载达到稳定状态。
+
+    参数:
+    - scenario: Scenario实例。
+    - iterations: 计入统计的请求数。
+    - warmup: 预热请求数。
+    - cold_cache: 为True时每个请求前清空缓存，测量缓存未命中时的耗时。
+
+    返回:
+    - summarize() 返回的字典。
+    """
+    client = scenario.client()
+    if scenario.setup is not None:
+        scenario.setup(client)
+    request = getattr(client, scenario.method)
+    for _ in range(warmup):
+        request(scenario.path, scenario.data)
+
+    durations, queries, statuses = [], [], []
+    elapsed = 0.0
+    for _ in range(iterations):
+        if cold_cache:
+            cache.clear()
+        # 作为所有数据库连接的 execute_wrapper 使用，只计数、不记录SQL
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            start = time.perf_counter()
+            response = request(scenario.path, scenario.data)
+            duration = time.perf_counter() - start
+        elapsed += duration
+        durations.append(duration)
+        queries.append(counter.count)
+        statuses.append(response.status_code)
+    return summarize(durations, queries, statuses, elapsed)
+
+
+def default_scenarios(user, manager, product, category, search_query):
+    """
+    生成默认的基准场景：首页、搜索、分类页、商品详情、加入购物车、下单和后台订单列表。
+
+    参数:
+    - user: 普通用户，用于加入购物车和下单。
+    - manager: 经理用户，用于后台页面。
+    - product: 商品详情页和加入购物车使用的商品。
+    - category: 分类页使用的分类。
+    - search_query: 搜索关键词。
+
+    返回:
+    - Scenario列表。
+    """
+    add_path = reverse('cart:api_add_to_cart', args=[product.id])
+
+    def fill_cart(client):
+        client.post(add_path, {'quantity': 1})
+
+    return [
+        Scenario('home', reverse('shop:home_page')),
+        Scenario('search', reverse('shop:search'), data={'q': search_query}),
+        Scenario('category', reverse('shop:filter_by_category', args=[category.slug])),
+        Scenario('product_detail', reverse('shop:product_detail', args=[product.slug])),
+        Scenario('home_user', reverse('shop:home_page'), user=user),
+        Scenario('product_detail_user', reverse('shop:product_detail', args=[product.slug]), user=user),
+        Scenario('cart_add', add_path, method='post', data={'quantity': 1}, user=user),
+        Scenario('checkout', reverse('orders:create_order'), user=user, setup=fill_cart),
+        Scenario('user_orders', reverse('orders:user_orders'), user=user),
+        Scenario('dashboard_orders', reverse('dashboard:orders'), user=manager),
+        Scenario('dashboard_products', reverse('dashboard:products'), user=manager),
+    ]
+
+
+def git_revision():
+    """
+    获取当前代码的git提交，不在git仓库中时返回None。
+    """
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def make_baseline(results, options):
+    """
+    生成基线数据。
+
+    参数:
+    - results: 字典，场景名称 -> summarize() 的结果。
+    - options: 字典，执行基准时的参数，如迭代次数。
+
+    返回:
+    - 可以序列化为JSON的字典。
+    """
+    return {
+        'version': BASELINE_VERSION,
+        'commit': git_revision(),
+        'created': timezone.now().isoformat(),
+        'options': options,
+        'scenarios': results,
+    }
+
+
+def load_baseline(path):
+    """
+    读取JSON基线文件。
+
+    参数:
+    - path: 文件路径。
+
+    返回:
+    - 基线字典。
+    """
+    with open(path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        raise ValueError('不支持的基线版本: %r' % baseline.get('version'))
+    return baseline
+
+
+def save_baseline(path, baseline):
+    """
+    把基线写入JSON文件。
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, threshold=0.2, min_delta_ms=1.0):
+    """
+    与基线比较，找出退化的场景。
+
+    p95延迟超过基线的 (1 + threshold) 倍且增加超过 min_delta_ms 毫秒，或者平均查询数比基线多出半个以上时视为退化。
+    整页缓存命中的请求只需不到1毫秒，绝对差值的下限避免把这类请求的测量噪声当作退化。
+    只比较两边都有的场景。
+
+    参数:
+    - results: 字典，场景名称 -> summarize() 的结果。
+    - baseline: load_baseline() 返回的基线。
+    - threshold: 允许的p95延迟增长比例。
+    - min_delta_ms: 视为退化的p95延迟最小增加量(毫秒)。
+
+    返回:
+    - (rows, regressions)。rows为列表，元素为 (场景名称, 基线结果, 本次结果)；
+      regressions为退化说明的列表。
+    """
+    rows = []
+    regressions = []
+    for name, current in results.items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        rows.append((name, previous, current))
+        if (
+            current['p95_ms'] > previous['p95_ms'] * (1 + threshold)
+            and current['p95_ms'] - previous['p95_ms'] > min_delta_ms
+        ):
+            regressions.append('%s: p95 %.2fms -> %.2fms' % (name, previous['p95_ms'], current['p95_ms']))
+        if current['queries'] > previous['queries'] + 0.5:
+            regressions.append('%s: queries %.2f -> %.2f' % (name, previous['queries'], current['queries']))
+    return rows, regressions
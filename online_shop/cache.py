@@ -0,0 +1,294 @@
+"""
+缓存配置和缓存键工具。
+
+settings.py 通过 cache_settings() 根据环境变量选择缓存后端:
+
+- SHOP_CACHE_BACKEND: locmem(默认，每个进程独立)、file、sqlite(同一台机器的所有进程共享)或 redis。
+- SHOP_CACHE_LOCATION: 缓存位置，含义取决于后端(目录、SQLite文件路径或Redis地址)。
+- SHOP_CACHE_KEY_PREFIX: 所有缓存键的前缀，多个站点共用一个缓存时用来区分，默认为 online_shop。
+- SHOP_CACHE_TIMEOUT: 默认缓存时间(秒)，默认为300。
+- SHOP_CACHE_MAX_ENTRIES: 最多保存的条目数(locmem、file、sqlite)，默认为10000。
+
+会话引擎由 session_engine() 根据 SHOP_SESSION_ENGINE 选择，见该函数说明。
+
+各应用的缓存键通过 versioned_key() 生成，键中包含命名空间的版本号，
+bump_namespace() 更新版本号后该命名空间下的所有缓存一起失效，不需要逐个删除。
+"""
+import importlib.util
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+# 命名空间版本号的缓存键
+NAMESPACE_VERSION_KEY = '%s:version'
+
+
+def _default_sqlite_location():
+    """
+    SQLite缓存文件的默认位置，优先放在内存文件系统 /dev/shm 中。
+    """
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'online_shop_cache.sqlite3')
+
+
+def cache_settings(environ=None):
+    """
+    根据环境变量生成 CACHES 设置。
+
+    参数:
+    - environ: 环境变量字典，默认为 os.environ。
+
+    返回:
+    - CACHES 设置字典。
+    """
+    environ = os.environ if environ is None else environ
+    backend = environ.get('SHOP_CACHE_BACKEND', 'locmem')
+    location = environ.get('SHOP_CACHE_LOCATION')
+    if backend == 'locmem':
+        config = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': location or 'online_shop',
+        }
+    elif backend == 'file':
+        config = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location or os.path.join(tempfile.gettempdir(), 'online_shop_cache'),
+        }
+    elif backend == 'sqlite':
+        config = {
+            'BACKEND': 'online_shop.cache.SQLiteCache',
+            'LOCATION': location or _default_sqlite_location(),
+        }
+    elif backend == 'redis':
+        if importlib.util.find_spec('redis') is None:
+            raise ImproperlyConfigured('SHOP_CACHE_BACKEND=redis 需要安装 redis 包')
+        config = {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': location or environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        }
+    else:
+        raise ImproperlyConfigured('未知的缓存后端: %s' % backend)
+    config['KEY_PREFIX'] = environ.get('SHOP_CACHE_KEY_PREFIX', 'online_shop')
+    config['TIMEOUT'] = int(environ.get('SHOP_CACHE_TIMEOUT', 300))
+    if backend != 'redis':
+        config['OPTIONS'] = {'MAX_ENTRIES': int(environ.get('SHOP_CACHE_MAX_ENTRIES', 10000))}
+    return {'default': config}
+
+
+def session_engine(environ=None):
+    """
+    根据环境变量 SHOP_SESSION_ENGINE 选择会话引擎。
+
+    可选值:
+    - db: 每个读取会话的请求查询一次 django_session，修改时再写一次。
+    - cached_db: 读取走缓存，只有会话被修改时才写数据库。
+    - cache: 只保存在缓存中，缓存被清空时用户需要重新登录。
+    - signed_cookies: 会话保存在签名cookie中，服务端没有任何会话IO，大小受cookie限制(约4KB)。
+    未设置时，缓存后端可以跨进程共享(file、sqlite、redis)则使用 cached_db，
+    否则使用 db：各进程独立的 locmem 缓存会让 cached_db 在多进程部署中读到旧会话。
+
+    参数:
+    - environ: 环境变量字典，默认为 os.environ。
+
+    返回:
+    - SESSION_ENGINE 设置值。
+    """
+    environ = os.environ if environ is None else environ
+    engine = environ.get('SHOP_SESSION_ENGINE')
+    if engine is None:
+        engine = 'db' if environ.get('SHOP_CACHE_BACKEND', 'locmem') == 'locmem' else 'cached_db'
+    if engine not in ('db', 'cached_db', 'cache', 'signed_cookies'):
+        raise ImproperlyConfigured('未知的会话引擎: %s' % engine)
+    return 'django.contrib.sessions.backends.%s' % engine
+
+
+def namespace_version(namespace):
+    """
+    获取命名空间的当前版本号，缓存中不存在时初始化一个新的版本号。
+
+    参数:
+    - namespace: 命名空间名称，例如 'catalog'。
+
+    返回:
+    - 整数，版本号。
+    """
+    key = NAMESPACE_VERSION_KEY % namespace
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_namespace(namespace):
+    """
+    更新命名空间的版本号，使该命名空间下所有进程缓存的数据失效。
+
+    参数:
+    - namespace: 命名空间名称。
+    """
+    cache.set(NAMESPACE_VERSION_KEY % namespace, time.time_ns(), None)
+
+
+def versioned_key(namespace, *parts, version=None):
+    """
+    生成带命名空间版本号的缓存键，格式为 "命名空间:版本号:部分1:部分2..."。
+
+    参数:
+    - namespace: 命名空间名称。
+    - parts: 缓存键的其余部分。
+    - version: 命名空间版本号，批量生成缓存键时可以先取一次版本号传入。
+
+    返回:
+    - 缓存键字符串。
+    """
+    if version is None:
+        version = namespace_version(namespace)
+    return ':'.join([namespace, str(version)] + [str(part) for part in parts])
+
+
+class SQLiteCache(BaseCache):
+    """
+    保存在SQLite文件中的缓存后端，同一台机器上的所有进程共享同一份缓存。
+
+    使用WAL模式和内存映射读取，文件默认放在内存文件系统 /dev/shm 中，
+    读取基本不产生磁盘IO，适合不方便部署Redis的单机多进程环境。
+    每个线程使用自己的连接，进程fork后会重新连接。
+
+    OPTIONS:
+    - MAX_ENTRIES: 最多保存的条目数，默认300。
+    - CULL_FREQUENCY: 超过上限时删除 1/CULL_FREQUENCY 的条目，默认3。
+    - MMAP_SIZE: 内存映射的字节数，默认256MB。
+    """
+    # 每写入多少次检查一次是否需要清理
+    CULL_CHECK_INTERVAL = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._mmap_size = int(params.get('OPTIONS', {}).get('MMAP_SIZE', 256 * 1024 * 1024))
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        """
+        获取当前线程的数据库连接，第一次使用时建表。
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA mmap_size=%d' % self._mmap_size)
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _alive(expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or not self._alive(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        mapping = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not mapping:
+            return {}
+        rows = self._connection().execute(
+            'SELECT key, value, expires FROM cache WHERE key IN (%s)' % ', '.join('?' * len(mapping)),
+            list(mapping),
+        ).fetchall()
+        return {mapping[key]: pickle.loads(value) for key, value, expires in rows if self._alive(expires)}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout)),
+        )
+        self._maybe_cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        # 已有条目过期时可以覆盖，否则不写入
+        cursor = connection.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout), time.time()),
+        )
+        self._maybe_cull()
+        return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        # BEGIN IMMEDIATE 取得写锁，读取和写回之间不会被其他进程修改
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None or not self._alive(row[1]):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?', (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key)
+            )
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute('SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+        return row is not None and self._alive(row[0])
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _maybe_cull(self):
+        """
+        定期删除过期条目，条目数仍超过上限时删除最早过期的一部分。
+        """
+        self._writes += 1
+        if self._writes % self.CULL_CHECK_INTERVAL:
+            return
+        connection = self._connection()
+        connection.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
@@ -1,32 +1,42 @@
-# 从购物车工具包导入Cart类
-from cart.utils.cart import Cart
-# 从商店模型导入Category类
-from shop.models import Category
+# 从购物车工具包导入读取购物车摘要的函数
+from cart.utils.cart import get_request_cart_summary
+from django.utils.functional import SimpleLazyObject
+
+from online_shop.metrics import timed
+
+# 从商店工具包导入分类树服务
+from shop.utils.category_tree import get_request_category_tree, get_tree_version
 
 def return_cart(request):
     """
     获取并返回当前用户的购物车中的项目数量。
 
+    登录用户的摘要按用户缓存，未登录用户的摘要在会话中增量维护，都不会查询商品表。
+    摘要是惰性对象，只有模板真正使用时才会读取。
+
     参数:
     - request: HttpRequest对象，表示客户端的HTTP请求。
 
     返回值:
-    - 一个字典，包含购物车中的项目数量。
+    - 一个字典，包含购物车中的项目数量和购物车摘要。
     """
-    # 获取购物车中项目的数量
-    cart = len(list(Cart(request)))
-    return {'cart_count': cart}
+    # 惰性读取购物车摘要，读取耗时计入 Server-Timing 的 cp-cart
+    summary = SimpleLazyObject(timed('cp-cart')(lambda: get_request_cart_summary(request)))
+    return {'cart_count': SimpleLazyObject(lambda: summary['count']), 'cart_summary': summary}
 
 def return_categories(request):
     """
-    获取并返回网站中的所有商品分类。
+    获取并返回网站中的顶级商品分类，子分类通过节点的children访问。
+
+    分类树是惰性对象，只有模板真正渲染导航栏时才会读取缓存或查询数据库。
+    导航栏按分类树版本号做片段缓存，命中时不会构建分类树。
 
     参数:
     - request: HttpRequest对象，表示客户端的HTTP请求。
 
     返回值:
-    - 一个字典，包含所有的商品分类。
+    - 一个字典，包含顶级分类节点列表和分类树版本号。
     """
-    # 获取所有分类
-    categories = Category.objects.all()
-    return {'categories': categories}
+    # 惰性获取顶级分类
+    categories = SimpleLazyObject(timed('cp-categories')(lambda: get_request_category_tree(request).roots))
+    return {'categories': categories, 'category_tree_version': SimpleLazyObject(get_tree_version)}
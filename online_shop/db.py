@@ -0,0 +1,26 @@
+"""
+数据库连接的初始化。
+
+Django 4.0 的SQLite后端不支持在连接参数中设置 PRAGMA，这里在每个新连接建立时
+执行 SHOP_SQLITE_PRAGMAS 中的设置，例如生产环境使用WAL模式，读请求不会被写请求阻塞。
+配合 CONN_MAX_AGE，每个 worker 线程只在第一次连接时执行一次。
+"""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    connection_created 信号的处理函数，为SQLite连接执行 SHOP_SQLITE_PRAGMAS 中的 PRAGMA。
+
+    参数:
+    - sender: 数据库后端的类。
+    - connection: 新建立的数据库连接。
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SHOP_SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s=%s' % (name, value))
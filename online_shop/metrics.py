@@ -0,0 +1,365 @@
+"""
+请求耗时的进程内统计。
+
+MetricsMiddleware 为每个请求记录:
+- 总耗时、数据库耗时和查询次数(connection.execute_wrapper)；
+- 模板渲染耗时(最外层的模板渲染，包含其中惰性求值的上下文处理器)；
+- 上下文处理器耗时(用 timed() 包装的惰性对象，如购物车摘要和分类树)；
+- 缓存命中和未命中次数(默认缓存的 get/get_many，包括整页缓存和模板片段缓存)。
+
+这些数据通过 Server-Timing 响应头返回给浏览器开发者工具，同时按URL名称汇总到
+进程内的直方图中，由 /metrics 以 Prometheus 文本格式输出。
+直方图的桶边界按 2 的 k/2 次方秒对数分布，每个桶的相对误差不超过约41%，
+与HDR直方图一样用固定的少量内存覆盖从0.1毫秒到一分钟的范围。
+统计数据保存在各进程内存中，多进程部署时每个进程分别统计。
+
+SHOP_METRICS_ENABLED 为 False 时中间件不会被加载，也不会包装模板引擎和缓存实例。
+"""
+import bisect
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template import engines
+
+# 当前请求的耗时记录，不在请求中时为None
+_current = contextvars.ContextVar('shop_request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    一个请求中各部分的耗时(秒)和计数。
+
+    属性:
+    - db: 数据库耗时。
+    - queries: 查询次数。
+    - template: 模板渲染耗时。
+    - template_depth: 正在进行的模板渲染层数，只统计最外层。
+    - sections: 字典，timed() 记录的各部分耗时，例如 {'cp-cart': 0.001}。
+    - cache_hits, cache_misses: 缓存命中、未命中次数。
+    """
+    __slots__ = ('db', 'queries', 'template', 'template_depth', 'sections', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.template = 0.0
+        self.template_depth = 0
+        self.sections = defaultdict(float)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        作为 execute_wrapper 使用，累计数据库耗时。
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self, total):
+        """
+        生成 Server-Timing 响应头的值。
+
+        参数:
+        - total: 请求总耗时(秒)。
+
+        返回:
+        - 字符串。
+        """
+        metrics = [
+            'total;dur=%.1f' % (total * 1000),
+            'db;dur=%.1f;desc="%d queries"' % (self.db * 1000, self.queries),
+            'tpl;dur=%.1f' % (self.template * 1000),
+        ]
+        metrics += ['%s;dur=%.1f' % (name, duration * 1000) for name, duration in self.sections.items()]
+        metrics.append('cache;desc="hit=%d miss=%d"' % (self.cache_hits, self.cache_misses))
+        return ', '.join(metrics)
+
+
+def timed(name):
+    """
+    记录函数耗时的装饰器，耗时计入当前请求的 sections[name]，不在请求中时直接调用。
+
+    参数:
+    - name: 名称，会出现在 Server-Timing 响应头和 /metrics 中。
+
+    返回:
+    - 装饰器。
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.sections[name] += time.perf_counter() - start
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    """
+    对数分桶的直方图。
+
+    BOUNDS 为各桶的上边界(秒)，从 2^-13(约0.12毫秒)到 2^6(64秒)，每两个桶翻一倍。
+    """
+    BOUNDS = tuple(2 ** (k / 2) for k in range(-26, 13))
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        # 最后一个桶统计超过所有边界的值
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    进程内的指标集合，按 (指标名, 标签) 保存直方图和计数器。
+    """
+
+    HISTOGRAMS = {
+        'shop_request_duration_seconds': '请求总耗时',
+        'shop_db_duration_seconds': '每个请求的数据库耗时',
+        'shop_template_duration_seconds': '每个请求的模板渲染耗时',
+        'shop_section_duration_seconds': '每个请求中各部分(如上下文处理器)的耗时',
+    }
+    COUNTERS = {
+        'shop_requests_total': '请求数',
+        'shop_db_queries_total': 'SQL查询数',
+        'shop_cache_hits_total': '缓存命中次数',
+        'shop_cache_misses_total': '缓存未命中次数',
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(int)
+
+    def record(self, view, status, total, timings):
+        """
+        把一个请求的耗时记录到直方图和计数器中。
+
+        参数:
+        - view: URL名称。
+        - status: 响应状态码。
+        - total: 请求总耗时(秒)。
+        - timings: RequestTimings实例。
+        """
+        labels = (('view', view),)
+        with self.lock:
+            self.histograms['shop_request_duration_seconds', labels].observe(total)
+            self.histograms['shop_db_duration_seconds', labels].observe(timings.db)
+            self.histograms['shop_template_duration_seconds', labels].observe(timings.template)
+            for name, duration in timings.sections.items():
+                self.histograms['shop_section_duration_seconds', labels + (('section', name),)].observe(duration)
+            self.counters['shop_requests_total', labels + (('status', str(status)),)] += 1
+            self.counters['shop_db_queries_total', labels] += timings.queries
+            self.counters['shop_cache_hits_total', labels] += timings.cache_hits
+            self.counters['shop_cache_misses_total', labels] += timings.cache_misses
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                                 for key, value in pairs)
+
+    def render(self):
+        """
+        以 Prometheus 文本格式输出所有指标。
+
+        返回:
+        - 字符串。
+        """
+        with self.lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+        lines = []
+        for name, help_text in self.HISTOGRAMS.items():
+            lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s histogram' % name]
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(Histogram.BOUNDS, counts):
+                    cumulative += bucket
+                    lines.append('%s_bucket%s %d' % (name, self._labels(labels, [('le', '%.6g' % bound)]), cumulative))
+                lines.append('%s_bucket%s %d' % (name, self._labels(labels, [('le', '+Inf')]), count))
+                lines.append('%s_sum%s %.6f' % (name, self._labels(labels), total))
+                lines.append('%s_count%s %d' % (name, self._labels(labels), count))
+        for name, help_text in self.COUNTERS.items():
+            lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s counter' % name]
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append('%s%s %d' % (name, self._labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _timed_render(render):
+    """
+    包装模板的 render 方法，耗时计入当前请求的模板渲染耗时。
+    """
+    @wraps(render)
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return render(*args, **kwargs)
+        # 只统计最外层的模板渲染，模板标签中再次渲染的模板已包含在内
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template += time.perf_counter() - start
+    return wrapper
+
+
+def _timed_loader(load):
+    """
+    包装模板引擎的 get_template 或 from_string，为返回的模板包装 render 方法。
+    """
+    @wraps(load)
+    def wrapper(*args, **kwargs):
+        template = load(*args, **kwargs)
+        template.render = _timed_render(template.render)
+        return template
+    return wrapper
+
+
+def instrument_templates():
+    """
+    包装各模板引擎实例的 get_template 和 from_string，使模板渲染耗时计入当前请求。
+
+    只修改引擎实例，不替换模板类的方法；已包装的引擎不会重复包装。
+    """
+    for backend in engines.all():
+        if getattr(backend, '_shop_metrics', False):
+            continue
+        backend._shop_metrics = True
+        backend.get_template = _timed_loader(backend.get_template)
+        backend.from_string = _timed_loader(backend.from_string)
+
+
+def instrument_cache(cache):
+    """
+    包装缓存实例的读取方法，使命中和未命中次数计入当前请求。
+
+    只修改传入的实例，已包装的实例不会重复包装。BaseCache.get_many 逐个调用 get，
+    后端没有覆盖 get_many 时只在 get 中计数，一次读取多个键时不会重复统计。
+
+    参数:
+    - cache: 缓存后端实例。
+    """
+    if getattr(cache, '_shop_metrics', False):
+        return
+    cache._shop_metrics = True
+    get, get_many = cache.get, cache.get_many
+    missing = object()
+
+    @wraps(get)
+    def counted_get(key, default=None, version=None):
+        value = get(key, missing, version)
+        timings = _current.get()
+        if timings is not None:
+            if value is missing:
+                timings.cache_misses += 1
+            else:
+                timings.cache_hits += 1
+        return default if value is missing else value
+
+    @wraps(get_many)
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version)
+        timings = _current.get()
+        if timings is not None:
+            timings.cache_hits += len(values)
+            timings.cache_misses += len(keys) - len(values)
+        return values
+
+    cache.get = counted_get
+    if type(cache).get_many is not BaseCache.get_many:
+        cache.get_many = counted_get_many
+
+
+class MetricsMiddleware:
+    """
+    统计每个请求的耗时，添加 Server-Timing 响应头并记录到进程内的直方图。
+
+    应放在 MIDDLEWARE 的最前面，其他中间件的耗时和查询也会被统计。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SHOP_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SHOP_SERVER_TIMING', True)
+        instrument_templates()
+
+    def __call__(self, request):
+        # 每个线程有各自的缓存实例(包括整页缓存和模板片段缓存使用的)，在请求开始时包装
+        instrument_cache(caches['default'])
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        if view != 'metrics':
+            registry.record(view, response.status_code, total, timings)
+        if self.server_timing:
+            response['Server-Timing'] = timings.server_timing(total)
+        return response
+
+
+def metrics_view(request):
+    """
+    以 Prometheus 文本格式输出本进程的指标。
+
+    只允许 SHOP_METRICS_ALLOWED_IPS 中的地址访问，统计未开启时返回404。
+
+    参数:
+    - request: HttpRequest对象。
+
+    返回值:
+    - HttpResponse对象。
+    """
+    if not getattr(settings, 'SHOP_METRICS_ENABLED', False):
+        raise Http404
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'SHOP_METRICS_ALLOWED_IPS', ('127.0.0.1',)):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,241 @@
+"""
+按请求记录SQL查询，找出重复执行的查询(N+1)并检查查询预算。
+
+- record_queries(): 上下文管理器，通过 connection.execute_wrapper 记录其中执行的每个查询，
+  包括SQL、耗时和发起查询的模板位置或项目代码位置。
+- QueryInspectorMiddleware: 按 SHOP_QUERY_INSPECTOR_SAMPLE_RATE 抽样记录请求的查询，
+  发现N+1或超出预算时写入 online_shop.queries 日志。采样率为0(生产环境)时中间件不会被加载。
+- QueryBudgetTestMixin: 测试用的混入类，断言请求的查询次数不超过 SHOP_QUERY_BUDGETS 中该URL名称的预算。
+
+同一SQL去掉参数差异后的"指纹"相同即视为同一个查询，同一指纹执行次数达到
+SHOP_QUERY_N_PLUS_ONE_THRESHOLD 时视为N+1：通常是模板或循环中逐个对象访问了关联对象。
+"""
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('online_shop.queries')
+
+# 同一指纹的查询执行次数达到该值时视为N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+# 指纹中需要抹去的差异：字符串和数字字面量、IN 列表的长度、空白
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    生成SQL的指纹，只有参数值或 IN 列表长度不同的查询指纹相同。
+
+    参数:
+    - sql: SQL语句。
+
+    返回:
+    - 指纹字符串。
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _query_origin():
+    """
+    沿调用栈向外查找发起查询的位置。
+
+    模板中触发的查询返回最内层模板节点的 "模板名:行号"，否则返回最内层项目代码的 "文件:行号 in 函数"，
+    都找不到时返回 None。
+    """
+    base_dir = str(settings.BASE_DIR) + os.sep
+    this_file = __file__
+    code = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return '%s:%s' % (origin.template_name, token.lineno)
+        filename = frame.f_code.co_filename
+        if (
+            code is None
+            and filename.startswith(base_dir)
+            and filename != this_file
+            and 'site-packages' not in filename
+        ):
+            code = '%s:%s in %s' % (os.path.relpath(filename, base_dir), frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return code
+
+
+class QueryRecorder:
+    """
+    作为 execute_wrapper 使用，记录每个查询的SQL、耗时和发起位置。
+
+    属性:
+    - queries: 列表，每个元素为 (sql, 耗时秒数, 发起位置)。
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start, _query_origin()))
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        """
+        所有查询的总耗时(秒)。
+        """
+        return sum(duration for _, duration, _ in self.queries)
+
+    def repeated(self, threshold=2):
+        """
+        按指纹分组，返回执行次数达到 threshold 的查询。
+
+        参数:
+        - threshold: 最少执行次数。
+
+        返回:
+        - 列表，元素为 (指纹, 执行次数, 发起位置计数Counter)，按执行次数降序排列。
+        """
+        counts = Counter()
+        origins = defaultdict(Counter)
+        for sql, _, origin in self.queries:
+            key = fingerprint(sql)
+            counts[key] += 1
+            origins[key][origin] += 1
+        return [(key, count, origins[key]) for key, count in counts.most_common() if count >= threshold]
+
+    def n_plus_one(self):
+        """
+        返回疑似N+1的查询，阈值为 SHOP_QUERY_N_PLUS_ONE_THRESHOLD。
+        """
+        return self.repeated(getattr(settings, 'SHOP_QUERY_N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD))
+
+    def describe(self):
+        """
+        生成可读的查询报告，用于日志和测试失败信息。
+
+        返回:
+        - 多行字符串。
+        """
+        lines = ['%d queries, %.1f ms' % (len(self), self.duration * 1000)]
+        for key, count, origins in self.repeated():
+            lines.append('  %dx %s' % (count, key[:200]))
+            for origin, origin_count in origins.most_common(3):
+                lines.append('      %dx from %s' % (origin_count, origin or '<unknown>'))
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries():
+    """
+    记录上下文中在所有数据库连接上执行的查询。
+
+    返回:
+    - QueryRecorder实例。
+    """
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def get_query_budget(view_name):
+    """
+    获取URL名称对应的查询预算。
+
+    参数:
+    - view_name: 带命名空间的URL名称，例如 'shop:home_page'。
+
+    返回:
+    - 整数，没有设置预算时为None。
+    """
+    return getattr(settings, 'SHOP_QUERY_BUDGETS', {}).get(view_name)
+
+
+class QueryInspectorMiddleware:
+    """
+    抽样记录请求的SQL查询，发现N+1或超出查询预算时记录警告。
+
+    被抽中的请求的响应带有 X-Query-Count 和 X-Query-Time(毫秒) 响应头。
+    应放在 MIDDLEWARE 的最前面，会话、用户等中间件中的查询也会被记录。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'SHOP_QUERY_INSPECTOR_SAMPLE_RATE', 0))
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        response['X-Query-Count'] = len(recorder)
+        response['X-Query-Time'] = '%.1f' % (recorder.duration * 1000)
+
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        budget = get_query_budget(view_name)
+        if recorder.n_plus_one():
+            logger.warning('possible N+1 queries in %s %s (%s)\n%s',
+                           request.method, request.path, view_name, recorder.describe())
+        if budget is not None and len(recorder) > budget:
+            logger.warning('%s %s (%s) executed %d queries, budget is %d\n%s',
+                           request.method, request.path, view_name, len(recorder), budget, recorder.describe())
+        return response
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase的混入类，检查请求的查询次数不超过 SHOP_QUERY_BUDGETS 中的预算。
+    """
+
+    def assertQueryBudget(self, path, data=None, method='get', **extra):
+        """
+        发送请求并断言查询次数不超过该URL名称的预算，超出时在失败信息中给出重复的查询及其发起位置。
+
+        参数:
+        - path: 请求路径。
+        - data: 请求数据。
+        - method: 请求方法，对应测试客户端的方法名。
+        - extra: 传给测试客户端的其他参数。
+
+        返回:
+        - 响应对象。
+        """
+        with record_queries() as recorder:
+            response = getattr(self.client, method)(path, data, **extra)
+        view_name = response.resolver_match.view_name
+        budget = get_query_budget(view_name)
+        self.assertIsNotNone(budget, '%s 没有设置查询预算' % view_name)
+        self.assertLessEqual(
+            len(recorder), budget,
+            '%s (%s) 超出查询预算 %d\n%s' % (path, view_name, budget, recorder.describe()),
+        )
+        self.assertFalse(recorder.n_plus_one(), '%s (%s) 疑似N+1查询\n%s' % (path, view_name, recorder.describe()))
+        return response
@@ -0,0 +1,188 @@
+"""
+热点查询的执行计划检查。
+
+HOT_QUERIES 登记各页面最频繁执行的查询，查询条件与视图中的写法一致，参数使用任意常量：
+执行计划只取决于查询的形状和索引，与参数值无关。
+check_query_plans 命令对每个查询执行 EXPLAIN QUERY PLAN，出现全表扫描时失败。
+新增热点查询或修改视图中的查询时，应同时更新这里的登记。
+
+注意 Django 在SQLite中把布尔字段的 field=True 编译为裸列条件(WHERE "status")，
+SQLite不能用索引匹配这种条件，需要使用索引的布尔条件应写成 field__in=[True]。
+"""
+import re
+
+from django.db import connection
+from django.utils import timezone
+
+# 全表扫描: "SCAN 表名"，后面没有 USING INDEX / USING COVERING INDEX / USING INTEGER PRIMARY KEY
+FULL_SCAN_RE = re.compile(r'^SCAN (?!.*\bUSING\b)')
+# 按索引顺序扫描整个表，只有没有筛选条件的分页查询可以接受
+INDEX_SCAN_RE = re.compile(r'^SCAN ')
+# 需要额外排序的计划，查询仍然使用索引，但结果要在临时B树中排序
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (ORDER|GROUP) BY')
+
+
+def _home_page():
+    from shop.models import Product
+    return Product.objects.order_by('-date_created', '-id')[:20]
+
+
+def _category_page():
+    from shop.models import Product
+    return Product.objects.filter(category_id__in=[1, 2, 3]).order_by('-date_created', '-id')[:20]
+
+
+def _product_detail():
+    from shop.models import Product
+    return Product.objects.filter(slug='slug').order_by()
+
+
+def _related_products():
+    from shop.models import Product
+    return Product.objects.filter(recommended_in__product_id=1).order_by('recommended_in__rank')[:4]
+
+
+def _related_fallback():
+    from shop.models import Product
+    return Product.objects.filter(category_id=1).exclude(id=1)[:4]
+
+
+def _user_orders():
+    from orders.models import Order
+    return Order.objects.filter(user_id=1)[:10]
+
+
+def _order_items():
+    from orders.models import OrderItem
+    return OrderItem.objects.filter(order_id__in=[1, 2, 3])
+
+
+def _dashboard_orders_by_status():
+    from orders.models import Order
+    return Order.objects.filter(status__in=[True], shipped__in=[False])[:20]
+
+
+def _dashboard_orders_by_shipped():
+    from orders.models import Order
+    return Order.objects.filter(shipped__in=[False])[:20]
+
+
+def _dashboard_orders_by_date():
+    from orders.models import Order
+    return Order.objects.filter(created__gte=timezone.now())[:20]
+
+
+def _dashboard_products_by_price():
+    from shop.models import Product
+    return Product.objects.order_by('-price', '-id')[:50]
+
+
+def _dashboard_products_by_title():
+    from shop.models import Product
+    return Product.objects.filter(title__gt='a').order_by('title', 'id')[:50]
+
+
+def _dashboard_users_by_name():
+    from accounts.models import User
+    return User.objects.filter(full_name__gt='a').order_by('full_name', 'id')[:50]
+
+
+def _dashboard_users_by_email():
+    from accounts.models import User
+    return User.objects.filter(email__gt='a').order_by('email', 'id')[:50]
+
+
+def _dashboard_users_email_prefix():
+    from django.db.models.functions import Lower
+    from accounts.models import User
+    return User.objects.alias(email_lower=Lower('email')).filter(
+        email_lower__gte='admin', email_lower__lt='admin\U0010ffff'
+    ).order_by('-id')[:50]
+
+
+def _default_address():
+    from accounts.models import ShippingAddress
+    return ShippingAddress.objects.filter(user_id=1, default__in=[True])
+
+
+def _user_cart():
+    from cart.models import CartItem
+    return CartItem.objects.filter(user_id=1).values_list('product_id', 'quantity', 'price')
+
+
+def _claim_jobs():
+    from tasks.models import Job
+    return (
+        Job.objects.filter(status=Job.PENDING, run_after__lte=timezone.now())
+        .order_by('run_after', 'id').values_list('id', flat=True)[:10]
+    )
+
+
+# 查询名称 -> 返回查询集的函数，查询集在检查时才创建
+HOT_QUERIES = {
+    'shop.home_page': _home_page,
+    'shop.category_page': _category_page,
+    'shop.product_detail': _product_detail,
+    'shop.related_products': _related_products,
+    'shop.related_fallback': _related_fallback,
+    'orders.user_orders': _user_orders,
+    'orders.order_items': _order_items,
+    'dashboard.orders_by_status': _dashboard_orders_by_status,
+    'dashboard.orders_by_shipped': _dashboard_orders_by_shipped,
+    'dashboard.orders_by_date': _dashboard_orders_by_date,
+    'dashboard.products_by_price': _dashboard_products_by_price,
+    'dashboard.products_by_title': _dashboard_products_by_title,
+    'dashboard.users_by_name': _dashboard_users_by_name,
+    'dashboard.users_by_email': _dashboard_users_by_email,
+    'dashboard.users_email_prefix': _dashboard_users_email_prefix,
+    'accounts.default_address': _default_address,
+    'cart.user_cart': _user_cart,
+    'tasks.claim_jobs': _claim_jobs,
+}
+
+
+def explain_query_plan(queryset):
+    """
+    对查询集执行 EXPLAIN QUERY PLAN，只支持SQLite。
+
+    参数:
+    - queryset: 查询集。
+
+    返回:
+    - 执行计划每一行的说明文字列表。
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan, filtered=True):
+    """
+    找出执行计划中的全表扫描。
+
+    有筛选条件的查询按索引顺序扫描整个表(SCAN ... USING INDEX)同样视为全表扫描：
+    条件的选择性越高，找到一页结果需要读取的行越多。
+
+    参数:
+    - plan: explain_query_plan 的返回值。
+    - filtered: 查询是否有筛选条件。
+
+    返回:
+    - 全表扫描的行列表。
+    """
+    pattern = INDEX_SCAN_RE if filtered else FULL_SCAN_RE
+    return [line for line in plan if pattern.match(line)]
+
+
+def temp_sorts(plan):
+    """
+    找出执行计划中需要临时排序的行。
+
+    参数:
+    - plan: explain_query_plan 的返回值。
+
+    返回:
+    - 使用临时B树排序的行列表。
+    """
+    return [line for line in plan if TEMP_SORT_RE.search(line)]
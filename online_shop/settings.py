@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from online_shop.cache import cache_settings, session_engine
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,9 +34,12 @@ INSTALLED_APPS = [
     'orders.apps.OrdersConfig',
     'shop.apps.ShopConfig',
     'dashboard.apps.DashboardConfig',
+    'tasks.apps.TasksConfig',
 ]
 
 MIDDLEWARE = [
+    'online_shop.metrics.MetricsMiddleware',
+    'online_shop.query_inspector.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,12 +78,25 @@ WSGI_APPLICATION = 'online_shop.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # 与生产环境一样可以通过 SHOP_DB_PATH 指定数据库文件
+        'NAME': os.environ.get('SHOP_DB_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# 新建SQLite连接时执行的 PRAGMA，例如 {'journal_mode': 'WAL'}，见 online_shop/db.py
+SHOP_SQLITE_PRAGMAS = {}
+
 AUTH_USER_MODEL = 'accounts.User'
 
+
+# Cache
+# 缓存后端由环境变量 SHOP_CACHE_BACKEND 等选择，见 online_shop/cache.py
+
+CACHES = cache_settings()
+
+# 会话引擎由环境变量 SHOP_SESSION_ENGINE 选择，默认根据缓存后端决定
+SESSION_ENGINE = session_engine()
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -129,6 +147,49 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 LOGIN_URL = 'accounts:user_login'
 
+# 商品列表(首页、搜索、分类)是否使用基于 (date_created, id) 游标的键集分页
+SHOP_KEYSET_PAGINATION = False
+# 键集分页时是否仍然计算商品总数
+SHOP_KEYSET_PAGINATION_COUNT = False
+
+# 匿名访客的商品页面(首页、分类、搜索、详情)整页缓存时间(秒)，0表示不缓存
+SHOP_PAGE_CACHE_TIMEOUT = 60 * 5
+
+# 查询检查中间件记录SQL查询的请求比例，0表示关闭(生产环境)，预发布环境可设为0.1，开发时可设为1
+SHOP_QUERY_INSPECTOR_SAMPLE_RATE = float(os.environ.get('SHOP_QUERY_INSPECTOR_SAMPLE_RATE', 0))
+# 同一条查询(参数不同)在一个请求中执行达到该次数时视为N+1
+SHOP_QUERY_N_PLUS_ONE_THRESHOLD = 5
+# 各URL名称每个请求允许的最多查询次数，查询检查中间件超出时记录警告，测试中超出时失败
+SHOP_QUERY_BUDGETS = {
+    'shop:home_page': 7,
+    'shop:product_detail': 9,
+    'shop:filter_by_category': 7,
+    'shop:search': 8,
+    'shop:favorites': 6,
+    'cart:show_cart': 7,
+    'cart:api_cart_summary': 3,
+    'orders:user_orders': 10,
+    'accounts:manage_shipping_address': 6,
+    'accounts:edit_profile': 5,
+    'dashboard:products': 3,
+    'dashboard:orders': 4,
+    'dashboard:order_detail': 5,
+    'dashboard:users': 3,
+}
+
+# 是否统计请求耗时(数据库、模板、上下文处理器、缓存命中)，统计结果由 /metrics 输出
+SHOP_METRICS_ENABLED = os.environ.get('SHOP_METRICS_ENABLED', '1') == '1'
+# 是否在响应中添加 Server-Timing 头，不希望向访客暴露耗时时可以关闭
+SHOP_SERVER_TIMING = os.environ.get('SHOP_SERVER_TIMING', '1') == '1'
+# 允许访问 /metrics 的客户端地址
+SHOP_METRICS_ALLOWED_IPS = os.environ.get('SHOP_METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+
+# 服务启动时是否创建演示用的经理账号 manager@example.com(见 README)，生产环境中关闭
+SHOP_CREATE_DEMO_MANAGER = True
+
+# 后台任务是否在事务提交后直接在当前进程中执行，不运行 run_worker 的开发环境可以打开
+TASKS_EAGER = False
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -136,4 +197,19 @@ EMAIL_PORT = 587
 EMAIL_USE_SSL = False
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'username@example.com'
-EMAIL_HOST_PASSWORD = 'your-password'
\ No newline at end of file
+EMAIL_HOST_PASSWORD = 'your-password'
+
+# 日志配置：应用日志默认只输出WARNING及以上，设置 SHOP_LOG_LEVEL=DEBUG 可以看到每次下单执行的SQL查询数量
+SHOP_LOG_LEVEL = os.environ.get('SHOP_LOG_LEVEL', 'WARNING')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'orders': {'handlers': ['console'], 'level': SHOP_LOG_LEVEL},
+        'tasks': {'handlers': ['console'], 'level': SHOP_LOG_LEVEL},
+        'online_shop.queries': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
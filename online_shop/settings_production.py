@@ -0,0 +1,103 @@
+"""
+生产环境设置，在 settings.py 的基础上覆盖与调试和部署相关的配置。
+
+通过 DJANGO_SETTINGS_MODULE=online_shop.settings_production 使用，需要的环境变量:
+- DJANGO_SECRET_KEY: 必填，签名会话和CSRF令牌的密钥。
+- DJANGO_ALLOWED_HOSTS: 逗号分隔的域名列表。
+- SHOP_DB_PATH: SQLite数据库文件路径，默认为项目目录下的 db.sqlite3。
+- SHOP_MEDIA_ROOT: 上传文件目录，默认为项目目录下的 media。
+- SHOP_CONN_MAX_AGE: 数据库连接保持的秒数，默认600。
+- SHOP_HTTPS: 设为1时只通过HTTPS发送会话和CSRF cookie，并信任反向代理的 X-Forwarded-Proto 头。
+
+与开发环境的区别:
+- 关闭 DEBUG：Django不再在内存中保存每个请求的SQL，模板使用缓存加载器，出错时不显示调试页面；
+- 去掉查询检查中间件和 debug 上下文处理器；
+- 静态文件由 WhiteNoise 提供，collectstatic 时生成带内容哈希的文件名和 gzip/brotli 压缩版本，
+  浏览器可以长期缓存；上传文件(media)由前端的 nginx 提供，见 deploy/nginx.conf；
+- 数据库连接在请求之间保持，SQLite使用WAL模式，读请求不会被写请求阻塞；
+- 缓存默认使用同一台机器上所有 worker 共享的 sqlite 后端：各进程独立的 locmem 缓存中，
+  一个 worker 更新的命名空间版本号其他 worker 看不到，会继续返回旧页面。
+"""
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from online_shop.settings import *  # noqa: F401,F403
+from online_shop.settings import BASE_DIR, LOGGING, MIDDLEWARE, TEMPLATES
+from online_shop.cache import cache_settings, session_engine
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('生产环境需要设置环境变量 DJANGO_SECRET_KEY')
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SHOP_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        # 每个 worker 线程复用自己的连接，避免每个请求都重新打开数据库
+        'CONN_MAX_AGE': int(os.environ.get('SHOP_CONN_MAX_AGE', 600)),
+        'OPTIONS': {
+            # 多个 worker 同时写入时等待锁的秒数，超时才报 database is locked
+            'timeout': 20,
+        },
+    }
+}
+# 新建连接时执行的 PRAGMA，见 online_shop/db.py
+SHOP_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+}
+
+# 未指定缓存后端时使用多进程共享的 sqlite 缓存
+_cache_environ = {'SHOP_CACHE_BACKEND': 'sqlite', **os.environ}
+CACHES = cache_settings(_cache_environ)
+SESSION_ENGINE = session_engine(_cache_environ)
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware != 'online_shop.query_inspector.QueryInspectorMiddleware'
+]
+# WhiteNoise 应紧跟在 SecurityMiddleware 之后，静态文件请求不经过会话等中间件
+MIDDLEWARE.insert(
+    MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+)
+SHOP_QUERY_INSPECTOR_SAMPLE_RATE = 0
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'context_processors': [
+                processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if processor != 'django.template.context_processors.debug'
+            ],
+        },
+    },
+]
+
+STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+MEDIA_ROOT = os.environ.get('SHOP_MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# 不在生产环境中创建使用公开默认密码的经理账号
+SHOP_CREATE_DEMO_MANAGER = False
+# 不向访客暴露服务端耗时，/metrics 仍然可用
+SHOP_SERVER_TIMING = os.environ.get('SHOP_SERVER_TIMING', '0') == '1'
+
+if os.environ.get('SHOP_HTTPS') == '1':
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+    SESSION_COOKIE_SECURE = True
+    CSRF_COOKIE_SECURE = True
+
+# 生产环境中 worker 输出每个后台任务的完成情况，下单的查询数仍然只在DEBUG级别输出
+LOGGING = copy.deepcopy(LOGGING)
+LOGGING['loggers']['tasks']['level'] = os.environ.get('SHOP_LOG_LEVEL', 'INFO')
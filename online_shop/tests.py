@@ -0,0 +1,258 @@
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.backends.django import Template
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from online_shop.cache import SQLiteCache, bump_namespace, namespace_version, versioned_key
+from online_shop.metrics import Histogram, Registry, RequestTimings, _current, instrument_cache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """
+    SQLiteCache 的读写、过期和清理，以及命名空间版本号在该后端上的失效。
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'online_shop.cache.SQLiteCache',
+                'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+                'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2},
+            },
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.cache = caches['default']
+
+    def expire(self, key):
+        """
+        把条目的过期时间改到过去。
+        """
+        self.cache._connection().execute(
+            'UPDATE cache SET expires = 1 WHERE key = ?', (self.cache.make_key(key),)
+        )
+
+    def count(self):
+        return self.cache._connection().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+        self.cache.set('product', {'id': 1, 'tags': ['新品']})
+        self.assertEqual(self.cache.get('product'), {'id': 1, 'tags': ['新品']})
+        self.cache.set('product', 2)
+        self.assertEqual(self.cache.get('product'), 2)
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertTrue(self.cache.has_key('a'))
+        # 不同版本的同名键互不影响
+        self.cache.set('a', 'v2', version=2)
+        self.assertEqual((self.cache.get('a'), self.cache.get('a', version=2)), (1, 'v2'))
+
+    def test_add(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+        # 已过期的条目可以被 add 覆盖
+        self.expire('key')
+        self.assertTrue(self.cache.add('key', 3))
+        self.assertEqual(self.cache.get('key'), 3)
+
+    def test_incr(self):
+        self.cache.set('count', 1)
+        self.assertEqual(self.cache.incr('count'), 2)
+        self.assertEqual(self.cache.incr('count', 10), 12)
+        self.assertEqual(self.cache.decr('count', 2), 10)
+        self.assertEqual(self.cache.get('count'), 10)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.expire('count')
+        with self.assertRaises(ValueError):
+            self.cache.incr('count')
+
+    def test_delete(self):
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertTrue(self.cache.delete('a'))
+        self.assertFalse(self.cache.delete('a'))
+        self.cache.delete_many(['b', 'c', 'missing'])
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {})
+        self.cache.set('d', 4)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('d'))
+
+    def test_expiry(self):
+        self.cache.set('forever', 1, None)
+        self.cache.set('short', 2, 60)
+        self.cache.set('zero', 3, 0)
+        self.assertIsNone(self.cache.get('zero'))
+        self.expire('short')
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertEqual(self.cache.get_many(['forever', 'short']), {'forever': 1})
+        self.assertFalse(self.cache.touch('short'))
+        self.assertTrue(self.cache.touch('forever', 60))
+        self.assertEqual(self.cache.get('forever'), 1)
+
+    def test_cull(self):
+        self.cache.CULL_CHECK_INTERVAL = 1
+        self.cache.set('expired', 0)
+        self.expire('expired')
+        self.cache.set('forever', 0, None)
+        for i in range(10):
+            self.cache.set('key%d' % i, i)
+        # 先删除过期条目，仍超过上限时删除最早过期的 1/CULL_FREQUENCY，永不过期的条目最后删除
+        self.assertLessEqual(self.count(), 10)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertEqual(self.cache.get('forever'), 0)
+        self.assertIsNone(self.cache.get('key0'))
+        self.assertEqual(self.cache.get('key9'), 9)
+
+    def test_namespace_invalidation(self):
+        version = namespace_version('catalog')
+        self.assertEqual(namespace_version('catalog'), version)
+        key = versioned_key('catalog', 'page', 1)
+        self.assertEqual(key, 'catalog:%s:page:1' % version)
+        self.assertEqual(versioned_key('catalog', 'page', 1, version=version), key)
+        cache.set(key, 'html')
+
+        bump_namespace('catalog')
+        # 版本号变化后生成新的键，旧键下的数据不再被读到
+        new_key = versioned_key('catalog', 'page', 1)
+        self.assertNotEqual(new_key, key)
+        self.assertIsNone(cache.get(new_key))
+        # 其他命名空间不受影响
+        orders_key = versioned_key('orders', 'count')
+        bump_namespace('catalog')
+        self.assertEqual(versioned_key('orders', 'count'), orders_key)
+
+
+class HistogramTest(SimpleTestCase):
+    """
+    直方图按对数边界分桶，边界上的值计入该边界的桶。
+    """
+
+    def test_bounds(self):
+        bounds = Histogram.BOUNDS
+        self.assertAlmostEqual(bounds[0], 2 ** -13)
+        self.assertEqual(bounds[-1], 64)
+        # 每两个桶翻一倍
+        self.assertAlmostEqual(bounds[2] / bounds[0], 2)
+
+    def test_observe(self):
+        histogram = Histogram()
+        for value in (0, Histogram.BOUNDS[0], 0.001, 1, 1.0001, 1000):
+            histogram.observe(value)
+        counts = histogram.counts
+        self.assertEqual(counts[0], 2)
+        # 0.001 秒落在 (2^-10, 2^-9.5] 中
+        self.assertEqual(counts[Histogram.BOUNDS.index(2 ** -9.5)], 1)
+        self.assertEqual(counts[Histogram.BOUNDS.index(1)], 1)
+        self.assertEqual(counts[Histogram.BOUNDS.index(1) + 1], 1)
+        # 超过所有边界的值计入最后一个桶
+        self.assertEqual(counts[-1], 1)
+        self.assertEqual(histogram.count, 6)
+        self.assertAlmostEqual(histogram.sum, 1002.0011 + Histogram.BOUNDS[0])
+
+
+@override_settings(SHOP_METRICS_ENABLED=True, SHOP_SERVER_TIMING=True, SHOP_METRICS_ALLOWED_IPS=['127.0.0.1'])
+class MetricsTest(TestCase):
+    """
+    MetricsMiddleware 的 Server-Timing 响应头和 /metrics 的 Prometheus 输出。
+    """
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('online_shop.metrics.registry', Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+')
+        self.assertRegex(header, r'cache;desc="hit=\d+ miss=[1-9]\d*"$')
+        # 只包装模板引擎实例，不替换模板类的方法
+        self.assertFalse(hasattr(Template.render, '__wrapped__'))
+
+    @override_settings(SHOP_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        response = self.client.get('/')
+        self.assertNotIn('Server-Timing', response)
+        # 关闭响应头后仍然统计
+        self.assertIn('shop_requests_total{view="shop:home_page",status="200"} 1', self.registry.render())
+
+    def test_metrics_output(self):
+        self.client.get('/')
+        self.client.get('/')
+        self.client.get('/missing-product')
+        output = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE shop_request_duration_seconds histogram', output)
+        self.assertIn('# TYPE shop_requests_total counter', output)
+        self.assertIn('shop_requests_total{view="shop:home_page",status="200"} 2', output)
+        self.assertIn('shop_requests_total{view="shop:product_detail",status="404"} 1', output)
+        self.assertIn('shop_request_duration_seconds_count{view="shop:home_page"} 2', output)
+        self.assertIn('shop_request_duration_seconds_bucket{view="shop:home_page",le="+Inf"} 2', output)
+        # 桶计数是累计值，单调不减
+        buckets = [
+            int(count) for count in
+            re.findall(r'^shop_request_duration_seconds_bucket\{view="shop:home_page",le="[^"]+"\} (\d+)$',
+                       output, re.M)
+        ]
+        self.assertEqual(len(buckets), len(Histogram.BOUNDS) + 1)
+        self.assertEqual(buckets, sorted(buckets))
+        # /metrics 自身的请求不计入统计
+        self.assertNotIn('view="metrics"', output)
+
+    def test_metrics_access(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        with self.settings(SHOP_METRICS_ENABLED=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_cache_counts(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # LocMemCache 使用 BaseCache.get_many，SQLiteCache 覆盖了 get_many
+        for backend in (
+            LocMemCache('metrics', {}),
+            SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {}),
+        ):
+            with self.subTest(backend=type(backend).__name__):
+                instrument_cache(backend)
+                instrument_cache(backend)
+                backend.set('a', 1)
+                timings = RequestTimings()
+                token = _current.set(timings)
+                try:
+                    self.assertEqual(backend.get('a'), 1)
+                    self.assertEqual(backend.get('b', 2), 2)
+                    self.assertEqual(backend.get_many(['a', 'b', 'c']), {'a': 1})
+                finally:
+                    _current.reset(token)
+                # 每个键只统计一次
+                self.assertEqual((timings.cache_hits, timings.cache_misses), (2, 3))
+        # 只包装传入的实例
+        token = _current.set(timings)
+        try:
+            LocMemCache('other', {}).get('a')
+        finally:
+            _current.reset(token)
+        self.assertEqual((timings.cache_hits, timings.cache_misses), (2, 3))
+
+    def test_label_escaping(self):
+        timings = RequestTimings()
+        timings.sections['cp-"cart"'] = 0.001
+        self.registry.record('shop:home_page', 200, 0.01, timings)
+        self.assertIn('section="cp-\\"cart\\""', self.registry.render())
@@ -1,13 +1,18 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from online_shop.metrics import metrics_view
+from shop.views import serve_rendition
+
 
 # 定义Django项目的URL模式
 urlpatterns = [
     # 管理员页面的URL模式
     path('admin/', admin.site.urls),
+    # 进程内统计的请求耗时，Prometheus文本格式；必须在商店的 <slug> 模式之前
+    path('metrics', metrics_view, name='metrics'),
     # 商店页面的URL模式，使用命名空间'shop'
     path('', include('shop.urls', namespace='shop')),
     # 用户账户相关的URL模式，使用命名空间'accounts'
@@ -20,6 +25,10 @@ urlpatterns = [
     path('dashboard/', include('dashboard.urls', namespace='dashboard')),
 ]
 
-# 在DEBUG模式下，添加静态文件的URL模式
+# 在DEBUG模式下，添加静态文件的URL模式；生产环境中上传文件和缩略图由 nginx 提供，见 deploy/nginx.conf
 if settings.DEBUG:
+    urlpatterns += [
+        # 商品缩略图，文件名包含内容哈希，与 nginx 一样设置长期缓存；必须在通用的上传文件模式之前
+        re_path(r'^%s(?P<path>renditions/.+)$' % settings.MEDIA_URL.lstrip('/'), serve_rendition, name='rendition'),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,13 +1,19 @@
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
-from accounts.views import create_manager
+from django.db import connections
 
-# 设置Django环境变量
+# 设置Django环境变量，必须在导入任何使用模型的模块之前
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'online_shop.settings')
 
-# 创建具有 'manager' 角色的用户
-create_manager()
-
-# 获取WSGI应用实例
+# 获取WSGI应用实例，同时完成Django的初始化
 application = get_wsgi_application()
+
+# 创建具有 'manager' 角色的演示用户，生产环境中关闭
+if settings.SHOP_CREATE_DEMO_MANAGER:
+    from accounts.views import create_manager
+
+    create_manager()
+    # gunicorn 预加载应用时在主进程中执行到这里，关闭连接，避免fork出的 worker 共用同一个数据库连接
+    connections.close_all()
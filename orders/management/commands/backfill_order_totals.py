@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    """
+    校验并回填订单存储的总价和件数。
+
+    默认用一条 UPDATE 语句根据订单项重新计算所有订单；
+    使用 --verify 时只列出存储值与订单项不一致的订单，不做修改。
+    """
+    help = '校验并回填订单的总价和件数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='只校验，不修改')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatched = Order.objects.mismatched_totals().values_list(
+                'id', 'total_price', 'computed_total', 'item_count', 'computed_item_count'
+            )
+            count = 0
+            for order_id, total, computed_total, item_count, computed_item_count in mismatched:
+                count += 1
+                self.stdout.write(
+                    '订单 %s: 总价 %s != %s, 件数 %s != %s'
+                    % (order_id, total, computed_total, item_count, computed_item_count)
+                )
+            if count:
+                self.stdout.write(self.style.ERROR('%d 个订单的总价不一致' % count))
+            else:
+                self.stdout.write(self.style.SUCCESS('所有订单的总价一致'))
+            return
+        updated = Order.objects.refresh_totals()
+        self.stdout.write(self.style.SUCCESS('已更新 %d 个订单' % updated))
@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2024-04-26 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='shipped',
+            field=models.BooleanField(default=False),
+        ),
+    ]
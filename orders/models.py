@@ -1,8 +1,66 @@
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 from accounts.models import User
+from online_shop.cache import bump_namespace
 from shop.models import Product
 
+# 订单数据的缓存命名空间，订单或订单项变化时更新其版本号
+ORDERS_NAMESPACE = 'orders'
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    订单查询集，提供由订单项实时计算总价的注解，用于回填和校验存储的总价。
+
+    批量的 update() 和 bulk_create() 不会触发 post_save 信号，这里直接更新订单缓存命名空间的版本号，
+    使缓存的订单数量(例如后台订单列表的总数)失效。
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bump_namespace(ORDERS_NAMESPACE)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        bump_namespace(ORDERS_NAMESPACE)
+        return objs
+
+    def with_totals(self):
+        """
+        用 Sum(F('price') * F('quantity')) 注解每个订单的实时总价和商品件数。
+
+        返回:
+            带有 computed_total 和 computed_item_count 注解的查询集
+        """
+        return self.annotate(
+            computed_total=Coalesce(Sum(F('items__price') * F('items__quantity')), 0),
+            computed_item_count=Coalesce(Sum('items__quantity'), 0),
+        )
+
+    def mismatched_totals(self):
+        """
+        返回存储的总价或件数与订单项不一致的订单。
+        """
+        return self.with_totals().exclude(
+            total_price=F('computed_total'), item_count=F('computed_item_count')
+        )
+
+    def refresh_totals(self):
+        """
+        用一条 UPDATE 语句根据订单项重新计算并保存订单的总价和件数。
+
+        返回:
+            更新的订单数量
+        """
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        return self.update(
+            total_price=Coalesce(Subquery(items.annotate(s=Sum(F('price') * F('quantity'))).values('s')), 0),
+            item_count=Coalesce(Subquery(items.annotate(s=Sum('quantity')).values('s')), 0),
+        )
+
 
 class Order(models.Model):
     """
@@ -13,6 +71,9 @@ class Order(models.Model):
         created: 订单创建时间，自动设置为当前时间
         updated: 订单最后更新时间，每次保存模型时自动设置为当前时间
         status: 订单状态，默认为False（未支付）
+        shipped: 发货状态，默认为False（未发货）
+        total_price: 订单总价，写入订单项时维护，列表页无需再查询订单项
+        item_count: 订单中商品的总件数，与total_price一同维护
     """
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')  # 用户外键
@@ -20,9 +81,22 @@ class Order(models.Model):
     updated = models.DateTimeField(auto_now=True)  # 更新时间
     status = models.BooleanField(default=False)  # 订单状态
     shipped = models.BooleanField(default=False)  # 发货状态
+    total_price = models.IntegerField(default=0)  # 订单总价
+    item_count = models.PositiveIntegerField(default=0)  # 商品总件数
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         ordering = ('-created',)  # 默认按照创建时间降序排序
+        indexes = [
+            # 用户订单页：按用户筛选，按创建时间降序分页
+            models.Index(fields=['user', '-created'], name='order_user_created_idx'),
+            # 后台订单页：按支付、发货状态筛选，按创建时间降序分页
+            models.Index(fields=['status', 'shipped', '-created'], name='order_status_created_idx'),
+            # 后台订单页：只按发货状态或日期筛选
+            models.Index(fields=['shipped', '-created'], name='order_shipped_created_idx'),
+            models.Index(fields=['-created'], name='order_created_idx'),
+        ]
 
     def __str__(self):
         """
@@ -36,13 +110,27 @@ class Order(models.Model):
     @property
     def get_total_price(self):
         """
-        计算订单的总价格
+        获取订单的总价格，直接读取存储的总价，不会查询订单项
 
         返回:
             订单的总价格（整数）
         """
-        total = sum(item.get_cost() for item in self.items.all())  # 累加所有订单项的成本
-        return total
+        return self.total_price
+
+    def update_totals(self):
+        """
+        根据订单项重新计算总价和件数并保存
+
+        返回:
+            无
+        """
+        totals = self.items.aggregate(
+            total=Coalesce(Sum(F('price') * F('quantity')), 0),
+            count=Coalesce(Sum('quantity'), 0),
+        )
+        self.total_price = totals['total']
+        self.item_count = totals['count']
+        self.save(update_fields=['total_price', 'item_count'])
 
 class OrderItem(models.Model):
     """
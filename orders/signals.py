@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from online_shop.cache import bump_namespace
+from .models import ORDERS_NAMESPACE, Order, OrderItem
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_cache(sender, **kwargs):
+    """
+    订单保存或删除后更新订单缓存命名空间的版本号，使缓存的订单数量失效。
+
+    批量的 update()/bulk_create() 不触发信号，由 OrderQuerySet 更新版本号。
+    """
+    bump_namespace(ORDERS_NAMESPACE)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_order_totals(sender, instance, **kwargs):
+    """
+    单独保存订单项后重新计算订单的总价和件数。
+
+    下单服务使用 bulk_create 写入订单项，不会触发此信号，总价在创建订单时已经算好。
+    删除订单项不在此处理(级联删除订单时会为每个订单项触发一次)，
+    需要时调用 Order.update_totals 或执行 backfill_order_totals 命令。
+    """
+    order = Order.objects.filter(pk=instance.order_id).first()
+    if order is not None:
+        order.update_totals()
@@ -1,3 +1,126 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from accounts.models import User
+from cart.utils.cart import add_cart_item
+from shop.models import Category, Product
+from orders.models import Order, OrderItem
+from orders.services import place_order
+from tasks.models import Job
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class UserOrdersQueryCountTest(TestCase):
+    """
+    用户订单页的查询次数不应随订单数量和订单项数量增长。
+
+    会话引擎固定为 db，查询次数中包含一次会话查询，不受 SHOP_SESSION_ENGINE 影响。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='数码')
+        cls.products = [
+            Product.objects.create(
+                category=category, image='products/p.jpg', title='商品%d' % i, description='描述', price=10 + i
+            )
+            for i in range(5)
+        ]
+        cls.user = User.objects.create_user('buyer@example.com', 'buyer', 'buyerpass1234')
+
+    def create_orders(self, count):
+        orders = Order.objects.bulk_create([Order(user=self.user, status=True) for _ in range(count)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=product.price, quantity=2)
+            for order in orders for product in self.products[:3]
+        ])
+        Order.objects.refresh_totals()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_query_count_is_flat_for_100_orders(self):
+        self.create_orders(100)
+        # 会话、用户、订单计数、订单页、订单项、商品、收货地址、收藏数、分类树、购物车摘要
+        with self.assertNumQueries(10):
+            response = self.client.get('/orders/list')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['orders']), 10)
+        self.assertContains(response, '商品0', count=10)
+
+    def test_later_pages_cost_the_same(self):
+        self.create_orders(100)
+        self.client.get('/orders/list')
+        with self.assertNumQueries(8):
+            response = self.client.get('/orders/list', {'page': 10})
+        self.assertEqual(response.context['orders'].number, 10)
+
+
+class PlaceOrderTest(TestCase):
+    """
+    下单在一个事务内写入订单和订单项，订单上存储的总价和件数与订单项一致。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='数码')
+        cls.phone = Product.objects.create(
+            category=category, image='products/p.jpg', title='手机', description='描述', price=100
+        )
+        cls.laptop = Product.objects.create(
+            category=category, image='products/p.jpg', title='电脑', description='描述', price=500
+        )
+        cls.user = User.objects.create_user('buyer@example.com', 'buyer', 'buyerpass1234')
+
+    def test_stored_totals(self):
+        order = place_order(self.user, {self.phone.id: 2, self.laptop.id: 1})
+        self.assertEqual((order.total_price, order.item_count, order.status), (700, 3, False))
+        self.assertEqual(
+            set(order.items.values_list('product_id', 'price', 'quantity')),
+            {(self.phone.id, 100, 2), (self.laptop.id, 500, 1)},
+        )
+        # 之后的价格变化不影响已下的订单
+        Product.objects.filter(id=self.phone.id).update(price=1)
+        order.refresh_from_db()
+        self.assertEqual(order.get_total_price, 700)
+        self.assertFalse(Order.objects.mismatched_totals().exists())
+
+    def test_query_count_does_not_grow_with_items(self):
+        # 第一个订单还会创建重新计算相关商品的任务
+        place_order(self.user, {self.phone.id: 1})
+        small = place_order(self.user, {self.phone.id: 1})
+        large = place_order(self.user, {self.phone.id: 1, self.laptop.id: 4})
+        self.assertEqual(small.query_count, large.query_count)
+
+    def test_failure_leaves_nothing_behind(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                place_order(self.user, {self.phone.id: 1})
+        # 订单和同一事务中安排的后台任务都被回滚
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_refresh_totals(self):
+        order = place_order(self.user, {self.phone.id: 2})
+        Order.objects.filter(id=order.id).update(total_price=1, item_count=1)
+        self.assertEqual(list(Order.objects.mismatched_totals()), [order])
+        self.assertEqual(Order.objects.refresh_totals(), 1)
+        order.refresh_from_db()
+        self.assertEqual((order.total_price, order.item_count), (200, 2))
+        OrderItem.objects.filter(order=order).update(quantity=3)
+        order.update_totals()
+        self.assertEqual((order.total_price, order.item_count), (300, 3))
+
+    def test_create_order_view(self):
+        cache.clear()
+        add_cart_item(self.user.pk, self.phone.id, 2, 100)
+        add_cart_item(self.user.pk, self.laptop.id, 1, 500)
+        self.client.force_login(self.user)
+        response = self.client.get('/orders/create')
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, '/orders/fake-payment/%d' % order.id, fetch_redirect_response=False)
+        self.assertEqual((order.total_price, order.item_count), (700, 3))
@@ -4,12 +4,16 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
 
-from accounts.forms import ShippingAddressForm
 from accounts.models import ShippingAddress
 from shop.models import Product
-from .models import Order, OrderItem
+from shop.utils.pagination import paginat
+from .models import Order
+from .services import place_order
 from cart.utils.cart import Cart
 
+# 用户订单页每页显示的订单数量
+ORDERS_PER_PAGE = 10
+
 
 @login_required
 def create_order(request):
@@ -24,12 +28,8 @@ def create_order(request):
     - HttpResponseRedirect对象，重定向到订单支付页面。
     """
     cart = Cart(request)  # 获取用户的购物车
-    order = Order.objects.create(user=request.user)  # 为用户创建一个新的订单
-    for item in cart:  # 遍历购物车中的每一项
-        OrderItem.objects.create(
-            order=order, product=item['product'],
-            price=item['price'], quantity=item['quantity']
-        )
+    # 在一个事务内批量创建订单和订单项，价格以商品当前价格为准
+    order = place_order(request.user, cart.quantities())
     return redirect('orders:pay_order', order_id=order.id)  # 重定向到支付页面
 
 
@@ -86,21 +86,16 @@ def direct_checkout(request, product_id):
     - 如果商品不存在，返回错误页面或提示信息。
     """
     product = get_object_or_404(Product, id=product_id)  # 根据商品ID获取商品对象
-    order = Order.objects.create(user=request.user)  # 为用户创建一个新的订单
-    OrderItem.objects.create(
-        order=order, product=product,
-        price=product.price, quantity=1  # 数量默认为1
-    )
-    # 模拟支付过程：直接将订单状态改为已支付
-    order.status = True
-    order.save()
+    # 数量默认为1，模拟支付过程：直接创建已支付的订单
+    place_order(request.user, {product.id: 1}, status=True)
     return redirect('orders:user_orders')  # 重定向到用户订单列表
 
 @login_required
 def user_orders(request):
     """
     用户订单视图函数。
-    显示用户的所有订单列表。
+    按订单分页显示用户的订单列表，订单项和商品通过 prefetch_related 批量加载，
+    每页的查询次数与订单数量和订单项数量无关。
 
     参数:
     - request: HttpRequest对象。
@@ -108,12 +103,17 @@ def user_orders(request):
     返回值:
     - HttpResponse对象，渲染的用户订单列表页面。
     """
-    # 列出用户所有收货地址
-    addresses = ShippingAddress.objects.filter(user=request.user, default=True)
-    form = ShippingAddressForm()
-
-    orders = request.user.orders.all()  # 获取当前用户的所有订单
-    context = {'title': 'Orders', 'orders': orders, 'addresses': addresses}  # 准备上下文数据
+    # 列出用户默认收货地址，转为列表避免模板中重复查询
+    # 布尔条件写成 __in，生成可以使用 (user, default) 索引的 default IN (1)，见 online_shop/query_plans.py
+    addresses = list(ShippingAddress.objects.filter(user=request.user, default__in=[True]))
+
+    # 获取当前用户的订单，并预取订单项及其商品
+    orders = request.user.orders.prefetch_related('items__product')
+    context = {
+        'title': 'Orders',
+        'orders': paginat(request, orders, keyset=False, per_page=ORDERS_PER_PAGE),
+        'addresses': addresses,
+    }  # 准备上下文数据
     return render(request, 'user_orders.html', context)  # 渲染用户订单列表页面
 
 
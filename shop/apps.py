@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shop'
+
+    def ready(self):
+        # 注册分类、商品相关的信号处理函数
+        from shop import signals  # noqa: F401
+        # 为新建的SQLite连接设置 SHOP_SQLITE_PRAGMAS(生产环境为WAL模式)
+        from django.db.backends.signals import connection_created
+        from online_shop.db import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='online_shop.db.configure_sqlite')
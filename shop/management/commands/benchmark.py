@@ -0,0 +1,134 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from accounts.models import User
+from cart.utils.cart import cart_summary_key
+from online_shop.benchmark import (
+    compare, default_scenarios, load_baseline, make_baseline, run_scenario, save_baseline,
+)
+from online_shop.cache import NAMESPACE_VERSION_KEY, namespace_version
+from orders.models import ORDERS_NAMESPACE
+from shop.models import Product
+from shop.utils.category_tree import CATEGORY_TREE_NAMESPACE
+from shop.utils.page_cache import CATALOG_NAMESPACE
+
+# 基准中的写操作可能更新版本号的缓存命名空间
+NAMESPACES = (CATALOG_NAMESPACE, CATEGORY_TREE_NAMESPACE, ORDERS_NAMESPACE)
+
+
+class Command(BaseCommand):
+    """
+    对主要页面执行性能基准，输出各场景的 p50/p95/p99 延迟、每个请求的查询数和RPS。
+
+    数据库中需要有商品、分类和带订单的用户，可以先用 seed_catalog 生成。
+    所有请求在一个事务中执行，结束后回滚，缓存命名空间的版本号也恢复为执行前的值。
+    使用 --save 把结果保存为JSON基线，使用 --compare 与之前的基线比较，出现退化时命令失败。
+    """
+    help = '对主要页面执行性能基准，可以保存和比较JSON基线'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='只执行指定名称的场景')
+        parser.add_argument('--iterations', type=int, default=50, help='每个场景计入统计的请求数')
+        parser.add_argument('--warmup', type=int, default=5, help='每个场景的预热请求数')
+        parser.add_argument('--cold-cache', action='store_true', help='每个请求前清空缓存')
+        parser.add_argument('--user', help='下单等场景使用的用户邮箱，默认为订单最多的普通用户')
+        parser.add_argument('--save', metavar='PATH', help='把结果保存为JSON基线')
+        parser.add_argument('--compare', metavar='PATH', help='与JSON基线比较')
+        parser.add_argument('--threshold', type=float, default=0.2, help='允许的p95延迟增长比例')
+        parser.add_argument('--min-delta', type=float, default=1.0, help='视为退化的p95延迟最小增加量(毫秒)')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations 至少为1')
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = load_baseline(options['compare'])
+            except (OSError, ValueError) as e:
+                raise CommandError('无法读取基线 %s: %s' % (options['compare'], e))
+
+        # 写操作会更新命名空间版本号，之后缓存的数据包含随后被回滚的订单等内容；
+        # 恢复执行前的版本号后这些数据不再被读到，执行前缓存的数据仍与回滚后的数据库一致
+        versions = {namespace: namespace_version(namespace) for namespace in NAMESPACES}
+        with transaction.atomic():
+            scenarios = self.get_scenarios(options)
+            results = {}
+            for scenario in scenarios:
+                results[scenario.name] = run_scenario(
+                    scenario, options['iterations'], options['warmup'], options['cold_cache']
+                )
+                self.write_result(scenario.name, results[scenario.name])
+            # 回滚基准中创建的订单、购物车项和临时经理用户
+            transaction.set_rollback(True)
+        # 缓存不随事务回滚，恢复命名空间版本号并删除已经不对应数据库内容的购物车摘要
+        cache.set_many({NAMESPACE_VERSION_KEY % namespace: version for namespace, version in versions.items()}, None)
+        cache.delete(cart_summary_key(self.user.pk))
+
+        if options['save']:
+            save_baseline(options['save'], make_baseline(results, {
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'cold_cache': options['cold_cache'],
+            }))
+            self.stdout.write('基线已保存到 %s' % options['save'])
+        if baseline is not None:
+            self.compare(results, baseline, options['threshold'], options['min_delta'])
+
+    def get_scenarios(self, options):
+        """
+        选取基准使用的用户、商品和分类，生成场景列表。
+        """
+        users = User.objects.filter(is_manager=False, is_admin=False)
+        if options['user']:
+            user = users.filter(email=options['user']).first()
+        else:
+            user = users.annotate(order_count=Count('orders')).order_by('-order_count', 'id').first()
+        if user is None:
+            raise CommandError('找不到普通用户，请先执行 seed_catalog')
+        self.user = user
+        manager = User.objects.filter(is_manager=True).first()
+        if manager is None:
+            # 临时创建经理用户，随事务一起回滚
+            manager = User.objects.create(email='benchmark-manager@example.com', full_name='benchmark',
+                                          is_manager=True)
+        # 选择被购买最多的商品，它的详情页有完整的相关商品
+        product = (
+            Product.objects.select_related('category').annotate(sold=Count('order_items'))
+            .order_by('-sold', 'id').first()
+        )
+        if product is None:
+            raise CommandError('找不到商品，请先执行 seed_catalog')
+        search_query = product.title.split()[0]
+
+        scenarios = default_scenarios(user, manager, product, product.category, search_query)
+        if options['scenarios']:
+            known = {scenario.name for scenario in scenarios}
+            unknown = set(options['scenarios']) - known
+            if unknown:
+                raise CommandError('未知的场景: %s，可用的场景: %s' % (
+                    ', '.join(sorted(unknown)), ', '.join(sorted(known))))
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenarios']]
+        return scenarios
+
+    def write_result(self, name, result):
+        line = '%-22s p50 %8.2fms  p95 %8.2fms  p99 %8.2fms  %6.2f queries  %7.1f rps' % (
+            name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries'], result['rps'],
+        )
+        if result['errors']:
+            self.stdout.write(self.style.ERROR('%s  %d errors' % (line, result['errors'])))
+        else:
+            self.stdout.write(line)
+
+    def compare(self, results, baseline, threshold, min_delta):
+        rows, regressions = compare(results, baseline, threshold, min_delta)
+        self.stdout.write('\n与基线 %s (%s) 比较:' % (baseline.get('commit') or '-', baseline.get('created')))
+        for name, previous, current in rows:
+            change = (current['p95_ms'] / previous['p95_ms'] - 1) * 100 if previous['p95_ms'] else 0.0
+            self.stdout.write('%-22s p95 %8.2fms -> %8.2fms (%+6.1f%%)  queries %6.2f -> %6.2f' % (
+                name, previous['p95_ms'], current['p95_ms'], change, previous['queries'], current['queries'],
+            ))
+        if regressions:
+            raise CommandError('性能退化:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('没有发现退化'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from online_shop.query_plans import HOT_QUERIES, explain_query_plan, full_scans, temp_sorts
+
+
+class Command(BaseCommand):
+    """
+    检查 online_shop.query_plans 中登记的热点查询的执行计划。
+
+    任何查询出现全表扫描时命令失败，可以放在CI或部署前执行，防止索引被误删或查询形状改变后退化。
+    需要临时排序的查询只给出警告，使用 --strict 时同样视为失败。
+    """
+    help = '对热点查询执行 EXPLAIN QUERY PLAN，出现全表扫描时失败'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='只检查指定名称的查询')
+        parser.add_argument('--strict', action='store_true', help='需要临时排序的查询也视为失败')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('只支持SQLite数据库')
+        unknown = set(options['names']) - set(HOT_QUERIES)
+        if unknown:
+            raise CommandError('未登记的查询: %s' % ', '.join(sorted(unknown)))
+        names = options['names'] or list(HOT_QUERIES)
+        failed = []
+        for name in names:
+            queryset = HOT_QUERIES[name]()
+            plan = explain_query_plan(queryset)
+            problems = full_scans(plan, filtered=bool(queryset.query.where))
+            problems += temp_sorts(plan) if options['strict'] else []
+            if problems:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR('%s: %s' % (name, '; '.join(plan))))
+            elif temp_sorts(plan):
+                self.stdout.write(self.style.WARNING('%s: %s' % (name, '; '.join(plan))))
+            elif options['verbosity'] > 1:
+                self.stdout.write('%s: %s' % (name, '; '.join(plan)))
+        if failed:
+            raise CommandError('%d 个查询的执行计划不合格: %s' % (len(failed), ', '.join(failed)))
+        self.stdout.write(self.style.SUCCESS('%d 个查询的执行计划均使用索引' % len(names)))
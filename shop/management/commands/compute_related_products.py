@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from shop.utils.recommendations import CATEGORY_WEIGHT, TOP_K, compute_related, store_related
+
+
+class Command(BaseCommand):
+    """
+    根据订单中的共同购买和商品类别重新计算所有商品的相关商品。
+
+    计算量随订单项数量增长，应定期(如每晚)运行，而不是在请求中计算。
+    """
+    help = '重新计算相关商品'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='每个商品保存的相关商品数量')
+        parser.add_argument('--category-weight', type=float, default=CATEGORY_WEIGHT, help='同类别商品的加成')
+
+    def handle(self, *args, **options):
+        related = compute_related(options['top_k'], options['category_weight'])
+        count = store_related(related)
+        self.stdout.write(self.style.SUCCESS('已为 %d 个商品写入 %d 条相关商品' % (len(related), count)))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from shop.models import Product
+from shop.utils.images import PENDING_KEY, generate_renditions
+
+
+class Command(BaseCommand):
+    """
+    为商品图片生成缩略图。
+
+    默认只处理还没有缩略图的商品(包括后台任务失败、仍带有等待标记的商品)，使用 --all 重新生成所有商品的缩略图。
+    """
+    help = '为商品图片生成缩略图'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='重新生成所有商品的缩略图')
+
+    def handle(self, *args, **options):
+        products = Product.objects.only('id', 'image', 'renditions')
+        if not options['all']:
+            products = products.filter(Q(renditions={}) | Q(renditions__has_key=PENDING_KEY))
+        count = 0
+        for product in products.iterator():
+            try:
+                generate_renditions(product)
+            except (OSError, ValueError) as e:
+                self.stderr.write('商品 %s 的图片无法处理: %s' % (product.pk, e))
+                continue
+            count += 1
+        self.stdout.write(self.style.SUCCESS('已为 %d 个商品生成缩略图' % count))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop.utils.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    重建商品全文索引。
+
+    批量导入商品(例如 bulk_create)不会触发保存信号，导入后需要执行此命令。
+    """
+    help = '重建商品全文索引'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            '%s: 已为 %d 个商品建立索引' % (backend.__class__.__name__, count)
+        ))
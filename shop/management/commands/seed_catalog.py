@@ -0,0 +1,164 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import User
+from orders.models import Order, OrderItem
+from shop.models import Category, Product
+from shop.utils.category_tree import bump_tree_version
+from shop.utils.page_cache import bump_catalog_version
+
+# 生成商品标题和描述用的词
+WORDS = (
+    '手机', '耳机', '键盘', '鼠标', '显示器', '相机', '镜头', '音箱', '手表', '平板',
+    '充电器', '数据线', '背包', '台灯', '水杯', '无线', '蓝牙', '便携', '专业', '经典',
+    'Pro', 'Max', 'Mini', 'Lite', 'Plus', 'Air', 'Ultra', 'Neo', 'Go', 'One',
+)
+
+
+class Command(BaseCommand):
+    """
+    批量生成用于压测和性能基准的商品目录、用户和订单。
+
+    所有数据用 bulk_create 分批写入，不触发保存信号；写入后重建全文索引、计算相关商品，
+    并更新分类树和商品目录的缓存版本号。相同的 --seed 和参数生成相同的数据，
+    基准测试结果可以在不同提交之间比较。
+    生成的分类、商品和用户以 --prefix 开头，重复执行时需要使用不同的前缀。
+    """
+    help = '批量生成商品目录、用户和订单'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=5, help='顶级分类数')
+        parser.add_argument('--depth', type=int, default=2, help='分类的层数(包括顶级分类)')
+        parser.add_argument('--children', type=int, default=3, help='每个分类的子分类数')
+        parser.add_argument('--products', type=int, default=1000, help='商品数')
+        parser.add_argument('--users', type=int, default=100, help='用户数')
+        parser.add_argument('--orders', type=int, default=2000, help='订单数')
+        parser.add_argument('--items-per-order', type=int, default=5, help='每个订单最多的商品种类数')
+        parser.add_argument('--password', default='benchmark1234', help='生成用户的密码')
+        parser.add_argument('--prefix', default='seed', help='分类、商品slug和用户邮箱的前缀')
+        parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批写入的行数')
+        parser.add_argument('--skip-related', action='store_true', help='不计算相关商品')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if Category.objects.filter(slug__startswith=prefix + '-').exists():
+            raise CommandError('已存在前缀为 %s 的数据，请使用 --prefix 指定其他前缀' % prefix)
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with transaction.atomic():
+            leaves = self.create_categories(prefix, options['categories'], options['depth'], options['children'])
+            products = self.create_products(prefix, leaves, options['products'])
+            users = self.create_users(prefix, options['users'], options['password'])
+            order_count, item_count = self.create_orders(
+                users, products, options['orders'], options['items_per_order']
+            )
+
+        call_command('rebuild_search_index', stdout=self.stdout)
+        if not options['skip_related'] and products:
+            call_command('compute_related_products', stdout=self.stdout)
+        bump_tree_version()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            '已生成 %d 个末级分类、%d 个商品、%d 个用户、%d 个订单和 %d 个订单项' % (
+                len(leaves), len(products), len(users), order_count, item_count
+            )
+        ))
+
+    def create_categories(self, prefix, count, depth, children):
+        """
+        逐层生成分类树。
+
+        返回值:
+        - 末级分类的ID列表，商品只挂在末级分类下。
+        """
+        level = [None]
+        for depth_index in range(max(depth, 1)):
+            per_parent = count if depth_index == 0 else children
+            rows = [
+                Category(
+                    title='分类%s-%d' % (parent or '', i),
+                    slug='%s-%s-%d' % (prefix, parent or 'root', i),
+                    is_sub=parent is not None,
+                    sub_category_id=parent,
+                )
+                for parent in level for i in range(per_parent)
+            ]
+            Category.objects.bulk_create(rows, batch_size=self.batch_size)
+            # 按slug取回ID，不依赖数据库是否支持 bulk_create 返回主键
+            level = list(Category.objects.filter(slug__in=[row.slug for row in rows]).values_list('id', flat=True))
+        return level
+
+    def create_products(self, prefix, categories, count):
+        """
+        生成商品，均匀分布在末级分类中。
+
+        返回值:
+        - 商品的 (ID, 价格) 列表。
+        """
+        rows = []
+        for i in range(count):
+            words = self.rng.sample(WORDS, 3)
+            rows.append(Product(
+                category_id=categories[i % len(categories)],
+                image='products/%s.jpg' % prefix,
+                title=' '.join(words + [str(i)]),
+                description=' '.join(self.rng.choice(WORDS) for _ in range(30)),
+                price=self.rng.randint(10, 5000),
+                slug='%s-%d' % (prefix, i),
+            ))
+        Product.objects.bulk_create(rows, batch_size=self.batch_size)
+        return list(
+            Product.objects.filter(slug__startswith=prefix + '-').order_by('id').values_list('id', 'price')
+        )
+
+    def create_users(self, prefix, count, password):
+        """
+        生成普通用户，所有用户共用一个密码哈希，避免逐个计算哈希。
+
+        返回值:
+        - 用户ID列表。
+        """
+        password = make_password(password)
+        emails = ['%s-user%d@example.com' % (prefix, i) for i in range(count)]
+        User.objects.bulk_create(
+            [User(email=email, full_name='用户%d' % i, password=password) for i, email in enumerate(emails)],
+            batch_size=self.batch_size,
+        )
+        return list(User.objects.filter(email__in=emails).order_by('id').values_list('id', flat=True))
+
+    def create_orders(self, users, products, count, items_per_order):
+        """
+        生成订单和订单项，最后用一条UPDATE维护订单总价和件数。
+
+        热门商品按幂律分布被更多地购买，共同购买统计和相关商品更接近真实数据。
+
+        返回值:
+        - (订单数, 订单项数)。
+        """
+        if not users or not products or not count:
+            return 0, 0
+        weights = [1 / (rank + 1) for rank in range(len(products))]
+        orders = Order.objects.bulk_create(
+            [Order(user_id=self.rng.choice(users), status=self.rng.random() < 0.8,
+                   shipped=self.rng.random() < 0.5) for _ in range(count)],
+            batch_size=self.batch_size,
+        )
+        if orders[0].pk is None:
+            orders = list(Order.objects.order_by('-id')[:count])
+        items = []
+        for order in orders:
+            size = self.rng.randint(1, max(1, items_per_order))
+            chosen = {product for product in self.rng.choices(products, weights, k=size)}
+            items += [
+                OrderItem(order_id=order.pk, product_id=product_id, price=price, quantity=self.rng.randint(1, 3))
+                for product_id, price in chosen
+            ]
+        OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+        Order.objects.refresh_totals()
+        return len(orders), len(items)
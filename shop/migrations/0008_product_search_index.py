@@ -0,0 +1,90 @@
+import re
+
+from django.db import migrations
+
+# 以下建表语句和分词规则是本迁移执行时 shop/utils/search.py 的副本，
+# 迁移不导入应用代码，之后修改搜索模块不会影响从头执行迁移。
+# 分词规则变化后可以用 rebuild_search_index 命令重建索引。
+CJK_CHARS = '㐀-䶿一-鿿豈-﫿'
+WORD_RE = re.compile(r'[%s]+|[^\W%s]+' % (CJK_CHARS, CJK_CHARS))
+CJK_RE = re.compile(r'[%s]' % CJK_CHARS)
+
+SQLITE_TABLE = 'shop_product_fts'
+POSTGRES_TABLE = 'shop_product_search'
+
+
+def tokenize(text):
+    """
+    把连续的中文切成单字和二元词组，其他文字按字母数字切分并转为小写。
+    """
+    tokens = []
+    for chunk in WORD_RE.findall(text or ''):
+        if CJK_RE.match(chunk):
+            if len(chunk) == 1:
+                tokens.append(chunk)
+            else:
+                tokens.extend(list(chunk) + [chunk[i:i + 2] for i in range(len(chunk) - 1)])
+        else:
+            tokens.append(chunk.lower())
+    return tokens
+
+
+def create_search_index(apps, schema_editor):
+    """
+    创建商品全文索引表，并为已有商品建立索引。
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor not in ('sqlite', 'postgresql'):
+        return
+    Product = apps.get_model('shop', 'Product')
+    rows = [
+        (pk, ' '.join(tokenize(title)), ' '.join(tokenize(description)))
+        for pk, title, description in Product.objects.order_by('id').values_list('id', 'title', 'description')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(title, description, tokenize = 'unicode61')"
+                % SQLITE_TABLE
+            )
+            cursor.executemany(
+                'INSERT INTO %s (rowid, title, description) VALUES (%%s, %%s, %%s)' % SQLITE_TABLE, rows
+            )
+        else:
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS %s (product_id bigint PRIMARY KEY, document tsvector NOT NULL)'
+                % POSTGRES_TABLE
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS %s_document_gin ON %s USING GIN (document)'
+                % (POSTGRES_TABLE, POSTGRES_TABLE)
+            )
+            cursor.executemany(
+                "INSERT INTO %s (product_id, document) VALUES (%%s, "
+                "setweight(to_tsvector('simple', %%s), 'A') || setweight(to_tsvector('simple', %%s), 'B')) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document" % POSTGRES_TABLE,
+                rows
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    """
+    删除商品全文索引表。
+    """
+    vendor = schema_editor.connection.vendor
+    table = {'sqlite': SQLITE_TABLE, 'postgresql': POSTGRES_TABLE}.get(vendor)
+    if table is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS %s' % table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_alter_category_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def dedupe_slugs(apps, schema_editor):
+    """
+    为重复的商品slug加上 -1、-2 等后缀，之后才能加唯一约束。
+
+    每组重复中ID最小的商品保留原slug，已有链接仍然指向最早的商品；
+    后缀规则与 uuslug 为新商品生成不重复slug的规则相同。
+    """
+    Product = apps.get_model('shop', 'Product')
+    max_length = Product._meta.get_field('slug').max_length
+    used = set(Product.objects.values_list('slug', flat=True))
+    seen = set()
+    for pk, slug in Product.objects.order_by('id').values_list('id', 'slug'):
+        if slug not in seen:
+            seen.add(slug)
+            continue
+        index = 1
+        while True:
+            suffix = '-%d' % index
+            candidate = slug[:max_length - len(suffix)] + suffix
+            if candidate not in used:
+                break
+            index += 1
+        used.add(candidate)
+        seen.add(candidate)
+        Product.objects.filter(pk=pk).update(slug=candidate)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_product_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(unique=True),
+        ),
+    ]
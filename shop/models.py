@@ -74,7 +74,9 @@ class Product(models.Model):
     - description: 商品描述，文本字段。
     - price: 商品价格，整型。
     - date_created: 创建日期，日期时间字段，自动添加。
+    - updated: 最后修改时间，每次保存时自动更新，商品卡片的片段缓存以此失效。
     - slug: 商品标题的slug化版本，用于URL，唯一。
+    - renditions: 商品图片的缩略图信息，保存各规格、格式的文件路径和宽度。
     """
 
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='category')
@@ -83,7 +85,9 @@ class Product(models.Model):
     description = models.TextField()
     price = models.IntegerField()
     date_created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
     slug = models.SlugField(unique=True)
+    renditions = models.JSONField(default=dict, blank=True)
 
     class Meta:
         """
@@ -91,8 +95,16 @@ class Product(models.Model):
 
         属性:
         - ordering: 模型对象的默认排序方式，按照创建日期降序排列。
+        - indexes: 首页按 (-date_created, -id) 键集分页；分类页和相关商品按类别筛选后同样按创建日期排序；
+          后台产品列表按价格或标题排序时按 (price, id)、(title, id) 游标分页。
         """
         ordering = ('-date_created',)
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], name='product_created_idx'),
+            models.Index(fields=['category', '-date_created', '-id'], name='product_category_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['title', 'id'], name='product_title_idx'),
+        ]
 
     def __str__(self):
         """
@@ -126,4 +138,37 @@ class Product(models.Model):
         # self.slug = slugify(self.title)
         # return super().save(*args, **kwargs)
         self.slug = uuslug(self.title, instance=self, max_length=50)
-        return super(Product, self).save(*args, **kwargs)
\ No newline at end of file
+        return super(Product, self).save(*args, **kwargs)
+
+class RelatedProduct(models.Model):
+    """
+    预先计算的相关商品，每个商品保存得分最高的若干个相关商品，由 compute_related_products 命令生成。
+
+    属性:
+    - product: 商品，外键连接到Product模型。
+    - related: 与该商品相关的商品，外键连接到Product模型。
+    - rank: 相关商品的排名，从0开始，越小越相关。
+    - score: 共同购买相似度与同类别加成之和。
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_in')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        """
+        Meta类用于定义模型的元数据选项。
+
+        属性:
+        - ordering: 按排名排列。
+        - unique_together: (product, rank) 唯一，其索引也用于按商品读取排好序的相关商品。
+        """
+        ordering = ('rank',)
+        unique_together = ('product', 'rank')
+
+    def __str__(self):
+        """
+        返回商品与相关商品的ID。
+        """
+        return '%s -> %s' % (self.product_id, self.related_id)
@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from shop.models import Category, Product
+from shop.utils.category_tree import bump_tree_version
+from shop.utils.page_cache import bump_catalog_version
+from shop.utils.search import get_search_backend
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """
+    分类保存或删除后更新分类树版本号，使缓存的分类树失效。
+    """
+    bump_tree_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_pages(sender, **kwargs):
+    """
+    商品或分类保存、删除后更新目录版本号，使缓存的商品页面失效。
+    """
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """
+    商品保存后更新其全文索引。
+    """
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """
+    商品删除后移除其全文索引。
+    """
+    get_search_backend().remove(instance.pk)
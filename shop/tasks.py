@@ -0,0 +1,43 @@
+import logging
+
+from django.utils import timezone
+
+from shop.models import Product
+from shop.utils.images import generate_renditions
+from shop.utils.page_cache import bump_catalog_version
+from shop.utils.recommendations import compute_related, store_related
+from tasks.services import task
+
+logger = logging.getLogger(__name__)
+
+
+@task
+def generate_product_renditions(product_id):
+    """
+    为商品图片生成缩略图的后台任务。
+
+    图片无法解析时重试也不会成功，清除等待标记后结束，页面改为显示原图。
+
+    参数:
+    - product_id: 商品ID，商品已被删除时什么也不做。
+    """
+    product = Product.objects.filter(pk=product_id).only('id', 'image', 'renditions').first()
+    if product is None:
+        return
+    try:
+        generate_renditions(product)
+    except (OSError, ValueError):
+        logger.exception('product %s image could not be processed', product_id)
+        # 与成功时一样更新 updated 和目录版本号，商品卡片的片段缓存和整页缓存不再显示占位图
+        Product.objects.filter(pk=product_id).update(renditions={}, updated=timezone.now())
+        bump_catalog_version()
+
+
+@task
+def compute_related_products():
+    """
+    重新计算所有商品的相关商品的后台任务。
+
+    下单时由 place_order 以 enqueue_once 加入队列，也可以用 compute_related_products 命令手动执行。
+    """
+    store_related(compute_related())
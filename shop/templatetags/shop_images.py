@@ -0,0 +1,66 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from shop.utils.images import PENDING_KEY, RENDITIONS
+
+register = template.Library()
+
+# 缩略图生成前使用的浅灰色SVG占位图
+PLACEHOLDER = (
+    "data:image/svg+xml,%%3Csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 %d %d'%%3E"
+    "%%3Crect width='100%%25' height='100%%25' fill='%%23e9ecef'/%%3E%%3C/svg%%3E"
+)
+
+
+def _srcset(entries):
+    """
+    把 [[路径, 宽度], ...] 转为 srcset 属性值。
+    """
+    return ', '.join('%s %sw' % (default_storage.url(path), width) for path, width in entries)
+
+
+@register.simple_tag
+def product_image(product, name, css_class='', style='', loading='lazy'):
+    """
+    渲染商品图片的 <picture> 标签。
+
+    优先提供WebP缩略图，浏览器不支持时使用JPEG缩略图，并通过 srcset 为高分屏选择2倍图。
+    图片刚更换、缩略图任务尚未完成时显示与缩略图同尺寸的占位图，不会把原图发给浏览器；
+    没有等待中的任务却没有缩略图(如缩略图功能上线前上传的商品，可用 generate_renditions 命令补齐)时显示原图。
+
+    用法:
+    - {% product_image product 'card' 'card-img mt-2' %}
+
+    参数:
+    - product: Product实例。
+    - name: 缩略图规格名称，见 shop.utils.images.RENDITIONS。
+    - css_class: img标签的class。
+    - style: img标签的style。
+    - loading: img标签的loading属性，首屏大图可传入'eager'。
+
+    返回:
+    - 安全的HTML字符串。
+    """
+    width, height = RENDITIONS[name]
+    renditions = (product.renditions or {}).get(name)
+    if not renditions or not renditions.get('jpg'):
+        if product.image and not (product.renditions or {}).get(PENDING_KEY):
+            return format_html(
+                '<img style="object-fit: cover;{}" class="{}" width="{}" height="{}" src="{}" loading="{}" alt="{}">',
+                style, css_class, width, height, product.image.url, loading, product.title
+            )
+        return format_html(
+            '<img style="object-fit: cover;{}" class="{}" width="{}" height="{}" src="{}" alt="{}" data-pending="1">',
+            style, css_class, width, height, PLACEHOLDER % (width, height), product.title
+        )
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}px">',
+        (('image/webp', _srcset(renditions['webp']), width),) if renditions.get('webp') else ()
+    )
+    return format_html(
+        '<picture>{}<img style="object-fit: cover;{}" class="{}" width="{}" height="{}" src="{}" srcset="{}" '
+        'sizes="{}px" loading="{}" alt="{}"></picture>',
+        sources, style, css_class, width, height, default_storage.url(renditions['jpg'][0][0]),
+        _srcset(renditions['jpg']), width, loading, product.title
+    )
@@ -1,3 +1,440 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from unittest import skipUnless
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from cart.models import CartItem
+from online_shop.cache import namespace_version
+from online_shop.query_inspector import QueryBudgetTestMixin
+from orders.models import ORDERS_NAMESPACE, Order, OrderItem
+from orders.services import place_order
+from shop.models import Category, Product, RelatedProduct
+from shop.tasks import compute_related_products, generate_product_renditions
+from shop.templatetags.shop_images import product_image
+from shop.utils.images import PENDING_KEY
+from shop.utils.page_cache import CATALOG_NAMESPACE
+from shop.utils.pagination import KeysetPaginator, paginat
+from shop.utils.recommendations import (
+    CATEGORY_WEIGHT, RECOMPUTE_DELAY, compute_related, get_related_products, store_related
+)
+from shop.utils.search import PostgresSearchBackend, SQLiteFTSBackend, get_search_backend, tokenize, tokenize_query
+from tasks.models import Job
+
+
+class QueryPlanTest(TestCase):
+    """
+    online_shop.query_plans 中登记的热点查询都不应出现全表扫描。
+    """
+
+    def test_hot_queries_use_indexes(self):
+        call_command('check_query_plans', stdout=StringIO())
+
+
+@skipUnless(os.path.exists(settings.BASE_DIR / 'db.sqlite3'), '没有随项目提供的数据库')
+class ShippedDatabaseMigrationTest(SimpleTestCase):
+    """
+    随项目提供的 db.sqlite3 可以执行完所有迁移，其中重复的商品slug被加上后缀。
+    """
+
+    def test_migrate_shipped_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'db.sqlite3')
+        shutil.copy(settings.BASE_DIR / 'db.sqlite3', path)
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'migrate', '--noinput'], cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'online_shop.settings', 'SHOP_DB_PATH': path},
+            capture_output=True, text=True, timeout=300,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        connection = sqlite3.connect(path)
+        self.addCleanup(connection.close)
+        self.assertEqual(
+            connection.execute('SELECT slug FROM shop_product GROUP BY slug HAVING COUNT(*) > 1').fetchall(), []
+        )
+        self.assertTrue(connection.execute(
+            "SELECT 1 FROM django_migrations WHERE app = 'shop' AND name = '0014_product_slug_unique'"
+        ).fetchone())
+
+
+class SearchTest(TestCase):
+    """
+    全文索引随商品保存和删除更新，中文和中英混合的查询按相关度返回结果，
+    只由FTS5运算符组成的查询不会导致搜索页出错。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='数码')
+        cls.phone = Product.objects.create(
+            category=cls.category, image='products/p.jpg', title='华为手机 Mate60', description='旗舰手机', price=5000
+        )
+        cls.case = Product.objects.create(
+            category=cls.category, image='products/p.jpg', title='手机壳', description='适用于华为手机', price=50
+        )
+        cls.earphone = Product.objects.create(
+            category=cls.category, image='products/p.jpg', title='蓝牙耳机', description='Bluetooth earphone', price=300
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        return list(get_search_backend().search(query)[:10])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('华为手机 Mate60'), ['华', '为', '手', '机', '华为', '为手', '手机', 'mate60'])
+        self.assertEqual(tokenize_query('华为手机 Mate60'), ['华为', '为手', '手机', 'mate60'])
+        self.assertEqual(tokenize_query('机'), ['机'])
+        self.assertEqual(tokenize_query('"*-'), [])
+
+    def test_index_on_save_and_delete(self):
+        self.assertEqual(self.search('耳机'), [self.earphone])
+        self.earphone.title = '头戴式耳麦'
+        self.earphone.save()
+        self.assertEqual(self.search('耳机'), [])
+        self.assertEqual(self.search('耳麦'), [self.earphone])
+        self.earphone.delete()
+        self.assertEqual(self.search('耳麦'), [])
+
+    def test_chinese_query_ranks_title_matches_first(self):
+        # 两个商品都包含"手机"，标题的权重更高；同为标题匹配时词元更少的标题相关度更高
+        self.assertEqual(set(self.search('手机')), {self.phone, self.case})
+        self.assertEqual(self.search('华为手机'), [self.phone, self.case])
+
+    def test_mixed_script_and_prefix_query(self):
+        self.assertEqual(self.search('华为 mate'), [self.phone])
+        self.assertEqual(self.search('blue'), [self.earphone])
+        # "为平"、"平板"不在任何商品中，词元没有全部匹配时改为匹配任意词元
+        self.assertIn(self.phone, self.search('华为平板'))
+
+    def test_operator_only_queries(self):
+        for query in ['"', '*', '-', 'NEAR', 'NEAR(', '" OR "', 'title:', 'a AND', '^', '手机"', '*手机*']:
+            response = self.client.get('/search/', {'q': query})
+            self.assertEqual(response.status_code, 200, query)
+        self.assertEqual(self.search('手机"'), self.search('手机'))
+
+    def test_match_expressions(self):
+        self.assertEqual(SQLiteFTSBackend()._match(['手机', 'mate']), '"手机" "mate"*')
+        self.assertEqual(SQLiteFTSBackend()._match(['a"b'], match_any=True), '"a""b"*')
+        backend = PostgresSearchBackend()
+        self.assertEqual(backend._tsquery(['手机', 'mate']), "'手机' & 'mate':*")
+        self.assertEqual(backend._tsquery(['手机', "o'neil"], match_any=True), "'手机' | 'o''neil':*")
+        self.assertEqual(backend._tsquery(['手机', 'mate'], weights='A'), "'手机':A & 'mate':*A")
+
+
+class KeysetPaginatorTest(TestCase):
+    """
+    键集分页向前、向后翻页都不重复、不遗漏，date_created 相同的商品按id区分先后；
+    被篡改或无法解析的游标回到第一页。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='数码')
+        Product.objects.bulk_create([
+            Product(category=category, image='products/p.jpg', title='商品%d' % i, slug='p-%d' % i, price=i)
+            for i in range(11)
+        ])
+        # 每3个商品的创建时间相同，翻页边界会落在相同时间的商品之间
+        now = timezone.now()
+        for i, product in enumerate(Product.objects.order_by('id')):
+            Product.objects.filter(id=product.id).update(date_created=now - timedelta(minutes=i // 3))
+        cls.expected = list(Product.objects.order_by('-date_created', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(Product.objects.all(), per_page=4)
+
+    def ids(self, page):
+        return [product.id for product in page]
+
+    def test_forward_and_backward_traversal(self):
+        pages = [self.paginator.get_page()]
+        self.assertFalse(pages[0].has_previous())
+        while pages[-1].has_next():
+            pages.append(self.paginator.get_page(pages[-1].next_page_number()))
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], self.expected)
+
+        # 从最后一页往回翻，得到与向后翻页相同的各页
+        page = pages[-1]
+        for expected_page in reversed(pages[:-1]):
+            self.assertTrue(page.has_previous())
+            page = self.paginator.get_page(page.previous_page_number())
+            self.assertEqual(self.ids(page), self.ids(expected_page))
+            self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursors_return_first_page(self):
+        first = self.ids(self.paginator.get_page())
+        forged = [
+            'garbage',
+            '!!!',
+            base64.urlsafe_b64encode(b'not json').decode(),
+            base64.urlsafe_b64encode(b'["x",["2024-01-01T00:00:00+00:00",1]]').decode(),
+            base64.urlsafe_b64encode(b'["n",[1]]').decode(),
+            base64.urlsafe_b64encode(b'["n",["not a date","abc"]]').decode(),
+            base64.urlsafe_b64encode(b'{"n":1}').decode(),
+        ]
+        for cursor in forged:
+            self.assertEqual(self.ids(self.paginator.get_page(cursor)), first, cursor)
+
+    def test_cursors_past_the_ends_return_first_page(self):
+        first = self.paginator.get_page()
+        last = Product.objects.get(id=self.expected[-1])
+        newest = Product.objects.get(id=self.expected[0])
+        for cursor in (
+            # 最后一个商品之后没有商品，第一个商品之前也没有
+            self.paginator.encode_cursor('n', last),
+            self.paginator.encode_cursor('p', newest),
+        ):
+            page = self.paginator.get_page(cursor)
+            self.assertEqual(self.ids(page), self.ids(first))
+            self.assertFalse(page.has_previous())
+            # 模板会生成下一页的游标
+            self.assertTrue(page.next_page_number())
+
+    def test_stale_cursor_in_dashboard(self):
+        manager = User.objects.create_user('manager@example.com', 'manager', 'managerpass1234')
+        manager.is_manager = True
+        manager.save()
+        self.client.force_login(manager)
+        # 游标指向的商品已被删除，其后没有商品
+        product = Product.objects.get(id=self.expected[-1])
+        cursor = self.paginator.encode_cursor('n', product)
+        product.delete()
+        response = self.client.get('/dashboard/products', {'page': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 10)
+
+    @override_settings(SHOP_KEYSET_PAGINATION=True)
+    def test_paginat_uses_keyset_for_querysets(self):
+        request = RequestFactory().get('/', {'page': 'garbage'})
+        page = paginat(request, Product.objects.order_by('-date_created', '-id'), per_page=4)
+        self.assertTrue(page.is_keyset)
+        self.assertEqual(self.ids(page), self.expected[:4])
+
+
+class RecommendationTest(TestCase):
+    """
+    根据共同购买计算相关商品、保存结果，以及下单后安排重新计算。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        digital = Category.objects.create(title='数码')
+        books = Category.objects.create(title='图书')
+
+        def create(category, title):
+            return Product.objects.create(
+                category=category, image='products/p.jpg', title=title, description='描述', price=10
+            )
+
+        cls.phone = create(digital, '手机')
+        cls.case = create(digital, '手机壳')
+        cls.charger = create(digital, '充电器')
+        cls.cable = create(digital, '数据线')
+        cls.book = create(books, '小说')
+        cls.user = User.objects.create_user('buyer@example.com', 'buyer', 'buyerpass1234')
+        for products in ([cls.phone, cls.case], [cls.phone, cls.case], [cls.phone, cls.charger], [cls.book]):
+            place_order(cls.user, {product.id: 1 for product in products})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_compute_related(self):
+        related = compute_related(top_k=3)
+        ids = {product_id: [related_id for related_id, _ in ranked] for product_id, ranked in related.items()}
+        # 共同购买的商品按余弦相似度排序，没有共同购买的同类商品补在后面
+        self.assertEqual(ids[self.phone.id], [self.case.id, self.charger.id, self.cable.id])
+        scores = [score for _, score in related[self.phone.id]]
+        self.assertAlmostEqual(scores[0], 2 / (3 * 2) ** 0.5 + CATEGORY_WEIGHT)
+        self.assertAlmostEqual(scores[1], 1 / (3 * 1) ** 0.5 + CATEGORY_WEIGHT)
+        self.assertEqual(scores[2], CATEGORY_WEIGHT)
+        # 没有订单的商品按同类别中购买次数最多的商品补足
+        self.assertEqual(ids[self.cable.id], [self.phone.id, self.case.id, self.charger.id])
+        # 类别中没有其他商品时为空，不会推荐其他类别的商品
+        self.assertEqual(ids[self.book.id], [])
+        for product_id, related_ids in ids.items():
+            self.assertNotIn(product_id, related_ids)
+
+    def test_store_related(self):
+        version = namespace_version(CATALOG_NAMESPACE)
+        self.assertEqual(store_related(compute_related(top_k=3)), 12)
+        self.assertNotEqual(namespace_version(CATALOG_NAMESPACE), version)
+        self.assertEqual(get_related_products(self.phone), [self.case, self.charger, self.cable])
+        self.assertEqual(get_related_products(self.phone, limit=1), [self.case])
+        # 重新计算时替换原有的结果
+        self.assertEqual(store_related({self.phone.id: [(self.charger.id, 1.0)]}), 1)
+        self.assertEqual(list(RelatedProduct.objects.values_list('product_id', 'related_id')),
+                         [(self.phone.id, self.charger.id)])
+
+    def test_cold_start_falls_back_to_category(self):
+        # 还没有计算结果的商品显示同类别的其他商品，不包括商品本身
+        related = get_related_products(self.cable)
+        self.assertEqual(set(related), {self.phone, self.case, self.charger})
+        self.assertEqual(get_related_products(self.book), [])
+
+    def test_orders_schedule_recomputation(self):
+        # setUpTestData 中的四个订单只安排了一个任务
+        job = Job.objects.get(name=compute_related_products.name)
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreater(job.run_after, job.created + timedelta(seconds=RECOMPUTE_DELAY - 60))
+        place_order(self.user, {self.cable.id: 1})
+        self.assertEqual(Job.objects.filter(name=compute_related_products.name).count(), 1)
+
+        compute_related_products()
+        rows = RelatedProduct.objects.filter(product=self.cable).order_by('rank')
+        self.assertEqual(
+            list(rows.values_list('related_id', flat=True)), [self.phone.id, self.case.id, self.charger.id]
+        )
+
+
+class ProductImageTest(TestCase):
+    """
+    有缩略图时输出 <picture>，缩略图任务进行中时输出占位图，没有等待中的任务时回退到原图。
+    """
+
+    def setUp(self):
+        self.product = Product(id=1, title='手机', image='products/p.jpg')
+
+    def test_renditions(self):
+        self.product.renditions = {'card': {
+            'webp': [['renditions/ab/a.webp', 268], ['renditions/ab/b.webp', 536]],
+            'jpg': [['renditions/ab/a.jpg', 268], ['renditions/ab/b.jpg', 536]],
+        }}
+        html = product_image(self.product, 'card')
+        self.assertIn('<source type="image/webp" srcset="/media/renditions/ab/a.webp 268w, '
+                      '/media/renditions/ab/b.webp 536w"', html)
+        self.assertIn('src="/media/renditions/ab/a.jpg"', html)
+
+    def test_pending_renditions_use_placeholder(self):
+        self.product.renditions = {PENDING_KEY: True}
+        html = product_image(self.product, 'card')
+        self.assertIn('data-pending="1"', html)
+        self.assertNotIn('products/p.jpg', html)
+
+    def test_failed_renditions_invalidate_caches(self):
+        category = Category.objects.create(title='数码')
+        product = Product.objects.create(
+            category=category, image='products/missing.jpg', title='手机', description='描述', price=10
+        )
+        updated = timezone.now() - timedelta(days=1)
+        Product.objects.filter(id=product.id).update(renditions={PENDING_KEY: True}, updated=updated)
+        version = namespace_version(CATALOG_NAMESPACE)
+        # 图片文件不存在，生成缩略图失败
+        with self.assertLogs('shop.tasks', 'ERROR'):
+            generate_product_renditions(product_id=product.id)
+        product.refresh_from_db()
+        self.assertEqual(product.renditions, {})
+        self.assertGreater(product.updated, updated)
+        self.assertNotEqual(namespace_version(CATALOG_NAMESPACE), version)
+        self.assertIn('src="/media/products/missing.jpg"', product_image(product, 'card'))
+
+    def test_missing_renditions_fall_back_to_original(self):
+        html = product_image(self.product, 'card')
+        self.assertIn('src="/media/products/p.jpg"', html)
+        self.assertNotIn('data-pending', html)
+        # 商品没有图片时仍然显示占位图
+        self.product.image = ''
+        self.assertIn('data-pending="1"', product_image(self.product, 'card'))
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class StorefrontQueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    """
+    前台页面的查询次数不超过 SHOP_QUERY_BUDGETS 中的预算，且没有N+1查询。
+
+    购物车、收藏和订单都有多条记录，逐个对象查询关联数据时会超出预算。
+    缓存在每个测试前清空，测量的是未命中缓存时的查询次数。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        parent = Category.objects.create(title='数码')
+        children = [Category.objects.create(title='子类%d' % i, is_sub=True, sub_category=parent) for i in range(3)]
+        cls.category = parent
+        cls.products = [
+            Product.objects.create(
+                category=children[i % 3], image='products/p.jpg', title='商品%d' % i, description='描述', price=10 + i
+            )
+            for i in range(30)
+        ]
+        cls.user = User.objects.create_user('buyer@example.com', 'buyer', 'buyerpass1234')
+        cls.user.likes.add(*cls.products[:10])
+        CartItem.objects.bulk_create([
+            CartItem(user=cls.user, product=product, quantity=2, price=product.price) for product in cls.products[:10]
+        ])
+        orders = Order.objects.bulk_create([Order(user=cls.user, status=True) for _ in range(20)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=product.price, quantity=1)
+            for i, order in enumerate(orders) for product in cls.products[i:i + 3]
+        ])
+        Order.objects.refresh_totals()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages(self):
+        self.assertQueryBudget('/')
+        self.assertQueryBudget(self.products[0].get_absolute_url())
+        self.assertQueryBudget('/filter/%s/' % self.category.slug)
+        self.assertQueryBudget('/search/', {'q': '商品'})
+
+    def test_user_pages(self):
+        self.client.force_login(self.user)
+        self.assertQueryBudget('/')
+        self.assertQueryBudget(self.products[0].get_absolute_url())
+        self.assertQueryBudget('/filter/%s/' % self.category.slug)
+        self.assertQueryBudget('/search/', {'q': '商品'})
+        self.assertQueryBudget('/favorites/')
+        self.assertQueryBudget('/cart/list/')
+        self.assertQueryBudget('/cart/api/summary/')
+        self.assertQueryBudget('/orders/list')
+        self.assertQueryBudget('/accounts/profile/manage_shipping_address')
+        self.assertQueryBudget('/accounts/profile/edit')
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class BenchmarkTest(TestCase):
+    """
+    seed_catalog 生成的数据可以直接用于 benchmark，基准结束后数据库恢复原状。
+    """
+
+    def test_seed_and_benchmark(self):
+        call_command('seed_catalog', categories=2, depth=2, children=2, products=20, users=3, orders=10,
+                     prefix='t', stdout=StringIO())
+        self.assertEqual(Category.objects.filter(sub_category__isnull=False).count(), 4)
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Order.objects.count(), 10)
+        order = Order.objects.first()
+        self.assertEqual(order.total_price, sum(item.get_cost() for item in order.items.all()))
+
+        orders_version = namespace_version(ORDERS_NAMESPACE)
+        path = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        call_command('benchmark', iterations=2, warmup=1, save=path, stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 10)
+        # 下单场景更新过订单命名空间的版本号，回滚后恢复，之间缓存的订单数量不再被读到
+        self.assertEqual(namespace_version(ORDERS_NAMESPACE), orders_version)
+        self.assertFalse(CartItem.objects.exists())
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        self.assertFalse([name for name, result in baseline['scenarios'].items() if result['errors']])
+
+        output = StringIO()
+        call_command('benchmark', 'home', iterations=2, compare=path, threshold=100, stdout=output)
+        self.assertIn('没有发现退化', output.getvalue())
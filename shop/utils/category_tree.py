@@ -0,0 +1,166 @@
+from django.core.cache import cache
+
+from online_shop.cache import bump_namespace, namespace_version, versioned_key
+from shop.models import Category
+
+# 分类树的缓存命名空间，分类保存或删除时更新其版本号，旧的缓存自然失效
+CATEGORY_TREE_NAMESPACE = 'shop:category_tree'
+# 分类树缓存时间(秒)
+CATEGORY_TREE_TIMEOUT = 60 * 60 * 24
+
+
+class CategoryNode:
+    """
+    分类树中的节点，只保存导航栏和筛选所需的字段。
+
+    属性:
+    - id: 分类ID。
+    - title: 分类名称。
+    - slug: 分类的slug。
+    - is_sub: 是否为子类别。
+    - parent_id: 父分类ID，没有父分类时为None。
+    - children: 子分类节点列表。
+    - descendant_ids: 包含自身在内的所有后代分类ID。
+    """
+    __slots__ = ('id', 'title', 'slug', 'is_sub', 'parent_id', 'children', 'descendant_ids')
+
+    def __init__(self, id, title, slug, is_sub, parent_id):
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.is_sub = is_sub
+        self.parent_id = parent_id
+        self.children = []
+        self.descendant_ids = ()
+
+    def __str__(self):
+        """
+        返回分类名称，与Category模型保持一致。
+        """
+        return self.title
+
+
+class CategoryTree:
+    """
+    分类树，由一次查询得到的全部分类构建。
+
+    属性:
+    - roots: 顶级分类节点列表(is_sub为False的分类)，导航栏按此渲染。
+    - by_id: 以分类ID为键的节点字典。
+    - by_slug: 以slug为键的节点字典。
+    """
+
+    def __init__(self, rows):
+        """
+        根据分类行数据构建分类树。
+
+        参数:
+        - rows: 可迭代对象，每项为包含id、title、slug、is_sub、sub_category_id的字典。
+        """
+        self.by_id = {}
+        for row in rows:
+            self.by_id[row['id']] = CategoryNode(
+                row['id'], row['title'], row['slug'], row['is_sub'], row['sub_category_id']
+            )
+        self.by_slug = {node.slug: node for node in self.by_id.values()}
+        for node in self.by_id.values():
+            parent = self.by_id.get(node.parent_id)
+            if parent is not None:
+                parent.children.append(node)
+        self.roots = [node for node in self.by_id.values() if not node.is_sub]
+        for node in self.by_id.values():
+            node.descendant_ids = self._collect_descendants(node)
+
+    @staticmethod
+    def _collect_descendants(node):
+        """
+        广度优先收集节点自身及其所有后代的ID，防止数据中的环导致死循环。
+
+        参数:
+        - node: CategoryNode实例。
+
+        返回:
+        - 元组，包含节点自身及所有后代分类的ID。
+        """
+        seen = {node.id}
+        ids = [node.id]
+        queue = list(node.children)
+        while queue:
+            child = queue.pop(0)
+            if child.id in seen:
+                continue
+            seen.add(child.id)
+            ids.append(child.id)
+            queue.extend(child.children)
+        return tuple(ids)
+
+    def get(self, slug):
+        """
+        根据slug获取分类节点。
+
+        参数:
+        - slug: 分类的slug。
+
+        返回:
+        - CategoryNode实例，不存在时返回None。
+        """
+        return self.by_slug.get(slug)
+
+
+def get_tree_version():
+    """
+    获取当前分类树版本号。
+
+    返回:
+    - 整数，分类树版本号。
+    """
+    return namespace_version(CATEGORY_TREE_NAMESPACE)
+
+
+def bump_tree_version():
+    """
+    更新分类树版本号，使所有进程中缓存的旧分类树失效。
+    """
+    bump_namespace(CATEGORY_TREE_NAMESPACE)
+
+
+def build_category_tree():
+    """
+    用一次数据库查询构建分类树。
+
+    返回:
+    - CategoryTree实例。
+    """
+    rows = Category.objects.order_by('id').values('id', 'title', 'slug', 'is_sub', 'sub_category_id')
+    return CategoryTree(rows)
+
+
+def get_category_tree():
+    """
+    获取分类树，优先从缓存读取，缓存未命中时查询数据库并写入缓存。
+
+    返回:
+    - CategoryTree实例。
+    """
+    key = versioned_key(CATEGORY_TREE_NAMESPACE, 'tree')
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(key, tree, CATEGORY_TREE_TIMEOUT)
+    return tree
+
+
+def get_request_category_tree(request):
+    """
+    获取当前请求的分类树，同一请求内只读取一次缓存。
+
+    参数:
+    - request: HttpRequest对象。
+
+    返回:
+    - CategoryTree实例。
+    """
+    tree = getattr(request, '_category_tree', None)
+    if tree is None:
+        tree = request._category_tree = get_category_tree()
+    return tree
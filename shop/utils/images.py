@@ -0,0 +1,118 @@
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from shop.utils.page_cache import bump_catalog_version
+
+# 缩略图规格: 名称 -> (宽, 高)，与模板中的展示尺寸一致
+RENDITIONS = {
+    'card': (268, 200),
+    'detail': (510, 500),
+}
+# 为高分屏生成的倍率
+DENSITIES = (1, 2)
+# 输出格式: (扩展名, Pillow格式, 保存参数)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+# 缩略图在存储中的目录
+RENDITION_DIR = 'renditions'
+# 图片已更换、缩略图任务尚未完成时 renditions 字段中的标记，模板据此显示占位图而不是原图
+PENDING_KEY = 'pending'
+
+
+def _encode(image, pillow_format, options):
+    """
+    把图片编码为指定格式的字节串。
+
+    参数:
+    - image: PIL图片对象。
+    - pillow_format: Pillow格式名称。
+    - options: 保存参数。
+
+    返回:
+    - 编码后的字节串。
+    """
+    buffer = BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def _store(data, extension):
+    """
+    以内容哈希命名保存文件，内容相同的文件只保存一次。
+
+    文件名随内容变化，因此可以设置很长的缓存时间而不必担心浏览器拿到旧图片。
+
+    参数:
+    - data: 文件内容。
+    - extension: 文件扩展名。
+
+    返回:
+    - 文件在存储中的路径。
+    """
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    path = '%s/%s/%s.%s' % (RENDITION_DIR, digest[:2], digest, extension)
+    if not default_storage.exists(path):
+        path = default_storage.save(path, ContentFile(data))
+    return path
+
+
+def build_renditions(image_file):
+    """
+    为一张原图生成所有规格、倍率和格式的缩略图。
+
+    参数:
+    - image_file: 可被Pillow打开的文件对象。
+
+    返回:
+    - 字典，结构为 {规格: {扩展名: [[路径, 宽度], ...]}}。
+    """
+    with Image.open(image_file) as original:
+        # 按EXIF方向旋转，并去掉EXIF等元数据和透明通道
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    renditions = {}
+    for name, (width, height) in RENDITIONS.items():
+        renditions[name] = {extension: [] for extension, _, _ in FORMATS}
+        for density in DENSITIES:
+            # 原图不够大时不生成更高倍率的图片
+            if density > 1 and image.width < width * density and image.height < height * density:
+                continue
+            size = (width * density, height * density)
+            fitted = ImageOps.fit(image, size, Image.LANCZOS)
+            for extension, pillow_format, options in FORMATS:
+                path = _store(_encode(fitted, pillow_format, options), extension)
+                renditions[name][extension].append([path, size[0]])
+    return renditions
+
+
+def generate_renditions(product):
+    """
+    为商品图片生成缩略图，并保存到商品的 renditions 字段。
+
+    使用 update 写入，不会触发 Product.save 中的slug重算和保存信号，因此需要自行更新 updated
+    并使缓存的页面失效。
+
+    参数:
+    - product: Product实例。
+
+    返回:
+    - 缩略图字典，商品没有图片时为空字典。
+    """
+    renditions = {}
+    if product.image:
+        product.image.open('rb')
+        try:
+            renditions = build_renditions(product.image)
+        finally:
+            product.image.close()
+    product.renditions = renditions
+    product.updated = timezone.now()
+    type(product).objects.filter(pk=product.pk).update(renditions=renditions, updated=product.updated)
+    bump_catalog_version()
+    return renditions
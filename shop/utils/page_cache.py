@@ -0,0 +1,112 @@
+import hashlib
+import re
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+
+from online_shop.cache import bump_namespace, namespace_version, versioned_key
+
+# 商品目录的缓存命名空间，商品或分类保存、删除时更新其版本号
+CATALOG_NAMESPACE = 'shop:catalog'
+# 缓存页面中CSRF令牌的占位符，命中缓存时替换为当前访客的令牌
+CSRF_PLACEHOLDER = b'__csrf_token__'
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def get_catalog_version():
+    """
+    获取当前商品目录版本号。
+
+    返回:
+    - 整数，商品目录版本号。
+    """
+    return namespace_version(CATALOG_NAMESPACE)
+
+
+def bump_catalog_version():
+    """
+    更新商品目录版本号，使所有以目录版本号为键的缓存(商品页面、商品数量等)失效。
+    """
+    bump_namespace(CATALOG_NAMESPACE)
+
+
+def get_page_cache_key(request):
+    """
+    根据请求路径、查询参数和目录版本号生成页面缓存键。
+
+    查询参数按名称排序，参数顺序不同的相同请求共用一份缓存。
+
+    参数:
+    - request: HttpRequest对象。
+
+    返回:
+    - 缓存键字符串。
+    """
+    query_string = urlencode(sorted((key, value) for key, values in request.GET.lists() for value in values))
+    url = '%s?%s' % (request.path, query_string)
+    return versioned_key(CATALOG_NAMESPACE, 'page', hashlib.md5(url.encode()).hexdigest())
+
+
+def is_page_cacheable(request):
+    """
+    判断请求能否使用整页缓存。
+
+    只缓存匿名访客的GET/HEAD请求。带有待显示消息的请求不使用缓存，
+    消息默认保存在cookie中，判断时不会读取会话。
+
+    参数:
+    - request: HttpRequest对象。
+
+    返回:
+    - 布尔值。
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and 'messages' not in request.COOKIES
+        and not request.user.is_authenticated
+    )
+
+
+def cache_anonymous_page(view):
+    """
+    缓存匿名访客看到的整页HTML的装饰器。
+
+    缓存键包含目录版本号，商品或分类变化后旧页面自然失效。
+    页面中唯一与访客相关的内容是表单中的CSRF令牌：存入缓存前替换为占位符，
+    命中缓存时再填入当前访客的令牌，因此命中缓存的请求不需要访问数据库。
+    SHOP_PAGE_CACHE_TIMEOUT 为0时不使用缓存。
+
+    参数:
+    - view: 视图函数。
+
+    返回:
+    - 包装后的视图函数。
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timeout = getattr(settings, 'SHOP_PAGE_CACHE_TIMEOUT', 0)
+        if not timeout or not is_page_cacheable(request):
+            return view(request, *args, **kwargs)
+        key = get_page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            if CSRF_PLACEHOLDER in content:
+                content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+        else:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                content = CSRF_INPUT_RE.sub(rb'\g<1>' + CSRF_PLACEHOLDER + rb'\g<2>', response.content)
+                cache.set(key, (content, response['Content-Type']), timeout)
+                response['X-Page-Cache'] = 'miss'
+        # 登录用户看到的是另一个版本的页面，共享缓存需要按cookie区分
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
@@ -0,0 +1,242 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.db.models import Q, QuerySet
+
+# 每页显示的对象数量
+PER_PAGE = 20
+
+
+class InvalidCursor(Exception):
+    """
+    游标无法解析或与排序字段不匹配时抛出的异常。
+    """
+
+
+class KeysetPage:
+    """
+    键集分页的一页结果，提供与 Django Page 相近的接口供模板使用。
+
+    属性:
+    - object_list: 当前页的对象列表。
+    - count: 对象总数，分页器跳过计数时为None。
+    - is_keyset: 固定为True，模板据此生成游标链接。
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous, count=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        """
+        返回下一页的游标，放在 page 参数中使用。
+        """
+        return self.paginator.encode_cursor('n', self.object_list[-1])
+
+    def previous_page_number(self):
+        """
+        返回上一页的游标，放在 page 参数中使用。
+        """
+        return self.paginator.encode_cursor('p', self.object_list[0])
+
+
+class KeysetPaginator:
+    """
+    基于游标的键集分页器。
+
+    按排序字段(默认 -date_created, -id)的值定位下一页的起点，
+    使用 WHERE 条件代替 OFFSET，翻到多深的页面都只需要一次带 LIMIT 的索引查询。
+    默认不执行 COUNT(*)，需要总数时传入 with_count=True。
+    排序字段必须非空，且最后一个字段需要唯一(通常为id)以保证顺序稳定。
+    """
+
+    def __init__(self, queryset, per_page=PER_PAGE, ordering=('-date_created', '-id'), with_count=False):
+        """
+        初始化分页器。
+
+        参数:
+        - queryset: 需要分页的查询集。
+        - per_page: 每页的对象数量。
+        - ordering: 排序字段元组，字段名前加'-'表示降序。
+        - with_count: 是否计算对象总数。
+        """
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        self.with_count = with_count
+
+    def encode_cursor(self, direction, obj):
+        """
+        把对象的排序字段值编码为游标字符串。
+
+        参数:
+        - direction: 'n' 表示向后翻页，'p' 表示向前翻页。
+        - obj: 作为定位点的对象。
+
+        返回:
+        - URL安全的游标字符串。
+        """
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        payload = json.dumps([direction, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        解析游标字符串。
+
+        参数:
+        - cursor: 游标字符串。
+
+        返回:
+        - 元组 (direction, values)，values 已转换为模型字段对应的Python类型。
+
+        异常:
+        - InvalidCursor: 游标无法解析时抛出。
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError, binascii.Error) as e:
+            raise InvalidCursor(cursor) from e
+        if direction not in ('n', 'p') or not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        model = self.queryset.model
+        try:
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except ValidationError as e:
+            raise InvalidCursor(cursor) from e
+        return direction, values
+
+    def _seek(self, values, backwards):
+        """
+        构造"位于定位点之后"的查询条件，按字典序比较多个排序字段。
+
+        参数:
+        - values: 定位点的排序字段值。
+        - backwards: 是否向前翻页。
+
+        返回:
+        - Q对象。
+        """
+        condition = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**{'%s__%s' % (name, lookup): values[i]})
+            for (prev_name, _), prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def get_page(self, cursor=None):
+        """
+        获取游标所指的一页，游标为空、无效或指向的位置之后已经没有数据时返回第一页。
+
+        参数:
+        - cursor: 游标字符串。
+
+        返回:
+        - KeysetPage实例。
+        """
+        direction, values = 'n', None
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                direction, values = 'n', None
+
+        backwards = direction == 'p'
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else '-' + name for name in self.ordering]
+        else:
+            ordering = self.ordering
+        # 多取一条用于判断这一方向上是否还有数据
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        if not rows and values is not None:
+            # 过期或被修改的游标越过了最后(或第一)一行，空页无法生成翻页游标
+            return self.get_page()
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, values is not None
+        count = self.queryset.count() if self.with_count else None
+        return KeysetPage(rows, self, has_next, has_previous, count)
+
+
+def paginat(request, list_objects, keyset=None, per_page=PER_PAGE, count_key=None):
+    """
+    对象分页函数。
+
+    参数:
+    - request: HttpRequest对象，用于获取用户请求信息。
+    - list_objects: 需要进行分页的对象列表。
+    - per_page: 每页的对象数量，默认为20。
+    - keyset: 是否使用键集分页，默认由 settings.SHOP_KEYSET_PAGINATION 决定。
+      只有按 -date_created 排序的商品查询集可以使用键集分页，其他对象(例如按相关度排序的搜索结果)
+      始终使用页码分页。
+    - count_key: 页码分页时缓存对象总数的缓存键，通常由 online_shop.cache.versioned_key 生成，
+      数据变化时更新命名空间版本号即可使其失效。为None时每次都执行COUNT查询。
+
+    返回:
+    - 返回一个分页后的对象页面。
+    """
+    if keyset is None:
+        keyset = getattr(settings, 'SHOP_KEYSET_PAGINATION', False)
+    if keyset and isinstance(list_objects, QuerySet):
+        paginator = KeysetPaginator(
+            list_objects, per_page, with_count=getattr(settings, 'SHOP_KEYSET_PAGINATION_COUNT', False)
+        )
+        return paginator.get_page(request.GET.get('page'))
+
+    p = Paginator(list_objects, per_page)  # 使用Paginator类将列表对象分页，默认每页包含20个对象
+    if count_key is not None:
+        # 总数读取缓存，Paginator.count 是 cached_property，直接赋值即可跳过COUNT查询
+        count = cache.get(count_key)
+        if count is None:
+            count = p.count
+            cache.set(count_key, count)
+        p.count = count
+    page_number = request.GET.get('page')  # 从请求中获取用户请求的页面编号
+    try:
+        page_obj = p.get_page(page_number)  # 尝试根据页面编号获取对应的页面对象
+    except PageNotAnInteger:
+        # 如果页面编号不是整数，则返回第1页
+        page_obj = p.page(1)
+    except EmptyPage:
+        # 如果请求的页面超出范围，则返回最后一页
+        page_obj = p.page(p.num_pages)
+    return page_obj
@@ -0,0 +1,152 @@
+import math
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.db import transaction
+
+from shop.models import Product, RelatedProduct
+from shop.utils.page_cache import bump_catalog_version
+
+# 每个商品保存的相关商品数量
+TOP_K = 10
+# 详情页展示的相关商品数量
+RELATED_LIMIT = 4
+# 同类别商品的加成，共同购买相似度的取值范围是 (0, 1]
+CATEGORY_WEIGHT = 0.1
+# 商品种类超过该数量的订单不参与共同购买统计，避免一个大订单产生大量弱关联
+MAX_ORDER_SIZE = 50
+# 下单后延迟重新计算相关商品的秒数，期间的订单合并为一次计算
+RECOMPUTE_DELAY = 600
+
+
+def co_purchase_counts():
+    """
+    统计每个商品出现在多少个订单中，以及每对商品共同出现在多少个订单中。
+
+    按订单顺序流式读取 (订单ID, 商品ID)，内存中只保留计数，不保留订单。
+
+    返回值:
+    - (单个商品计数, 商品对计数)，商品对的键为 (较小ID, 较大ID)。
+    """
+    from orders.models import OrderItem
+
+    item_counts = Counter()
+    pair_counts = Counter()
+
+    def flush(products):
+        if not products or len(products) > MAX_ORDER_SIZE:
+            return
+        item_counts.update(products)
+        pair_counts.update(combinations(sorted(products), 2))
+
+    rows = OrderItem.objects.order_by('order_id').values_list('order_id', 'product_id').iterator()
+    current, products = None, set()
+    for order_id, product_id in rows:
+        if order_id != current:
+            flush(products)
+            current, products = order_id, set()
+        products.add(product_id)
+    flush(products)
+    return item_counts, pair_counts
+
+
+def compute_related(top_k=TOP_K, category_weight=CATEGORY_WEIGHT):
+    """
+    计算每个商品的前 top_k 个相关商品。
+
+    得分由两部分组成：
+    - 共同购买相似度: 两个商品共同出现的订单数 / sqrt(各自出现的订单数之积)，即余弦相似度；
+    - 类别亲和: 同类别的商品额外加 category_weight。
+    共同购买的相关商品不足 top_k 个时，用同类别中购买次数最多、最新的商品补足，
+    这些商品只有类别加成，排在共同购买的商品之后。
+
+    参数:
+    - top_k: 每个商品保存的相关商品数量。
+    - category_weight: 同类别加成。
+
+    返回值:
+    - 字典，键为商品ID，值为按得分降序排列的 [(相关商品ID, 得分), ...]。
+    """
+    item_counts, pair_counts = co_purchase_counts()
+    categories = dict(Product.objects.values_list('id', 'category_id'))
+
+    neighbours = defaultdict(dict)
+    for (a, b), count in pair_counts.items():
+        if a not in categories or b not in categories:
+            continue
+        score = count / math.sqrt(item_counts[a] * item_counts[b])
+        if categories[a] == categories[b]:
+            score += category_weight
+        neighbours[a][b] = score
+        neighbours[b][a] = score
+
+    # 每个类别中最受欢迎的商品，用于补足共同购买数据不足的商品
+    by_category = defaultdict(list)
+    for product_id, category_id in categories.items():
+        by_category[category_id].append(product_id)
+    popular = {
+        category_id: sorted(ids, key=lambda i: (item_counts[i], i), reverse=True)[:top_k + 1]
+        for category_id, ids in by_category.items()
+    }
+
+    related = {}
+    for product_id, category_id in categories.items():
+        scores = neighbours.get(product_id, {})
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))[:top_k]
+        if len(ranked) < top_k:
+            chosen = {related_id for related_id, _ in ranked}
+            for related_id in popular[category_id]:
+                if len(ranked) >= top_k:
+                    break
+                if related_id != product_id and related_id not in chosen:
+                    ranked.append((related_id, category_weight))
+        related[product_id] = ranked
+    return related
+
+
+def store_related(related, batch_size=1000):
+    """
+    用新的计算结果替换 RelatedProduct 表的内容，在一个事务中完成，读取方不会看到一半的结果。
+    写入后使缓存的商品页面失效。
+
+    参数:
+    - related: compute_related 的返回值。
+    - batch_size: 每次批量写入的行数。
+
+    返回值:
+    - 写入的行数。
+    """
+    rows = [
+        RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, score=score)
+        for product_id, ranked in related.items()
+        for rank, (related_id, score) in enumerate(ranked)
+    ]
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=batch_size)
+    bump_catalog_version()
+    return len(rows)
+
+
+def get_related_products(product, limit=RELATED_LIMIT):
+    """
+    读取商品的相关商品。
+
+    预先计算的结果通过 (product, rank) 索引一次查询取出；还没有计算结果的新商品
+    退回到同类别的最新商品，并排除商品本身。
+
+    参数:
+    - product: Product实例。
+    - limit: 返回的商品数量。
+
+    返回值:
+    - 相关商品列表。
+    """
+    related = list(
+        Product.objects.filter(recommended_in__product_id=product.id).order_by('recommended_in__rank')[:limit]
+    )
+    if not related:
+        related = list(
+            Product.objects.filter(category_id=product.category_id).exclude(id=product.id)[:limit]
+        )
+    return related
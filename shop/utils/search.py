@@ -0,0 +1,459 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from shop.models import Product
+
+# 中日韩统一表意文字，这些文字之间没有空格，需要单独切分
+CJK_CHARS = '㐀-䶿一-鿿豈-﫿'
+# 连续的中文字符或连续的字母数字组成一个词块
+WORD_RE = re.compile(r'[%s]+|[^\W%s]+' % (CJK_CHARS, CJK_CHARS))
+CJK_RE = re.compile(r'[%s]' % CJK_CHARS)
+
+
+def _cjk_grams(chunk, with_unigrams):
+    """
+    把一段连续的中文切分为二元词组，可选地附带单字。
+
+    参数:
+    - chunk: 连续的中文字符串。
+    - with_unigrams: 是否同时输出单字。
+
+    返回:
+    - 词元列表。
+    """
+    if len(chunk) == 1:
+        return [chunk]
+    grams = [chunk[i:i + 2] for i in range(len(chunk) - 1)]
+    if with_unigrams:
+        grams = list(chunk) + grams
+    return grams
+
+
+def tokenize(text):
+    """
+    生成写入索引的词元。
+
+    中文没有空格分词，这里把连续的中文切成单字和二元词组，
+    其他文字按字母数字切分并转为小写。
+
+    参数:
+    - text: 需要建立索引的文本。
+
+    返回:
+    - 词元列表。
+    """
+    tokens = []
+    for chunk in WORD_RE.findall(text or ''):
+        if CJK_RE.match(chunk):
+            tokens.extend(_cjk_grams(chunk, with_unigrams=True))
+        else:
+            tokens.append(chunk.lower())
+    return tokens
+
+
+def tokenize_query(text):
+    """
+    生成搜索用的词元，中文只使用二元词组(单个汉字时使用单字)。
+
+    参数:
+    - text: 用户输入的搜索字符串。
+
+    返回:
+    - 词元列表。
+    """
+    tokens = []
+    for chunk in WORD_RE.findall(text or ''):
+        if CJK_RE.match(chunk):
+            tokens.extend(_cjk_grams(chunk, with_unigrams=False))
+        else:
+            tokens.append(chunk.lower())
+    return tokens
+
+
+class SearchResults:
+    """
+    按相关度排序的搜索结果，支持 len() 和切片，可直接交给 Paginator 分页。
+
+    总数和每一页的商品ID都直接从索引中读取，切片时才按ID加载对应的商品。
+    默认要求匹配全部词元；没有结果且词元多于一个时(例如"华为手机"中的"为手"不会出现在商品中)，
+    改为匹配任意词元，由相关度排序把匹配词元更多的商品排在前面。
+    """
+
+    def __init__(self, backend, tokens):
+        """
+        初始化搜索结果。
+
+        参数:
+        - backend: 执行搜索的后端实例。
+        - tokens: 搜索词元列表。
+        """
+        self.backend = backend
+        self.tokens = tokens
+        self.match_any = False
+        self._count = None
+
+    def count(self):
+        """
+        返回匹配的商品总数，结果会被缓存。
+        """
+        if self._count is None:
+            self._count = self.backend.count(self.tokens) if self.tokens else 0
+            if self._count == 0 and len(self.tokens) > 1:
+                self.match_any = True
+                self._count = self.backend.count(self.tokens, match_any=True)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        """
+        按切片从索引中读取一页商品ID，并按相关度顺序返回商品实例列表。
+
+        参数:
+        - key: 切片或整数下标。
+
+        返回:
+        - 商品列表(切片)或单个商品(整数下标)。
+        """
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if not self.tokens or stop <= start or not self.count():
+            return []
+        ids = self.backend.ranked_ids(self.tokens, start, stop - start, match_any=self.match_any)
+        products = Product.objects.in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+
+class BaseSearchBackend:
+    """
+    搜索后端基类，子类需要实现索引的维护和查询。
+    """
+
+    def index(self, product):
+        """
+        写入或更新一个商品的索引。
+        """
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        """
+        删除一个商品的索引。
+        """
+        raise NotImplementedError
+
+    def create_table(self, cursor):
+        """
+        创建索引表，不需要索引表的后端无需实现。
+        """
+
+    def drop_table(self, cursor):
+        """
+        删除索引表，不需要索引表的后端无需实现。
+        """
+
+    def index_rows(self, cursor, rows):
+        """
+        批量写入索引。
+
+        参数:
+        - cursor: 数据库游标。
+        - rows: 可迭代对象，每项为 (商品ID, 标题, 描述)。
+        """
+
+    def clear(self, cursor):
+        """
+        清空索引表。
+        """
+
+    def rebuild(self):
+        """
+        清空并重建全部商品的索引。
+
+        返回:
+        - 整数，写入索引的商品数量。
+        """
+        rows = list(Product.objects.order_by('id').values_list('id', 'title', 'description'))
+        with connection.cursor() as cursor:
+            self.create_table(cursor)
+            self.clear(cursor)
+            self.index_rows(cursor, rows)
+        return len(rows)
+
+    def count(self, tokens, match_any=False):
+        """
+        返回匹配词元的商品数量。
+
+        参数:
+        - tokens: 搜索词元列表。
+        - match_any: 为True时匹配任意词元，否则要求匹配全部词元。
+        """
+        raise NotImplementedError
+
+    def ranked_ids(self, tokens, offset, limit, match_any=False):
+        """
+        返回按相关度排序的一页商品ID。
+        """
+        raise NotImplementedError
+
+    def filter_by_title(self, queryset, query):
+        """
+        用索引按标题筛选商品查询集，不改变查询集的排序，可以与其他条件和分页组合使用。
+
+        参数:
+        - queryset: 商品查询集。
+        - query: 用户输入的搜索字符串。
+
+        返回:
+        - 筛选后的查询集。
+        """
+        tokens = tokenize_query(query)
+        if not tokens:
+            return queryset.none()
+        return queryset.filter(id__in=self.title_match_sql(tokens))
+
+    def title_match_sql(self, tokens):
+        """
+        返回在索引中按标题匹配词元的商品ID子查询。
+        """
+        raise NotImplementedError
+
+    def search(self, query):
+        """
+        搜索商品标题和描述。
+
+        参数:
+        - query: 用户输入的搜索字符串。
+
+        返回:
+        - SearchResults实例。
+        """
+        return SearchResults(self, tokenize_query(query))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    基于SQLite FTS5虚拟表的搜索后端。
+
+    虚拟表的rowid就是商品ID，title和description列保存预先切分好的词元，
+    查询结果按bm25排序，标题的权重高于描述。
+    """
+    table = 'shop_product_fts'
+    # bm25 的列权重: title, description
+    weights = (10.0, 1.0)
+
+    def create_table(self, cursor):
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(title, description, tokenize = 'unicode61')"
+            % self.table
+        )
+
+    def drop_table(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS %s' % self.table)
+
+    def _match(self, tokens, match_any=False):
+        """
+        把词元转为 FTS5 的 MATCH 表达式，各词元之间为 AND(或 OR)关系，非中文词元支持前缀匹配。
+        """
+        terms = []
+        for token in tokens:
+            term = '"%s"' % token.replace('"', '""')
+            if not CJK_RE.match(token):
+                term += '*'
+            terms.append(term)
+        return (' OR ' if match_any else ' ').join(terms)
+
+    def title_match_sql(self, tokens):
+        return RawSQL(
+            'SELECT rowid FROM %s WHERE %s MATCH %%s' % (self.table, self.table),
+            ['title : (%s)' % self._match(tokens)]
+        )
+
+    def _insert_sql(self):
+        return 'INSERT INTO %s (rowid, title, description) VALUES (%%s, %%s, %%s)' % self.table
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE rowid = %%s' % self.table, [product.pk])
+            self.index_rows(cursor, [(product.pk, product.title, product.description)])
+
+    def index_rows(self, cursor, rows):
+        cursor.executemany(self._insert_sql(), [
+            (pk, ' '.join(tokenize(title)), ' '.join(tokenize(description)))
+            for pk, title, description in rows
+        ])
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE rowid = %%s' % self.table, [product_id])
+
+    def clear(self, cursor):
+        cursor.execute('DELETE FROM %s' % self.table)
+
+    def count(self, tokens, match_any=False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM %s WHERE %s MATCH %%s' % (self.table, self.table),
+                [self._match(tokens, match_any)]
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, tokens, offset, limit, match_any=False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM %s WHERE %s MATCH %%s ORDER BY bm25(%s, %s, %s), rowid DESC LIMIT %%s OFFSET %%s'
+                % ((self.table, self.table, self.table) + self.weights),
+                [self._match(tokens, match_any), limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    基于PostgreSQL tsvector的搜索后端。
+
+    索引表保存商品ID和带权重的 tsvector(标题为A，描述为B)，使用GIN索引，
+    查询结果按 ts_rank 排序。文本在写入前已经切分成词元，因此使用 simple 配置。
+    """
+    table = 'shop_product_search'
+
+    def create_table(self, cursor):
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS %s (product_id bigint PRIMARY KEY, document tsvector NOT NULL)'
+            % self.table
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS %s_document_gin ON %s USING GIN (document)' % (self.table, self.table)
+        )
+
+    def drop_table(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS %s' % self.table)
+
+    def _tsquery(self, tokens, match_any=False, weights=''):
+        """
+        把词元转为 to_tsquery 表达式，各词元之间为 AND(或 OR)关系，非中文词元支持前缀匹配。
+        weights 可以把匹配限制在指定权重(例如'A'表示只匹配标题)。
+        """
+        terms = []
+        for token in tokens:
+            term = "'%s'" % token.replace("'", "''")
+            if not CJK_RE.match(token):
+                term += ':*' + weights
+            elif weights:
+                term += ':' + weights
+            terms.append(term)
+        return (' | ' if match_any else ' & ').join(terms)
+
+    def title_match_sql(self, tokens):
+        return RawSQL(
+            "SELECT product_id FROM %s WHERE document @@ to_tsquery('simple', %%s)" % self.table,
+            [self._tsquery(tokens, weights='A')]
+        )
+
+    def _upsert_sql(self):
+        return (
+            "INSERT INTO %s (product_id, document) VALUES (%%s, "
+            "setweight(to_tsvector('simple', %%s), 'A') || setweight(to_tsvector('simple', %%s), 'B')) "
+            "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document" % self.table
+        )
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            self.index_rows(cursor, [(product.pk, product.title, product.description)])
+
+    def index_rows(self, cursor, rows):
+        cursor.executemany(self._upsert_sql(), [
+            (pk, ' '.join(tokenize(title)), ' '.join(tokenize(description)))
+            for pk, title, description in rows
+        ])
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE product_id = %%s' % self.table, [product_id])
+
+    def clear(self, cursor):
+        cursor.execute('TRUNCATE %s' % self.table)
+
+    def count(self, tokens, match_any=False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM %s WHERE document @@ to_tsquery('simple', %%s)" % self.table,
+                [self._tsquery(tokens, match_any)]
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, tokens, offset, limit, match_any=False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT product_id FROM %s, to_tsquery('simple', %%s) query WHERE document @@ query "
+                "ORDER BY ts_rank(document, query) DESC, product_id DESC LIMIT %%s OFFSET %%s" % self.table,
+                [self._tsquery(tokens, match_any), limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    没有全文索引时使用的后备后端，用 icontains 搜索标题和描述，不维护索引。
+    """
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def filter_by_title(self, queryset, query):
+        """
+        返回标题包含所有搜索词的商品查询集。
+        """
+        words = query.split()
+        if not words:
+            return queryset.none()
+        for word in words:
+            queryset = queryset.filter(title__icontains=word)
+        return queryset
+
+    def search(self, query):
+        """
+        返回匹配所有搜索词的商品查询集，按创建日期降序排列。
+        """
+        condition = Q()
+        for word in query.split():
+            condition &= Q(title__icontains=word) | Q(description__icontains=word)
+        return Product.objects.filter(condition) if condition else Product.objects.none()
+
+
+# 各数据库默认使用的搜索后端
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(vendor=None):
+    """
+    获取搜索后端实例。
+
+    优先使用 settings.SHOP_SEARCH_BACKEND 指定的类路径，否则根据数据库类型选择。
+
+    参数:
+    - vendor: 数据库类型，默认为当前连接的类型。
+
+    返回:
+    - 搜索后端实例。
+    """
+    backend_path = getattr(settings, 'SHOP_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return VENDOR_BACKENDS.get(vendor or connection.vendor, DatabaseSearchBackend)()
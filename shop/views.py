@@ -1,36 +1,21 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-
-from shop.models import Product, Category
+from django.conf import settings
+from django.http import Http404
+from django.views.static import serve
+
+from online_shop.cache import versioned_key
+from shop.models import Product
+from shop.utils.category_tree import get_request_category_tree
+from shop.utils.page_cache import CATALOG_NAMESPACE, cache_anonymous_page
+from shop.utils.pagination import paginat
+from shop.utils.recommendations import get_related_products
+from shop.utils.search import get_search_backend
 from cart.forms import QuantityForm
 
 
-def paginat(request, list_objects):
-    """
-    对象分页函数。
-
-    参数:
-    - request: HttpRequest对象，用于获取用户请求信息。
-    - list_objects: 需要进行分页的对象列表。
-
-    返回:
-    - 返回一个分页后的对象页面。
-    """
-    p = Paginator(list_objects, 20)  # 使用Paginator类将列表对象分页，每页包含20个对象
-    page_number = request.GET.get('page')  # 从请求中获取用户请求的页面编号
-    try:
-        page_obj = p.get_page(page_number)  # 尝试根据页面编号获取对应的页面对象
-    except PageNotAnInteger:
-        # 如果页面编号不是整数，则返回第1页
-        page_obj = p.page(1)
-    except EmptyPage:
-        # 如果请求的页面超出范围，则返回最后一页
-        page_obj = p.page(p.num_pages)
-    return page_obj
-
-
+@cache_anonymous_page
 def home_page(request):
     """
     首页渲染函数。
@@ -42,10 +27,12 @@ def home_page(request):
     - 返回首页的HttpResponse对象。
     """
     products = Product.objects.all()  # 获取所有产品对象
-    context = {'products': paginat(request ,products)}  # 将分页后的产品传递给上下文
+    count_key = versioned_key(CATALOG_NAMESPACE, 'count', 'all')  # 商品总数按目录版本号缓存
+    context = {'products': paginat(request ,products, count_key=count_key)}  # 将分页后的产品传递给上下文
     return render(request, 'home_page.html', context)  # 渲染并返回首页模板
 
 
+@cache_anonymous_page
 def product_detail(request, slug):
     """
     显示产品的详细信息页面。
@@ -58,8 +45,9 @@ def product_detail(request, slug):
     - HttpResponse对象，渲染的产品详细信息页面。
     """
     form = QuantityForm()  # 初始化数量表单
-    product = get_object_or_404(Product, slug=slug)  # 根据slug获取产品对象，如果不存在则返回404错误页面
-    related_products = Product.objects.filter(category=product.category).all()[:5]  # 获取与该产品相同类别的其他5个产品
+    # 根据slug获取产品对象，类别一并查询，如果不存在则返回404错误页面
+    product = get_object_or_404(Product.objects.select_related('category'), slug=slug)
+    related_products = get_related_products(product)  # 获取预先计算的相关产品，没有时退回到同类别的其他产品
     context = {
         'title': product.title,  # 产品标题
         'product': product,  # 产品对象
@@ -67,8 +55,8 @@ def product_detail(request, slug):
         'favorites': '收藏夹',  # 用于标识收藏状态的初始值
         'related_products': related_products  # 相关产品列表
     }
-    # 检查当前用户是否已将该产品添加为收藏
-    if request.user.likes.filter(id=product.id).first():
+    # 检查当前用户是否已将该产品添加为收藏，匿名用户没有收藏夹
+    if request.user.is_authenticated and request.user.likes.filter(id=product.id).exists():
         context['favorites'] = 'remove'
     return render(request, 'product_detail.html', context)
 
@@ -111,34 +99,50 @@ def favorites(request):
     return render(request, 'favorites.html', context)
 
 # 实现商品搜索功能
+@cache_anonymous_page
 def search(request):
+    """
+    在商品标题和描述中搜索，结果按相关度排序。
+
+    总数和分页都直接由全文索引完成，只有当前页的商品会被加载。
+    缺少查询字符串时返回空结果。
+    """
     # 从请求的GET参数中获取查询字符串
-    query = request.GET.get('q')
-    # 根据查询字符串搜索商品，并获取所有匹配结果
-    products = Product.objects.filter(title__icontains=query).all()
+    query = request.GET.get('q', '').strip()
+    # 根据查询字符串在全文索引中搜索商品
+    products = get_search_backend().search(query) if query else Product.objects.none()
     # 对搜索结果进行分页，并传递到首页进行渲染
-    context = {'products': paginat(request ,products)}
+    context = {'products': paginat(request ,products), 'query': query}
     return render(request, 'home_page.html', context)
 
 # 根据分类筛选商品
+@cache_anonymous_page
 def filter_by_category(request, slug):
     """
     当用户点击父分类时，我们希望显示其所有子分类中的所有商品。
+
+    分类及其所有后代分类的ID来自缓存的分类树，商品用一次 category_id__in 查询得到，
+    分页器可以直接对查询集使用 LIMIT/OFFSET，商品数量缓存后每页只需要一次分页查询。
     """
-    # 根据slug获取分类对象，如果不存在则返回空列表
-    result = []
-    category = Category.objects.filter(slug=slug).first()
-    # 将属于该分类的所有商品添加到结果列表中
-    [result.append(product) \
-        for product in Product.objects.filter(category=category.id).all()]
-    # 如果该分类是父分类，则获取所有子分类，并将其商品也添加到结果中
-    if not category.is_sub:
-        sub_categories = category.sub_categories.all()
-        # 遍历子分类，将子分类中的所有商品添加到结果列表中
-        for category in sub_categories:
-            [result.append(product) \
-                for product in Product.objects.filter(category=category).all()]
-    # 对筛选结果进行分页，并传递到首页进行渲染
-    context = {'products': paginat(request ,result)}
+    # 根据slug从分类树获取分类节点，如果不存在则返回404
+    category = get_request_category_tree(request).get(slug)
+    if category is None:
+        raise Http404('分类不存在')
+    # 查询该分类及其所有后代分类中的商品
+    products = Product.objects.filter(category_id__in=category.descendant_ids)
+    # 对筛选结果进行分页，并传递到首页进行渲染，商品数量按目录版本号缓存
+    count_key = versioned_key(CATALOG_NAMESPACE, 'count', 'category', category.id)
+    context = {'products': paginat(request ,products, count_key=count_key)}
     return render(request, 'home_page.html', context)
 
+
+def serve_rendition(request, path):
+    """
+    开发环境中提供商品缩略图文件，并设置一年的浏览器缓存。
+
+    缩略图以内容哈希命名，内容变化时文件名也会变化，因此可以标记为 immutable。
+    只在DEBUG模式下注册；生产环境由 nginx 按相同的缓存头直接提供这些文件，不经过Django。
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
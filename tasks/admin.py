@@ -0,0 +1,7 @@
+from django.contrib import admin
+
+# 导入Job模型
+from .models import Job
+
+# 将Job模型注册到Django admin站点
+admin.site.register(Job)
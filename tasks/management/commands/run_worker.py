@@ -0,0 +1,87 @@
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.services import claim_jobs, release_jobs, requeue_stale
+from tasks.worker import init_process, run_job
+
+logger = logging.getLogger('tasks')
+
+
+class Command(BaseCommand):
+    """
+    从任务表中领取任务，交给进程池执行。
+
+    子进程以 spawn 方式启动，不会继承主进程的数据库连接。
+    使用 --once 执行完当前所有可执行的任务后退出，否则持续轮询新任务。
+    """
+    help = '运行后台任务 worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='进程池大小')
+        parser.add_argument('--poll', type=float, default=1.0, help='没有任务时的轮询间隔(秒)')
+        parser.add_argument('--stale', type=int, default=600, help='执行超过该秒数的任务视为 worker 已崩溃，重新放回队列')
+        parser.add_argument('--once', action='store_true', help='执行完当前可执行的任务后退出')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        worker = '%s:%s:%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self.requeue_stale(options['stale'])
+        last_requeue = time.monotonic()
+        count = 0
+        pool = ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context('spawn'), initializer=init_process
+        )
+        # 执行中的 Future -> 任务ID
+        running = {}
+        try:
+            while True:
+                # 常驻运行时定期恢复崩溃的 worker 或出错的子进程留下的任务
+                if time.monotonic() - last_requeue >= options['stale']:
+                    self.requeue_stale(options['stale'])
+                    last_requeue = time.monotonic()
+                if len(running) < processes:
+                    for job_id in claim_jobs(worker, processes - len(running)):
+                        running[pool.submit(run_job, job_id)] = job_id
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+                done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    try:
+                        future.result()
+                    except BrokenProcessPool:
+                        # 子进程异常退出后进程池不能再使用，交给进程管理器重启 worker
+                        raise CommandError('进程池中的子进程异常退出')
+                    except Exception:
+                        # execute_job 自身出错(如数据库暂时不可用)，任务留在执行中状态，超过 --stale 秒后由定期检查放回队列
+                        logger.exception('worker process failed')
+                    count += 1
+        except KeyboardInterrupt:
+            self.stdout.write('正在等待执行中的任务完成...')
+        finally:
+            # 取消还没开始执行的任务并放回队列，只等待已经在子进程中执行的任务。
+            # Executor.shutdown 的 cancel_futures 参数需要 Python 3.9
+            cancelled = [job_id for future, job_id in running.items() if future.cancel()]
+            if cancelled:
+                release_jobs(worker, cancelled)
+            pool.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS('共执行 %d 个任务' % count))
+
+    def requeue_stale(self, stale):
+        """
+        把执行超过 stale 秒的任务放回队列。
+        """
+        requeued = requeue_stale(stale)
+        if requeued:
+            logger.warning('requeued %d stale jobs', requeued)
@@ -0,0 +1,61 @@
+from django.db import models
+
+
+class Job(models.Model):
+    """
+    后台任务模型，每一行是一个等待或已经由 run_worker 执行的任务。
+
+    属性:
+        name: 任务名称，对应用 @task 注册的函数
+        payload: 调用任务函数时传入的关键字参数
+        status: 任务状态，见 STATUS_CHOICES
+        attempts: 已经执行的次数
+        max_attempts: 最多执行的次数，失败后在此之前会延迟重试
+        run_after: 任务最早可以执行的时间
+        worker: 领取任务的 worker 标识
+        error: 最近一次失败的错误信息
+        created: 任务创建时间
+        started: 最近一次开始执行的时间
+        finished: 执行结束的时间
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, '等待中'),
+        (RUNNING, '执行中'),
+        (DONE, '已完成'),
+        (FAILED, '已失败'),
+    )
+
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField()
+    worker = models.CharField(max_length=64, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """
+        Meta类用于定义模型的元数据选项。
+
+        属性:
+        - ordering: 默认按创建顺序排列。
+        - indexes: worker 按 (status, run_after) 查找可以执行的任务。
+        """
+        ordering = ('id',)
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='tasks_job_status_run_after'),
+        ]
+
+    def __str__(self):
+        """
+        返回任务的名称和状态。
+        """
+        return '%s #%s (%s)' % (self.name, self.id, self.status)
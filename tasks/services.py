@@ -0,0 +1,191 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# 已注册的任务: 任务名称 -> (函数, 最多执行次数)
+REGISTRY = {}
+# 第n次失败后延迟 RETRY_DELAY * 2**(n-1) 秒重试
+RETRY_DELAY = 30
+
+
+def task(func=None, *, max_attempts=3):
+    """
+    把函数注册为后台任务的装饰器，任务名称为 "模块.函数名"。
+
+    任务函数只接收可以存为JSON的关键字参数，应当可以安全地重复执行。
+    各应用在自己的 tasks.py 中声明任务，TasksConfig.ready 会自动导入这些模块。
+
+    用法:
+    - @task
+    - @task(max_attempts=5)
+
+    参数:
+    - func: 被装饰的函数。
+    - max_attempts: 任务最多执行的次数。
+
+    返回值:
+    - 原函数，附带 name 属性和 enqueue、enqueue_once 方法。
+    """
+    def decorator(func):
+        name = '%s.%s' % (func.__module__, func.__name__)
+        REGISTRY[name] = (func, max_attempts)
+        func.name = name
+        func.enqueue = lambda **payload: enqueue(name, **payload)
+        func.enqueue_once = lambda delay=0, **payload: enqueue_once(name, delay, **payload)
+        return func
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def enqueue(name, **payload):
+    """
+    创建一个后台任务。
+
+    任务与调用方的数据写在同一个事务中，事务回滚时任务也不会留下，
+    worker 只会在事务提交后看到它。设置 TASKS_EAGER = True 时，
+    任务在事务提交后直接在当前进程中执行，适合没有运行 worker 的开发环境和测试。
+
+    参数:
+    - name: 任务名称。
+    - payload: 调用任务函数的关键字参数。
+
+    返回值:
+    - 新创建的Job对象。
+    """
+    return _create_job(name, payload, timezone.now())
+
+
+def enqueue_once(name, delay=0, **payload):
+    """
+    创建一个延迟执行的后台任务，已有相同名称和参数的任务在等待执行时不再创建。
+
+    用于数据变化后重新计算汇总这类只需要最终执行一次的任务，
+    delay 秒内的多次调用合并为一个任务。
+    并发调用时仍可能创建重复的任务，任务函数本身应当可以安全地重复执行。
+
+    参数:
+    - name: 任务名称。
+    - delay: 新任务延迟执行的秒数。
+    - payload: 调用任务函数的关键字参数。
+
+    返回值:
+    - 已在等待的或新创建的Job对象。
+    """
+    job = Job.objects.filter(name=name, status=Job.PENDING, payload=payload).first()
+    if job is not None:
+        return job
+    return _create_job(name, payload, timezone.now() + timedelta(seconds=delay))
+
+
+def _create_job(name, payload, run_after):
+    if name not in REGISTRY:
+        raise KeyError('未注册的任务: %s' % name)
+    job = Job.objects.create(name=name, payload=payload, max_attempts=REGISTRY[name][1], run_after=run_after)
+    if getattr(settings, 'TASKS_EAGER', False):
+        transaction.on_commit(lambda: execute_job(job.id))
+    return job
+
+
+def claim_jobs(worker, limit):
+    """
+    领取最多 limit 个已经可以执行的任务。
+
+    通过带条件的 UPDATE 把任务标记为执行中并写入 worker 标识，
+    多个 worker 同时领取时每个任务只会被其中一个领到。
+
+    参数:
+    - worker: 当前 worker 的标识。
+    - limit: 最多领取的任务数。
+
+    返回值:
+    - 领到的任务ID列表。
+    """
+    now = timezone.now()
+    ids = list(
+        Job.objects.filter(status=Job.PENDING, run_after__lte=now)
+        .order_by('run_after', 'id').values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    Job.objects.filter(id__in=ids, status=Job.PENDING).update(
+        status=Job.RUNNING, worker=worker, started=now
+    )
+    return list(
+        Job.objects.filter(id__in=ids, status=Job.RUNNING, worker=worker, started=now)
+        .values_list('id', flat=True)
+    )
+
+
+def release_jobs(worker, ids):
+    """
+    把已领取但还没有开始执行的任务放回队列，例如 worker 退出时取消的任务。
+
+    参数:
+    - worker: 领取任务的 worker 标识。
+    - ids: 任务ID列表。
+
+    返回值:
+    - 放回队列的任务数。
+    """
+    return Job.objects.filter(id__in=ids, status=Job.RUNNING, worker=worker).update(
+        status=Job.PENDING, worker=''
+    )
+
+
+def requeue_stale(timeout):
+    """
+    把执行超过 timeout 秒仍未结束的任务重新放回队列，用于恢复崩溃的 worker 留下的任务。
+
+    参数:
+    - timeout: 秒数。
+
+    返回值:
+    - 重新放回队列的任务数。
+    """
+    return Job.objects.filter(
+        status=Job.RUNNING, started__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(status=Job.PENDING, worker='')
+
+
+def execute_job(job_id):
+    """
+    执行一个任务并记录结果。
+
+    任务失败且还有重试次数时按指数退避延迟重试，否则标记为失败。
+
+    参数:
+    - job_id: 任务ID。
+
+    返回值:
+    - 任务执行后的状态。
+    """
+    job = Job.objects.get(id=job_id)
+    Job.objects.filter(id=job_id).update(attempts=job.attempts + 1)
+    job.attempts += 1
+    try:
+        func, _ = REGISTRY[job.name]
+        func(**job.payload)
+    except Exception:
+        logger.exception('job %s (%s) failed on attempt %d', job.id, job.name, job.attempts)
+        update = {'error': traceback.format_exc(), 'worker': ''}
+        if job.attempts < job.max_attempts:
+            update['status'] = Job.PENDING
+            update['run_after'] = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            update['status'] = Job.FAILED
+            update['finished'] = timezone.now()
+        Job.objects.filter(id=job_id).update(**update)
+        return update['status']
+    Job.objects.filter(id=job_id).update(status=Job.DONE, error='', finished=timezone.now())
+    logger.info('job %s (%s) done', job.id, job.name)
+    return Job.DONE
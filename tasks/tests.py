@@ -0,0 +1,180 @@
+from concurrent.futures import Future
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks.models import Job
+from tasks.services import (
+    REGISTRY, RETRY_DELAY, claim_jobs, enqueue, enqueue_once, execute_job, release_jobs, requeue_stale, task
+)
+
+# 测试任务执行时记录下的参数
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode(value):
+    raise RuntimeError('boom %s' % value)
+
+
+class InlineExecutor:
+    """
+    在当前进程中同步执行的进程池替身。
+
+    spawn 出的子进程连接不到测试数据库，run_worker 的测试改用它执行任务。
+    """
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None):
+        pass
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class JobTest(TestCase):
+    """
+    任务的入队、领取、执行、重试和失败记录。
+    """
+
+    def setUp(self):
+        calls.clear()
+
+    def run_worker(self, **options):
+        out = StringIO()
+        with mock.patch('tasks.management.commands.run_worker.ProcessPoolExecutor', InlineExecutor), \
+                mock.patch('tasks.management.commands.run_worker.run_job', execute_job):
+            call_command('run_worker', once=True, stdout=out, **{'processes': 2, **options})
+        return out.getvalue()
+
+    def test_task_registration(self):
+        self.assertEqual(record.name, 'tasks.tests.record')
+        self.assertEqual(REGISTRY[record.name], (record, 3))
+        self.assertEqual(REGISTRY[explode.name][1], 2)
+        with self.assertRaises(KeyError):
+            enqueue('tasks.tests.missing')
+
+    def test_enqueue_and_run_worker(self):
+        job = record.enqueue(value=1)
+        self.assertEqual((job.status, job.attempts, job.max_attempts), (Job.PENDING, 0, 3))
+        # 未设置 TASKS_EAGER 时入队不会执行任务
+        self.assertEqual(calls, [])
+
+        self.assertIn('共执行 1 个任务', self.run_worker())
+        job.refresh_from_db()
+        self.assertEqual(calls, [1])
+        self.assertEqual((job.status, job.attempts, job.error), (Job.DONE, 1, ''))
+        self.assertIsNotNone(job.finished)
+        # 已完成的任务不会再次执行
+        self.assertIn('共执行 0 个任务', self.run_worker())
+        self.assertEqual(calls, [1])
+
+    def test_enqueue_once(self):
+        before = timezone.now()
+        job = record.enqueue_once(delay=60, value=1)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=60))
+        # 等待中的相同任务不再重复创建，参数不同的任务单独创建
+        self.assertEqual(record.enqueue_once(delay=60, value=1), job)
+        self.assertNotEqual(enqueue_once(record.name, value=2), job)
+        self.assertEqual(Job.objects.count(), 2)
+        # 任务开始执行后再次调用会创建新任务
+        Job.objects.filter(id=job.id).update(status=Job.RUNNING)
+        self.assertNotEqual(record.enqueue_once(value=1), job)
+
+    def test_claim_jobs(self):
+        first = record.enqueue(value=1)
+        second = record.enqueue(value=2)
+        later = record.enqueue(value=3)
+        Job.objects.filter(id=later.id).update(run_after=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(claim_jobs('w1', 1), [first.id])
+        # 已被领取的任务和还没到执行时间的任务都不会被领到
+        self.assertEqual(claim_jobs('w2', 10), [second.id])
+        self.assertEqual(claim_jobs('w3', 10), [])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.worker), (Job.RUNNING, 'w1'))
+        self.assertIsNotNone(first.started)
+
+    def test_release_and_requeue_stale(self):
+        job = record.enqueue(value=1)
+        claim_jobs('w1', 1)
+        # 只有领取任务的 worker 可以放回
+        self.assertEqual(release_jobs('w2', [job.id]), 0)
+        self.assertEqual(release_jobs('w1', [job.id]), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.PENDING, ''))
+
+        claim_jobs('w1', 1)
+        self.assertEqual(requeue_stale(60), 0)
+        Job.objects.filter(id=job.id).update(started=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(60), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.PENDING, ''))
+
+    def test_worker_requeues_stale_jobs_periodically(self):
+        for value in range(3):
+            record.enqueue(value=value)
+        with mock.patch(
+            'tasks.management.commands.run_worker.requeue_stale', wraps=requeue_stale
+        ) as requeue:
+            # 每个进程一次只领一个任务，循环三次；--stale 0 时每次循环都检查
+            self.run_worker(processes=1, stale=0)
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertGreater(requeue.call_count, 1)
+
+    def test_retry_backoff_and_failure(self):
+        job = explode.enqueue(value=1)
+        before = timezone.now()
+        with self.assertLogs('tasks', 'ERROR'):
+            self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.worker), (Job.PENDING, 1, ''))
+        self.assertIn('RuntimeError: boom 1', job.error)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=RETRY_DELAY))
+        self.assertIsNone(job.finished)
+
+        # 重试时间未到，worker 不会执行
+        self.assertIn('共执行 0 个任务', self.run_worker())
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        with self.assertLogs('tasks', 'ERROR'):
+            self.run_worker()
+        job.refresh_from_db()
+        # 达到最多执行次数后标记为失败，保留最后一次的错误
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('RuntimeError: boom 1', job.error)
+        self.assertIsNotNone(job.finished)
+
+    def test_backoff_doubles(self):
+        job = explode.enqueue(value=1)
+        Job.objects.filter(id=job.id).update(max_attempts=5, attempts=2)
+        before = timezone.now()
+        with self.assertLogs('tasks', 'ERROR'):
+            self.assertEqual(execute_job(job.id), Job.PENDING)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 3)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=RETRY_DELAY * 4))
+        self.assertLess(job.run_after, before + timedelta(seconds=RETRY_DELAY * 5))
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            job = record.enqueue(value=7)
+            # 事务提交前不执行
+            self.assertEqual(calls, [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(calls, [7])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
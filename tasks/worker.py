@@ -0,0 +1,35 @@
+"""
+进程池子进程的入口函数。
+
+子进程以 spawn 方式启动，反序列化这里的函数时Django还没有加载，
+因此本模块不能在导入时引用任何模型，模型相关的模块在函数内部导入。
+"""
+import django
+
+
+def init_process():
+    """
+    子进程的初始化函数，加载Django。
+    """
+    django.setup()
+
+
+def run_job(job_id):
+    """
+    在子进程中执行一个任务，执行前后清理过期的数据库连接。
+
+    参数:
+    - job_id: 任务ID。
+
+    返回值:
+    - 任务执行后的状态。
+    """
+    from django.db import close_old_connections
+
+    from tasks.services import execute_job
+
+    close_old_connections()
+    try:
+        return execute_job(job_id)
+    finally:
+        close_old_connections()